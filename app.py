@@ -1,16 +1,35 @@
 import streamlit as st
-from google import genai
-from google.genai import types
 import os
 import json
-import pandas as pd
+import time
 from datetime import datetime, timedelta, timezone
-from supabase import create_client, Client
-import stripe
 import textwrap
 import re
+import hmac
+import hashlib
+import base64
+import secrets
+from urllib.parse import unquote
+from html import escape
+from types import SimpleNamespace
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from tenacity import retry, stop_after_attempt, wait_exponential
+from tenacity import retry, retry_if_not_exception_type, stop_after_attempt, wait_exponential
+import extra_streamlit_components as stx
+from supabase_pool import SupabaseClientPool
+from ttl_cache import TTLCache
+import voice_jobs
+import prefetch
+import rate_limit
+import omni_schema
+import lead_query
+import semantic_index
+from model_router import ModelRouter, STANDARD_MODEL_ID, audio_seconds
+import session_store
+from contact_keys import contact_keys
+from outreach_time import outreach_fields, parse_timestamp, describe_outreach, USER_TZ
+import tracing
 
 # ==========================================
 # 1. CONFIG & STATE
@@ -18,7 +37,7 @@ from tenacity import retry, stop_after_attempt, wait_exponential
 # Must be the very first Streamlit command
 st.set_page_config(
     page_title="NexusFlowAI", 
-    page_icon="nexus_logo.jpg", 
+    page_icon="static/icon-32.png", 
     layout="wide",
     initial_sidebar_state="collapsed"
 )
@@ -27,15 +46,57 @@ st.set_page_config(
 _ = load_dotenv()
 
 # ==========================================
-# 1.1 AGGRESSIVE PWA ICON FIX
+# 1.1 STATIC ASSETS (CSS, FONTS, ICONS, LOGO)
 # ==========================================
+# static/ is served by Streamlit at app/static/ (server.enableStaticServing, see
+# Dockerfile). URLs carry ?v=<content hash>, so browsers and CDNs can keep them
+# for good and a deploy that changes a file changes its URL. The logo and icon
+# variants come from nexus_logo.jpg via build_static.py. Without static serving
+# (e.g. a bare `streamlit run app.py`) the CSS is inlined as before.
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+
+@st.cache_resource
+def static_version(name):
+    """Short content hash of static/<name>, '' if it is missing."""
+    try:
+        with open(os.path.join(STATIC_DIR, name), "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()[:12]
+    except OSError:
+        return ""
+
+def static_url(name):
+    return f"app/static/{name}?v={static_version(name)}"
+
+def static_serving():
+    return bool(st.get_option("server.enableStaticServing"))
+
 # We inject these links directly. No <head> tags to avoid rendering issues.
-# NOTE: Ensure 'https://nexusflowapp.pro/nexus_logo.jpg' is LIVE and reachable.
-pwa_html = """
-<link rel="apple-touch-icon" href="https://nexusflowapp.pro/nexus_logo.jpg" />
-<link rel="icon" type="image/jpeg" href="https://nexusflowapp.pro/nexus_logo.jpg" />
-"""
-st.markdown(pwa_html, unsafe_allow_html=True)
+if static_serving():
+    st.markdown(f"""
+<link rel="apple-touch-icon" href="{static_url('icon-180.png')}" />
+<link rel="icon" type="image/png" sizes="192x192" href="{static_url('icon-192.png')}" />
+""", unsafe_allow_html=True)
+
+def inject_static_assets():
+    """The stylesheet: a ~100 byte <link> per rerun instead of the whole CSS."""
+    if static_serving():
+        st.markdown(f'<link rel="stylesheet" href="{static_url("nexus.css")}" />', unsafe_allow_html=True)
+    else:
+        st.markdown(f"<style>{read_stylesheet()}</style>", unsafe_allow_html=True)
+
+@st.cache_resource
+def read_stylesheet():
+    with open(os.path.join(STATIC_DIR, "nexus.css"), encoding="utf-8") as f:
+        return f.read()
+
+def render_logo():
+    """Header logo: right-sized WebP from app/static, or st.image when static serving is off."""
+    if static_serving():
+        st.markdown(f"""<img src="{static_url('logo-640.webp')}" alt="NexusFlowAI"
+            srcset="{static_url('logo-640.webp')} 640w, {static_url('logo-1280.webp')} 1280w"
+            sizes="(max-width: 768px) 90vw, 50vw" style="width: 100%; height: auto;" />""", unsafe_allow_html=True)
+    else:
+        st.image(os.path.join(STATIC_DIR, "logo-640.webp"), use_container_width=True)
 
 # Initialize Session State
 if 'user' not in st.session_state: st.session_state.user = None
@@ -50,6 +111,29 @@ if 'show_email_login' not in st.session_state: st.session_state.show_email_login
 if 'show_install_guide' not in st.session_state: st.session_state.show_install_guide = False
 # Pagination State
 if 'pipeline_page' not in st.session_state: st.session_state.pipeline_page = 0
+if 'due_selected_lead' not in st.session_state: st.session_state.due_selected_lead = None
+# Persistent Login State
+if 'refresh_token' not in st.session_state: st.session_state.refresh_token = None
+if 'access_token' not in st.session_state: st.session_state.access_token = None
+if 'token_expires_at' not in st.session_state: st.session_state.token_expires_at = None
+if 'google_auth_url' not in st.session_state: st.session_state.google_auth_url = None
+if 'entitlement_stamp' not in st.session_state: st.session_state.entitlement_stamp = None
+if 'session_cookie_value' not in st.session_state: st.session_state.session_cookie_value = None
+if 'clear_session_cookie' not in st.session_state: st.session_state.clear_session_cookie = False
+# --- NEW: Per-rerun traces for the admin diagnostics panel ---
+if 'trace_history' not in st.session_state: st.session_state.trace_history = deque(maxlen=20)
+# --- NEW: Background voice jobs ---
+if 'voice_job_id' not in st.session_state: st.session_state.voice_job_id = None
+if 'voice_error' not in st.session_state: st.session_state.voice_error = None
+if 'voice_clip_id' not in st.session_state: st.session_state.voice_clip_id = None
+# --- NEW: External session store (see 2.2) ---
+if 'session_sid' not in st.session_state: st.session_state.session_sid = None
+if 'session_digest' not in st.session_state: st.session_state.session_digest = None
+if 'session_sid_cookie_set' not in st.session_state: st.session_state.session_sid_cookie_set = False
+if 'cookie_restore_done' not in st.session_state: st.session_state.cookie_restore_done = False
+
+# Every span from here to the end of this rerun lands in this trace
+st.session_state.trace_history.append(tracing.begin_trace(st.session_state.active_tab))
 
 # --- CAPTURE REFERRAL CODE (STICKY) ---
 if not st.session_state.referral_captured:
@@ -73,345 +157,241 @@ STRIPE_SECRET_KEY = os.getenv("STRIPE_SECRET_KEY")
 STRIPE_PRICE_ID = os.getenv("STRIPE_PRICE_ID") 
 APP_BASE_URL = "https://app.nexusflowapp.pro"
 
+SUPABASE_POOL_SIZE = int(os.getenv("SUPABASE_POOL_SIZE", "500"))
+
+# --- NEW: ADMISSION CONTROL (see rate_limit.Admission) ---
+# Every signed-in user's data requests pass a per-user token bucket and then a
+# process-wide fair queue, so one user (or a runaway rerun loop) cannot take the
+# whole connection pool. Gemini calls get their own limiter (see 4).
+SUPABASE_USER_RATE = float(os.getenv("SUPABASE_USER_RATE", "20"))          # requests/s per user
+SUPABASE_USER_BURST = int(os.getenv("SUPABASE_USER_BURST", "40"))
+SUPABASE_MAX_CONCURRENT = int(os.getenv("SUPABASE_MAX_CONCURRENT", "50"))  # requests in flight, all users
+SUPABASE_MAX_WAIT = float(os.getenv("SUPABASE_MAX_WAIT", "5"))             # seconds queued before "please wait"
+
+# One pool per process: per-user PostgREST clients over a shared keep-alive connection pool
 @st.cache_resource
-def init_supabase():
+def init_supabase_pool():
     if SUPABASE_URL and SUPABASE_KEY:
-        return create_client(SUPABASE_URL, SUPABASE_KEY)
+        admission = rate_limit.Admission("supabase", SUPABASE_USER_RATE, SUPABASE_USER_BURST,
+                                         SUPABASE_MAX_CONCURRENT, max_wait=SUPABASE_MAX_WAIT)
+        return SupabaseClientPool(SUPABASE_URL, SUPABASE_KEY, max_clients=SUPABASE_POOL_SIZE, admission=admission)
     return None
 
-supabase = init_supabase()
+supabase_pool = init_supabase_pool()
+
+# --- NEW: Prometheus-style /metrics (span p50/p95, counters) on a side port ---
+METRICS_PORT = os.getenv("METRICS_PORT")
+ADMIN_EMAILS = {e.strip().lower() for e in os.getenv("ADMIN_EMAILS", "").split(",") if e.strip()}
+
+@st.cache_resource
+def init_metrics_server():
+    if not METRICS_PORT: return None
+    try:
+        return tracing.start_metrics_server(int(METRICS_PORT))
+    except OSError as e:
+        print(f"Metrics Server Error: {e}")
+        return None
+
+init_metrics_server()
 
-if STRIPE_SECRET_KEY:
+def db():
+    """PostgREST client for this session: bound to the user's JWT when signed in, anon otherwise."""
+    if not supabase_pool: return None
+    user = st.session_state.user
+    if not user or not st.session_state.access_token:
+        return supabase_pool.anon()
+    # Refresh the JWT shortly before it expires (Supabase default lifetime is 1 hour)
+    if st.session_state.token_expires_at and st.session_state.token_expires_at - 60 < time.time():
+        try:
+            remember_auth_session(supabase_pool.auth().refresh_session(st.session_state.refresh_token))
+        except Exception as e:
+            print(f"Token Refresh Error: {e}")
+    return supabase_pool.for_user(user.id, st.session_state.access_token)
+
+# --- NEW: LAZY HEAVY IMPORTS ---
+# stripe, google.genai and pandas cost about a second of imports on a cold
+# container and the login screen needs none of them, so each is imported on
+# first use (bench/startup_profile.py tracks this).
+@st.cache_resource
+def stripe_api():
+    """The configured stripe module."""
+    import stripe
     stripe.api_key = STRIPE_SECRET_KEY
+    # Optional API base override (the offline benchmarks in bench/ point this at a local stand-in)
+    if os.getenv("STRIPE_API_BASE"):
+        stripe.api_base = os.getenv("STRIPE_API_BASE")
+    return stripe
+
+# ==========================================
+# 2.1 PERSISTENT LOGIN (COOKIE)
+# ==========================================
+# The cookie carries the Supabase refresh token plus a signed, short-lived
+# entitlement stamp. A browser refresh or PWA relaunch restores the session
+# silently, and Stripe is only consulted again once the stamp has expired.
+SESSION_COOKIE_SECRET = os.getenv("SESSION_COOKIE_SECRET")
+SESSION_COOKIE_NAME = "nexus_session"
+SESSION_COOKIE_DAYS = 30
+ENTITLEMENT_STAMP_TTL = timedelta(hours=6)
+
+# Disabled (plain per-tab sessions) unless a signing secret is configured.
+# Cookies are read from the request (st.context.cookies). The CookieManager
+# component is only mounted on runs that write one: any custom component makes
+# Streamlit import pandas, which the login screen otherwise never needs.
+_cookie_manager = None
+
+def cookie_writer():
+    """The CookieManager component, mounted on first use in this run."""
+    global _cookie_manager
+    if _cookie_manager is None:
+        _cookie_manager = stx.CookieManager(key="nexus_cookie_manager")
+    return _cookie_manager
+
+def request_cookie(name):
+    """Cookie value as sent with the page request (URL-decoded), or None."""
+    value = st.context.cookies.get(name)
+    return unquote(value) if value else None
+
+# ==========================================
+# 2.2 EXTERNAL SESSION STATE
+# ==========================================
+# The keys below are mirrored into session_store under a random id kept in the
+# "nexus_sid" cookie, so a reconnect, a redeploy or a request landing on another
+# replica picks the session up where it was. Snapshots are written only when
+# they change: at the top of every run (what the previous run left, including
+# runs that ended in st.rerun/st.stop) and at the end of runs that finish.
+# The snapshot holds the Supabase tokens, so like the login cookie (2.1) this
+# is off unless SESSION_COOKIE_SECRET is set. The store also keeps pending
+# OAuth (PKCE) verifiers, so a Google callback can land on any replica.
+# Voice jobs (see 4) still run and wait in the process that accepted them: with
+# several replicas, keep sticky sessions so a reconnect finds its job.
+SESSION_STORE_URL = os.getenv("SESSION_STORE", "memory")
+SESSION_STORE_TTL = int(os.getenv("SESSION_STORE_TTL", str(24 * 3600)))
+SESSION_ID_COOKIE = "nexus_sid"
+PERSISTED_SESSION_KEYS = (
+    "user", "access_token", "refresh_token", "token_expires_at", "is_subscribed", "entitlement_stamp",
+    "active_tab", "omni_result", "selected_lead", "due_selected_lead", "is_editing", "pipeline_page",
+    "show_profile", "referral_captured", "voice_job_id",
+)
+
+@st.cache_resource
+def init_session_store():
+    try:
+        return session_store.SessionStore(session_store.open_backend(SESSION_STORE_URL, SESSION_STORE_TTL))
+    except Exception as e:
+        print(f"Session Store Error: {e}")
+        return None
+
+def snapshot_session():
+    """The persisted keys as plain JSON-able values (the auth User object becomes id/email/metadata)."""
+    state = {key: st.session_state.get(key) for key in PERSISTED_SESSION_KEYS}
+    user = state["user"]
+    if user is not None:
+        state["user"] = {"id": str(user.id), "email": user.email, "user_metadata": getattr(user, "user_metadata", None) or {}}
+    return state
+
+def sync_session_store():
+    """First run of a browser session: hydrate from the store. Later runs: save the snapshot if it changed."""
+    store = init_session_store()
+    if not store or not SESSION_COOKIE_SECRET: return
+
+    if st.session_state.session_sid is None:
+        sid = request_cookie(SESSION_ID_COOKIE)
+        saved = store.load(sid) if sid else None
+        if saved:
+            for key, value in saved.items():
+                if key in PERSISTED_SESSION_KEYS: st.session_state[key] = value
+            if saved.get("user"): st.session_state.user = SimpleNamespace(**saved["user"])
+            st.session_state.session_sid_cookie_set = True
+        else:
+            sid = secrets.token_urlsafe(24)
+        st.session_state.session_sid = sid
+        st.session_state.session_digest = store.digest(snapshot_session())
+        return
+
+    # Anonymous sessions have nothing worth keeping: the cookie is written once signed in
+    if st.session_state.user and not st.session_state.session_sid_cookie_set:
+        cookie_writer().set(SESSION_ID_COOKIE, st.session_state.session_sid, key="set_sid_cookie",
+                            expires_at=datetime.now() + timedelta(days=SESSION_COOKIE_DAYS),
+                            secure=True, same_site="strict")
+        st.session_state.session_sid_cookie_set = True
+    st.session_state.session_digest = store.save(st.session_state.session_sid, snapshot_session(), st.session_state.session_digest)
+
+def rotate_session_id():
+    """Sign out: drops the stored snapshot and continues under a new id (its cookie is set at the next sign-in)."""
+    store = init_session_store()
+    if store and st.session_state.session_sid: store.delete(st.session_state.session_sid)
+    st.session_state.session_sid = secrets.token_urlsafe(24)
+    st.session_state.session_digest = None
+    st.session_state.session_sid_cookie_set = False
+
+sync_session_store()
 
 # ==========================================
 # 3. CSS (COMPLETE REFACTOR)
 # ==========================================
-st.markdown("""
-    <style>
-        @import url('https://fonts.googleapis.com/css2?family=Roboto:wght@400;500;700;900&display=swap');
-        
-        /* 1. FORCE LIGHT MODE & REMOVE PADDING */
-        :root {
-            color-scheme: light;
-        }
-        
-        html, body, .stApp {
-            font-family: 'Circular', -apple-system, BlinkMacSystemFont, Roboto, "Helvetica Neue", sans-serif;
-            background-color: #FFFFFF !important;
-            color: #222222;
-            min-height: 100dvh !important;
-            width: 100vw;
-            margin: 0;
-            padding: 0;
-            overflow-x: hidden !important;
-            overscroll-behavior: none;
-            -webkit-user-select: none;
-            user-select: none;
-            -webkit-tap-highlight-color: transparent;
-        }
-        
-        h1, h2, h3 { font-weight: 800 !important; color: #222222 !important; letter-spacing: -0.5px; }
-        p, label, span, div { color: #717171; }
-        
-        /* HIDE HEADER & FOOTER COMPLETELY */
-        [data-testid="stHeader"], footer, [data-testid="stFooter"] { 
-            display: none !important; 
-            visibility: hidden !important; 
-            height: 0px !important; 
-            opacity: 0 !important;
-            margin: 0 !important;
-            padding: 0 !important;
-        }
-        
-        /* AGGRESSIVE WHITE BAR REMOVAL */
-        .main .block-container {
-            padding-top: 20px !important;
-            margin-top: 0px !important;
-            padding-bottom: 0px !important;
-            padding-left: 20px !important;
-            padding-right: 20px !important;
-            max-width: 100% !important;
-            gap: 0px !important;
-        }
-        
-        [data-testid="stVerticalBlock"] {
-            gap: 0rem !important;
-            padding-bottom: 0rem !important;
-        }
-        
-       /* TAB STYLES */
-        [data-testid="stRadio"] {
-            width: 100% !important;
-            padding: 0 !important;
-            background: transparent !important;
-            border-bottom: 1px solid #F2F2F2 !important;
-            margin-bottom: 24px !important;
-            display: block !important;
-        }
-
-        [data-testid="stRadio"] div[role="radiogroup"] {
-            width: 100% !important;
-            display: flex !important;
-            flex-direction: row !important;
-            justify-content: center !important; 
-            align-items: center !important;
-            gap: 24px !important; 
-            overflow-x: auto !important;
-            white-space: nowrap !important;
-            border: none !important;
-            padding: 0 !important;
-            margin: 0 !important;
-        }
-
-        [data-testid="stRadio"] label > div:first-child { display: none !important; }
-
-        [data-testid="stRadio"] div[role="radiogroup"] label {
-            cursor: pointer;
-            padding: 12px 16px !important;
-            margin: 0 !important;
-            border-bottom: 3px solid transparent;
-            display: flex !important;
-            align-items: center !important;
-            justify-content: center !important;
-        }
-        
-        [data-testid="stRadio"] div[role="radiogroup"] label p {
-            font-size: 15px !important;
-            font-weight: 600 !important;
-            color: #717171 !important;
-            margin: 0 !important;
-        }
-
-        [data-testid="stRadio"] div[role="radiogroup"] label:has(input:checked) {
-            border-bottom-color: #FF385C !important;
-        }
-        [data-testid="stRadio"] div[role="radiogroup"] label:has(input:checked) p {
-            color: #222222 !important;
-        }        
-        
-        /* CARD STYLES */
-        .airbnb-card {
-            background-color: #FFFFFF; border-radius: 16px; box-shadow: 0 6px 16px rgba(0,0,0,0.08);
-            border: 1px solid #dddddd; padding: 24px; margin-bottom: 24px;
-        }
-        
-        .status-badge {
-            background-color: #FF385C; color: white; font-size: 10px; font-weight: 800;
-            padding: 6px 10px; border-radius: 8px; text-transform: uppercase; letter-spacing: 0.5px; margin-bottom: 12px; display: inline-block;
-        }
-        .meta-bubble {
-            font-size: 12px; font-weight: 700; padding: 4px 10px; border-radius: 12px;
-            border: 1px solid #EBEBEB; white-space: nowrap; vertical-align: middle; display: inline-flex; align-items: center;
-        }
-        
-        .bubble-client { background-color: #E6FFFA; color: #008a73; border-color: #008a73; }
-        .bubble-lead { background-color: #FFF5F7; color: #FF385C; border-color: #FF385C; } 
-        .bubble-outreach { background-color: #FFFFF0; color: #D69E2E; border-color: #D69E2E; }
-        
-        .report-bubble { background-color: #F7F7F7; border-radius: 16px; padding: 20px; margin-top: 16px; border: 1px solid #EBEBEB; }
-        .transaction-bubble { background-color: #F0FFF4; border-radius: 16px; padding: 20px; margin-top: 16px; border: 1px solid #C6F6D5; }
-        
-        /* BUTTONS & ACTIONS */
-        div[data-testid="stButton"] > button, div[data-testid="stDownloadButton"] > button {
-            background-color: #FFFFFF !important;
-            border: 1px solid #EBEBEB !important; 
-            border-left: 6px solid #FF385C !important;
-            border-radius: 12px !important;
-            box-shadow: 0 4px 6px rgba(0,0,0,0.05) !important;
-            padding: 12px 20px !important;
-            font-weight: 600 !important;
-            transition: all 0.2s ease !important;
-            color: #222222 !important;
-            text-align: center !important;
-            justify-content: center !important;
-            display: flex !important;
-            width: 100% !important;
-        }
-
-        div[data-testid="stButton"] > button p, div[data-testid="stDownloadButton"] > button p {
-            color: #222222 !important;
-        }
-        
-        div[data-testid="stButton"] > button:hover, div[data-testid="stDownloadButton"] > button:hover {
-            border-color: #FF385C !important;
-            transform: translateY(-2px) !important;
-            box-shadow: 0 8px 15px rgba(255, 56, 92, 0.15) !important;
-            color: #FF385C !important;
-        }
-        div[data-testid="stButton"] > button:hover p, div[data-testid="stDownloadButton"] > button:hover p { 
-            color: #FF385C !important; 
-        }
-
-        /* ROLODEX OVERRIDES */
-        div.element-container:has(.rolodex-marker) + div.element-container button {
-            text-align: left !important;
-            justify-content: flex-start !important;
-            font-weight: 800 !important;
-        }
-        div.element-container:has(.rolodex-marker) + div.element-container button p {
-            font-weight: 800 !important;
-            color: #222222 !important;
-        }
-        div.element-container:has(.rolodex-marker) + div.element-container button > div {
-            justify-content: flex-start !important; 
-        }
-
-        div.element-container:has(.client-marker) + div.element-container button { border-left-color: #008a73 !important; }
-        div.element-container:has(.client-marker) + div.element-container button:hover {
-            border-color: #008a73 !important;
-            color: #008a73 !important;
-            box-shadow: 0 8px 15px rgba(0, 138, 115, 0.15) !important;
-        }
-        div.element-container:has(.client-marker) + div.element-container button:hover p { color: #008a73 !important; }
-
-        /* BOLD LEFT BUTTON OVERRIDES */
-        div.element-container:has(.bold-left-marker) + div.element-container button {
-            text-align: left !important;
-            justify-content: flex-start !important;
-            font-weight: 800 !important; 
-        }
-        div.element-container:has(.bold-left-marker) + div.element-container button p {
-            font-weight: 800 !important;
-        }
-        div.element-container:has(.bold-left-marker) + div.element-container button > div {
-            justify-content: flex-start !important; 
-        }
-
-        /* ANALYTICS & STATS */
-        .analytics-card {
-            background-color: #FFFFFF;
-            border: 1px solid #EBEBEB;
-            border-radius: 12px;
-            box-shadow: 0 4px 6px rgba(0,0,0,0.05);
-            padding: 16px 20px;
-            margin-bottom: 12px;
-            width: 100%;
-            display: flex;
-            flex-direction: column;
-            justify-content: center;
-            align-items: flex-start;
-        }
-        .analytics-card-red { border-left: 6px solid #FF385C; }
-        .analytics-card-green { border-left: 6px solid #008a73; }
-        
-        .stat-title { font-size: 11px; font-weight: 800; color: #717171; text-transform: uppercase; letter-spacing: 0.8px; margin-bottom: 6px; }
-        .stat-metric { font-size: 26px; font-weight: 900; color: #222222; margin: 0; line-height: 1.1; }
-        .stat-sub { font-size: 14px; font-weight: 500; color: #717171; margin-top: 4px; }
-
-        /* INPUT FIELDS */
-        div[data-baseweb="input"], div[data-baseweb="select"], div[data-baseweb="textarea"], div[data-testid="stMarkdownContainer"] textarea {
-            background-color: #F7F7F7 !important;
-            color: #222222 !important;
-            border: 1px solid transparent !important;
-            border-radius: 12px !important;
-        }
-        div[data-baseweb="base-input"] {
-            background-color: transparent !important;
-            border: none !important;
-            width: 100% !important;
-        }
-        input, textarea, select {
-            color: #222222 !important;
-            background-color: transparent !important;
-            font-weight: 500 !important; 
-            caret-color: #FF385C !important; 
-            width: 100% !important;
-        }
-        input::placeholder, textarea::placeholder {
-            color: #717171 !important;
-            opacity: 1 !important;
-            -webkit-text-fill-color: #717171 !important;
-        }
-        div[data-baseweb="input"]:focus-within, div[data-baseweb="base-input"]:focus-within { 
-            border: 1px solid #222222 !important; 
-            background-color: #FFFFFF !important; 
-        }
-        div[data-baseweb="select"] > div {
-            background-color: #F7F7F7 !important;
-            color: #222222 !important;
-        }
-        div[data-baseweb="select"] svg {
-            fill: #222222 !important; 
-        }
-        ul[data-baseweb="menu"] {
-            background-color: #FFFFFF !important;
-        }
-        li[data-baseweb="menu-item"] {
-            color: #222222 !important;
-        }
-        
-        button[kind="primary"] { 
-            background-color: #FF385C !important; color: white !important; border: none !important; 
-            text-align: center !important; justify-content: center !important; padding: 12px 24px !important; border-left: none !important; 
-        }
-        button[kind="primary"] p { color: white !important; text-align: center !important; width: 100% !important; justify-content: center !important; }
-        button[kind="primary"] > div { justify-content: center !important; }
-        button[kind="primary"]:hover { box-shadow: 0 4px 12px rgba(255, 56, 92, 0.4) !important; transform: none !important; }
-        
-        [data-testid="stAudioInput"] { background-color: #F7F7F7 !important; border-radius: 50px !important; border: none !important; color: #222 !important; padding: 5px !important; }
-        
-        .card-title {
-            font-size: 22px; font-weight: 800; color: #222222; margin: 0; line-height: 1.2;
-            display: flex; flex-wrap: wrap; align-items: center; gap: 8px;
-        }
-        .stat-grid { display: grid; grid-template-columns: 1fr 1fr; gap: 16px; margin-top: 20px; }
-        .stat-item { background: #F7F7F7; padding: 12px; border-radius: 12px; }
-        .stat-label { font-size: 10px; font-weight: 700; text-transform: uppercase; color: #717171; letter-spacing: 0.5px; }
-        .stat-value { font-size: 14px; font-weight: 600; color: #222222; margin-top: 4px; line-height: 1.3; }
-        
-        .referral-box {
-            background-color: #F7F7F7;
-            border: 1px dashed #dddddd;
-            border-radius: 12px;
-            padding: 16px;
-            margin-bottom: 24px;
-            text-align: center;
-        }
-        .referral-link {
-            font-family: monospace;
-            background: #ffffff;
-            padding: 8px;
-            border-radius: 6px;
-            border: 1px solid #eee;
-            color: #FF385C;
-            font-weight: 600;
-            word-break: break-all;
-        }
-        .stCodeBlock {
-            background-color: #F7F7F7 !important;
-            border-radius: 12px !important;
-            border: 1px dashed #dddddd !important;
-        }
-        
-        .profile-container {
-            display: flex;
-            justify-content: flex-end;
-        }
-    </style>
-""", unsafe_allow_html=True)
+inject_static_assets()
 
 # ==========================================
 # 4. DATA & LOGIC HELPERS
 # ==========================================
+# Profile rows are read at login, at checkout and on every rerun of the profile
+# overlay. Keep them in a process-wide TTL cache keyed by user id; writes to a
+# profile call invalidate_user_profile(). The TTL bounds staleness for changes
+# made elsewhere (e.g. commission credited by the webhook server).
+PROFILE_CACHE_TTL = 120  # seconds
+
+@st.cache_resource
+def init_profile_cache():
+    return TTLCache(max_size=5000, ttl=PROFILE_CACHE_TTL)
+
+profile_cache = init_profile_cache()
+
+def invalidate_user_profile(user_id):
+    """Drops the cached profile for user_id (call after writing to the profile)."""
+    profile_cache.pop(user_id)
+
 def fetch_user_profile(user_id):
+    """Returns the profile row (cached, treat as read-only)."""
+    cached = profile_cache.get(user_id)
+    if cached is not None: return cached
     try:
-        response = supabase.table("profiles").select("*").eq("id", user_id).execute()
-        if response.data: return response.data[0]
+        response = db().table("profiles").select("*").eq("id", user_id).execute()
+        if response.data:
+            profile_cache.set(user_id, response.data[0])
+            return response.data[0]
     except: return None
 
-def count_user_referrals(user_id):
-    """Counts how many users have this user_id as their referrer"""
+def count_user_referrals(profile):
+    """
+    Returns (total, paying) referrals from the denormalized counters on the profile.
+    Maintained by link_referrer / set_subscription_active, see supabase/migrations.
+    """
+    if not profile: return 0, 0
+    return profile.get('referral_count') or 0, profile.get('active_referral_count') or 0
+
+def fetch_downline_counts(user_id):
+    """
+    Returns [{depth, total, active}] for every level of the user's downline.
+    One indexed query on referral_closure (downline_counts RPC), cached like profiles.
+    """
+    key = f"downline:{user_id}"
+    cached = profile_cache.get(key)
+    if cached is not None: return cached
     try:
-        res = supabase.table("profiles").select("id", count="exact").eq("referred_by", user_id).execute()
-        return res.count
-    except: return 0
+        levels = db().rpc("downline_counts", {"p_user": user_id}).execute().data or []
+        profile_cache.set(key, levels)
+        return levels
+    except Exception as e:
+        print(f"Downline Error: {e}")
+        return []
 
+@tracing.traced("stripe check_subscription")
 def check_subscription_status(email):
     # FIX: FAIL SAFE - If Stripe is missing, return FALSE (Not Subscribed)
     if not STRIPE_SECRET_KEY: 
         return False
         
+    stripe = stripe_api()
     try:
         customers = stripe.Customer.list(email=email).data
         if not customers: return False
@@ -419,27 +399,122 @@ def check_subscription_status(email):
         return len(subscriptions) > 0
     except: return False
 
+# --- PERSISTENT LOGIN HELPERS ---
+def sign_entitlement_stamp(user_id, is_subscribed):
+    """Returns a '<payload>.<hmac>' stamp recording the user's subscription flag until ENTITLEMENT_STAMP_TTL."""
+    expires_at = int((datetime.now(timezone.utc) + ENTITLEMENT_STAMP_TTL).timestamp())
+    payload = f"{user_id}:{int(bool(is_subscribed))}:{expires_at}"
+    body = base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+    sig = hmac.new(SESSION_COOKIE_SECRET.encode(), body.encode(), hashlib.sha256).hexdigest()
+    return f"{body}.{sig}"
+
+def read_entitlement_stamp(stamp, user_id):
+    """Returns the stamped subscription flag, or None if the stamp is missing, forged, expired or for another user."""
+    if not stamp or not SESSION_COOKIE_SECRET: return None
+    try:
+        body, sig = stamp.rsplit(".", 1)
+        expected = hmac.new(SESSION_COOKIE_SECRET.encode(), body.encode(), hashlib.sha256).hexdigest()
+        if not hmac.compare_digest(sig, expected): return None
+        payload = base64.urlsafe_b64decode(body + "=" * (-len(body) % 4)).decode()
+        stamp_user, subscribed, expires_at = payload.rsplit(":", 2)
+        if stamp_user != str(user_id) or int(expires_at) < datetime.now(timezone.utc).timestamp(): return None
+        return subscribed == "1"
+    except Exception: return None
+
+def remember_auth_session(auth_response):
+    """Keeps the user and the session tokens from a Supabase AuthResponse in session state."""
+    session = auth_response.session
+    st.session_state.user = auth_response.user
+    st.session_state.refresh_token = session.refresh_token if session else None
+    st.session_state.access_token = session.access_token if session else None
+    st.session_state.token_expires_at = session.expires_at if session else None
+
+def restore_session_from_cookie():
+    """Called on every run. Signs a logged-out session back in from the persistent login cookie (first run only)."""
+    if not SESSION_COOKIE_SECRET: return
+
+    # Sign-out requested on the previous run: drop the cookie instead of restoring from it
+    if st.session_state.clear_session_cookie:
+        cookie_writer().delete(SESSION_COOKIE_NAME, key="delete_session_cookie")
+        st.session_state.clear_session_cookie = False
+        return
+
+    # The request cookies are fixed for the whole websocket session, so only the
+    # first run may use them (later they may hold a cookie deleted at sign-out)
+    if st.session_state.cookie_restore_done: return
+    st.session_state.cookie_restore_done = True
+    if st.session_state.user or not supabase_pool: return
+    saved = request_cookie(SESSION_COOKIE_NAME)
+    if not saved or "|" not in str(saved): return
+    refresh_token, stamp = str(saved).split("|", 1)
+
+    try:
+        res = supabase_pool.auth().refresh_session(refresh_token)
+    except Exception:
+        # Revoked or expired refresh token: forget it and show the login screen
+        cookie_writer().delete(SESSION_COOKIE_NAME, key="delete_session_cookie")
+        return
+    if not res.user: return
+
+    remember_auth_session(res)
+    stamped = read_entitlement_stamp(stamp, res.user.id)
+    if stamped is None:
+        st.session_state.is_subscribed = check_subscription_status(res.user.email)
+    else:
+        st.session_state.is_subscribed = stamped
+        st.session_state.entitlement_stamp = stamp
+
+def sync_session_cookie():
+    """Writes the login cookie once the user is signed in, and again only when its contents change."""
+    user = st.session_state.user
+    if not SESSION_COOKIE_SECRET or not user or not st.session_state.refresh_token: return
+
+    stamped = read_entitlement_stamp(st.session_state.entitlement_stamp, user.id)
+    if stamped is None and st.session_state.entitlement_stamp:
+        # Stamp lapsed during a long-lived session: the one point we go back to Stripe
+        st.session_state.is_subscribed = check_subscription_status(user.email)
+    if stamped != st.session_state.is_subscribed:
+        st.session_state.entitlement_stamp = sign_entitlement_stamp(user.id, st.session_state.is_subscribed)
+
+    value = f"{st.session_state.refresh_token}|{st.session_state.entitlement_stamp}"
+    if value == st.session_state.session_cookie_value: return
+    # NOTE: Written from the component iframe, so the cookie cannot be HttpOnly; Secure + SameSite still apply.
+    cookie_writer().set(
+        SESSION_COOKIE_NAME, value, key="set_session_cookie",
+        expires_at=datetime.now() + timedelta(days=SESSION_COOKIE_DAYS),
+        secure=True, same_site="strict"
+    )
+    st.session_state.session_cookie_value = value
+
+@tracing.traced("stripe create_checkout_session")
 def create_checkout_session(email, user_id):
     if not STRIPE_SECRET_KEY: return None
+    stripe = stripe_api()
     try:
         customers = stripe.Customer.list(email=email).data
-        customer_id = customers[0].id if customers else stripe.Customer.create(email=email).id
+        customer_id = customers[0].id if customers else stripe.Customer.create(email=email, metadata={'user_id': user_id}).id
         profile = fetch_user_profile(user_id)
-        metadata = {'referred_by': profile.get('referred_by')} if profile and profile.get('referred_by') else {}
+        # The webhook resolves payer + referrer from this metadata without any lookup
+        metadata = {'user_id': user_id}
+        if profile and profile.get('referred_by'): metadata['referred_by'] = profile.get('referred_by')
         session = stripe.checkout.Session.create(
             customer=customer_id,
+            client_reference_id=user_id,
             payment_method_types=['card'],
             line_items=[{'price': STRIPE_PRICE_ID, 'quantity': 1}],
             mode='subscription',
             success_url=f"{APP_BASE_URL}?session_id={{CHECKOUT_SESSION_ID}}",
             cancel_url=f"{APP_BASE_URL}",
-            metadata=metadata
+            metadata=metadata,
+            # Copied onto the subscription, and from there onto every invoice it generates
+            subscription_data={'metadata': metadata}
         )
         return session.url
     except Exception as e:
         st.error(f"Stripe Error: {e}")
         return None
 
+@tracing.traced("stripe cancel_subscription")
 def cancel_active_subscription(email):
     """
     Cancels the user's subscription at the end of the current billing period.
@@ -447,6 +522,7 @@ def cancel_active_subscription(email):
     """
     if not STRIPE_SECRET_KEY: return False, "Stripe configuration missing."
     
+    stripe = stripe_api()
     try:
         # 1. Find the Stripe Customer by Email
         customers = stripe.Customer.list(email=email).data
@@ -473,6 +549,7 @@ def ensure_referral_link(user_id, user_meta, ref_override=None):
     """
     Called on login.
     Links the new user to their Direct Referrer (Tier 1).
+    link_referrer also records every higher tier in referral_closure.
     Now accepts an override for Google Login flow.
     """
     try:
@@ -486,7 +563,10 @@ def ensure_referral_link(user_id, user_meta, ref_override=None):
         referrer_id = ref_override if ref_override else user_meta.get('referred_by')
         
         if referrer_id:
-             supabase.table("profiles").update({'referred_by': referrer_id}).eq("id", user_id).execute()
+             # Sets referred_by and bumps the referrer's referral_count atomically (no-op if already linked)
+             db().rpc("link_referrer", {"p_user": user_id, "p_referrer": referrer_id}).execute()
+             invalidate_user_profile(user_id)
+             invalidate_user_profile(referrer_id)
     except Exception as e:
         print(f"Hierarchy Error: {e}")
 
@@ -502,8 +582,79 @@ def format_contact_details(contact_info):
 # 5. OMNI-TOOL BACKEND (AI CORE)
 # ==========================================
 api_key = os.getenv("GOOGLE_API_KEY")
-client = genai.Client(api_key=api_key) if api_key else None
-TEXT_MODEL_ID = "gemini-2.0-flash"
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL")  # optional override, used by bench/
+
+@st.cache_resource
+def gemini_client():
+    """Gemini client (google.genai imported on first use), or None without an API key."""
+    if not api_key: return None
+    from google import genai
+    from google.genai import types
+    return genai.Client(
+        api_key=api_key,
+        http_options=types.HttpOptions(base_url=GEMINI_BASE_URL) if GEMINI_BASE_URL else None,
+    )
+
+# Per-user pace and process-wide concurrency for voice commands. The wait happens on
+# a voice_jobs worker, behind the "Analyzing" spinner; view_omni checks the pace first.
+GEMINI_USER_RATE = float(os.getenv("GEMINI_USER_RATE", "0.2"))          # commands/s per user (one per 5 s sustained)
+GEMINI_USER_BURST = int(os.getenv("GEMINI_USER_BURST", "5"))
+GEMINI_MAX_CONCURRENT = int(os.getenv("GEMINI_MAX_CONCURRENT", "8"))     # calls in flight, all users
+GEMINI_MAX_WAIT = float(os.getenv("GEMINI_MAX_WAIT", "30"))
+
+@st.cache_resource
+def gemini_admission():
+    return rate_limit.Admission("gemini", GEMINI_USER_RATE, GEMINI_USER_BURST, GEMINI_MAX_CONCURRENT, max_wait=GEMINI_MAX_WAIT)
+
+def throttled_message(e):
+    """What to tell the user for a rate_limit.Throttled."""
+    seconds = max(1, round(e.retry_after))
+    if e.reason == "rate": return f"You're going a little fast. Please wait {seconds}s and try again."
+    return f"Lots of requests right now. Please wait {seconds}s and try again."
+
+# Model per command by clip length, Rolodex size and tier health (see model_router.py).
+# MODEL_ROUTING=0 pins every command to the standard tier; calls are still counted per tier.
+MODEL_ROUTING = os.getenv("MODEL_ROUTING", "1") == "1"
+
+@st.cache_resource
+def model_router():
+    return ModelRouter()
+
+# --- NEW: SEMANTIC SEARCH OVER NOTES & PRODUCT FIT (see semantic_index.py) ---
+SEMANTIC_EMBEDDER = os.getenv("SEMANTIC_EMBEDDER", "hashing")  # "gemini" for Gemini embeddings
+SEMANTIC_INDEX_DIR = os.getenv("SEMANTIC_INDEX_DIR", "semantic_index")  # empty: memory only
+SEMANTIC_MIN_SCORE = 0.15
+SEMANTIC_RESULTS = 20
+
+@st.cache_resource
+def lead_search_index():
+    if SEMANTIC_EMBEDDER == "gemini" and gemini_client():
+        embedder = semantic_index.GeminiEmbedder(gemini_client())
+    else:
+        embedder = semantic_index.HashingEmbedder()
+    return semantic_index.SemanticIndex(embedder, SEMANTIC_INDEX_DIR or None)
+
+def index_lead_writes(user_id, leads):
+    """Re-embeds written leads whose notes/product fit changed. Never fails the write itself."""
+    try: lead_search_index().upsert(user_id, leads)
+    except Exception as e: print(f"Semantic Index Error (upsert): {e}")
+
+def semantic_lead_search(user_id, sb, question, k=SEMANTIC_RESULTS):
+    """Full lead rows best matching a free-text question, best first."""
+    index = lead_search_index()
+    if index.needs_sync(user_id):
+        # Picks up leads written outside this process; only changed texts are re-embedded
+        rows = sb.table("leads").select("id, background, product_pitch").eq("user_id", user_id).execute().data
+        index.sync(user_id, rows)
+    hits = index.search(user_id, question, k=k, min_score=SEMANTIC_MIN_SCORE)
+    if not hits: return []
+    rows = sb.table("leads").select("*").eq("user_id", user_id).in_("id", [lead_id for lead_id, _ in hits]).execute().data
+    by_id = {str(row['id']): row for row in rows}
+    return [by_id[lead_id] for lead_id, _ in hits if lead_id in by_id]
+
+# Share of voice commands still sent down the old prose-JSON path (0 = all schema-enforced).
+# Both paths count into omni_responses_total{path, outcome} so their failure rates can be compared.
+OMNI_LEGACY_SHARE = float(os.getenv("OMNI_LEGACY_SHARE", "0"))
 
 def clean_json_string(json_str):
     json_str = json_str.strip()
@@ -512,25 +663,59 @@ def clean_json_string(json_str):
     if json_str.endswith("```"): json_str = json_str[:-3]
     return json_str
 
-def load_leads_summary():
-    if not st.session_state.user or not supabase: return []
+LEAD_SUMMARY_COLUMNS = "id, name, background, contact_info, status, next_outreach, transactions, product_pitch"
+PROMPT_LEAD_FIELDS = [c.strip() for c in LEAD_SUMMARY_COLUMNS.split(",")]
+# The voice pipeline also loads the typed timestamps lead_query filters on (not sent to the model)
+VOICE_LEAD_COLUMNS = LEAD_SUMMARY_COLUMNS + ", created_at, next_outreach_at"
+
+# The voice pipeline below runs on a voice_jobs worker thread, which has no
+# st.session_state: every helper takes the user id and PostgREST client explicitly.
+def load_leads_summary(user_id, sb):
+    if not user_id or not sb: return []
     try:
-        response = supabase.table("leads").select("id, name, background, contact_info, status, next_outreach, transactions, product_pitch").eq("user_id", st.session_state.user.id).execute()
+        response = sb.table("leads").select(VOICE_LEAD_COLUMNS).eq("user_id", user_id).execute()
         return response.data
+    except rate_limit.Throttled: raise  # an empty Rolodex would turn every UPDATE into a CREATE
     except: return []
 
+def find_lead_by_contact(user_id, sb, contact_info):
+    """Existing lead with the same normalized phone or email (unique-per-user indexes), or None."""
+    if not user_id: return None
+    keys = {col: val for col, val in contact_keys(contact_info).items() if val}
+    if not keys: return None
+    try:
+        match_filter = ",".join(f'{col}.eq."{val}"' for col, val in keys.items())
+        res = sb.table("leads").select(LEAD_SUMMARY_COLUMNS).eq("user_id", user_id).or_(match_filter).limit(1).execute()
+        return res.data[0] if res.data else None
+    except rate_limit.Throttled: raise  # "no duplicate" would create one
+    except: return None
+
 # --- NEW: RETRY DECORATOR WRAPPER FOR GEMINI ---
-@retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=2, max=10))
-def generate_gemini_response(audio_bytes, prompt):
-    response = client.models.generate_content(
-        model=TEXT_MODEL_ID,
-        contents=[types.Part.from_bytes(data=audio_bytes, mime_type="audio/wav"), prompt],
-        config=types.GenerateContentConfig(response_mime_type="application/json")
-    )
+# Throttled is not retried: it already waited its turn (GEMINI_MAX_WAIT)
+@retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=2, max=10),
+       retry=retry_if_not_exception_type(rate_limit.Throttled),
+       before_sleep=lambda state: tracing.incr("gemini_retries_total"))
+@tracing.traced("gemini generate_content")
+def generate_gemini_response(audio_bytes, prompt, response_schema=None, model=STANDARD_MODEL_ID, user_id=None):
+    from google.genai import types
+    tracing.annotate(model=model)
+    with gemini_admission().slot(user_id):
+        response = gemini_client().models.generate_content(
+            model=model,
+            contents=[types.Part.from_bytes(data=audio_bytes, mime_type="audio/wav"), prompt],
+            config=types.GenerateContentConfig(response_mime_type="application/json", response_schema=response_schema)
+        )
+    usage = response.usage_metadata
+    if usage:
+        path = "schema" if response_schema else "legacy"
+        tracing.annotate(prompt_tokens=usage.prompt_token_count, output_tokens=usage.candidates_token_count, path=path)
+        tracing.incr("gemini_tokens_total", usage.prompt_token_count or 0, kind="prompt", path=path)
+        tracing.incr("gemini_tokens_total", usage.candidates_token_count or 0, kind="output", path=path)
     return response
 
-def process_omni_voice(audio_bytes, existing_leads_context):
-    leads_json = json.dumps(existing_leads_context)
+def process_omni_voice(audio_bytes, existing_leads_context, user_id=None):
+    """Gemini's reading of one clip as a dict (see omni_schema.OmniResult.to_dict), or {"error": ...}."""
+    leads_json = json.dumps([{k: lead.get(k) for k in PROMPT_LEAD_FIELDS} for lead in existing_leads_context])
     est_now = datetime.now() - timedelta(hours=5)
     current_date_str = est_now.strftime("%Y-%m-%d %H:%M")
     
@@ -554,8 +739,49 @@ def process_omni_voice(audio_bytes, existing_leads_context):
     - **Meeting/Outreach**: If a specific meeting date/time is mentioned, set 'next_outreach' to strict ISO 8601 format (YYYY-MM-DDTHH:MM:SS). 
       - Calculate relative dates (e.g., "in 5 days", "next week") starting from TODAY ({current_date_str}), NOT from any existing meeting date.
       - The new date MUST REPLACE the old one. If vague, use text.
-    - **SILENCE / NOISE / UNINTELLIGIBLE**: If the audio is silent, background noise, mumbling, or lacks a clear name/intent, you MUST return:
-      {{ "error": "No clear speech detected. Please try again." }}
+    """
+    silence_error = "No clear speech detected. Please try again."
+
+    router = model_router()
+    tier = router.choose(audio_seconds(audio_bytes), len(existing_leads_context)) if MODEL_ROUTING else router.standard
+    path = "legacy" if OMNI_LEGACY_SHARE and secrets.randbelow(1000) < OMNI_LEGACY_SHARE * 1000 else "schema"
+    started = time.perf_counter()
+    if path == "legacy":
+        result, outcome, response = process_omni_voice_legacy(audio_bytes, prompt, silence_error, tier.model, user_id)
+    else:
+        result, outcome, response = process_omni_voice_schema(audio_bytes, prompt, silence_error, tier.model, user_id)
+
+    tracing.incr("omni_responses_total", path=path, outcome=outcome)
+    if outcome == "throttled": return result  # never reached the model: says nothing about the tier's health
+    usage = response.usage_metadata if response is not None else None
+    router.record(tier, time.perf_counter() - started, outcome,
+                  usage.prompt_token_count if usage else None, usage.candidates_token_count if usage else None)
+    return result
+
+# Both paths return (result dict, outcome for omni_responses_total, raw response or None)
+def process_omni_voice_schema(audio_bytes, prompt, silence_error, model, user_id=None):
+    prompt += f"""- **SILENCE / NOISE / UNINTELLIGIBLE**: If the audio is silent, background noise, mumbling, or lacks a clear name/intent, set "error" to "{silence_error}" and nothing else.
+    - Otherwise leave "error" null; "match_id" is the Rolodex id for UPDATE (or QUERY about a known lead).
+    - **Questions about many leads** (how many, who is overdue, clients closed this month, totals by status): do NOT answer them yourself. Set "action" to "QUERY" and fill "query": filters on the listed fields ('now' or YYYY-MM-DD for dates; last_sale_at is the latest sale), "aggregate" "count" or "list", optional "group_by"/"sort_by"/"limit", and a short "title". The app computes the exact answer. Leave "query" null for a question about one person.
+    """
+    try:
+        response = generate_gemini_response(audio_bytes, prompt, omni_schema.RESPONSE_SCHEMA, model, user_id)
+    except rate_limit.Throttled as e:
+        return {"error": throttled_message(e)}, "throttled", None
+    except Exception:
+        # Graceful error if retries fail
+        return {"error": "AI system is busy. Please try again in a moment."}, "api_error", None
+    try:
+        result = omni_schema.parse(response)
+    except omni_schema.OmniSchemaError as e:
+        print(f"Omni Schema Error: {e}")
+        return {"error": "Audio unclear. Please try again."}, "invalid", response
+    return result.to_dict(), "no_speech" if result.error else "ok", response
+
+def process_omni_voice_legacy(audio_bytes, prompt, silence_error, model, user_id=None):
+    """Pre-schema path (JSON described in the prompt, fences stripped by hand); kept for comparison via OMNI_LEGACY_SHARE."""
+    prompt += f"""- **SILENCE / NOISE / UNINTELLIGIBLE**: If the audio is silent, background noise, mumbling, or lacks a clear name/intent, you MUST return:
+      {{ "error": "{silence_error}" }}
 
     RETURN ONLY RAW JSON (or the error JSON above):
     {{
@@ -575,15 +801,29 @@ def process_omni_voice(audio_bytes, existing_leads_context):
     """
     try:
         # Use the retrying helper function
-        response = generate_gemini_response(audio_bytes, prompt)
-        return json.loads(clean_json_string(response.text))
-    except Exception as e: 
-        # Graceful error if retries fail
-        return {"error": "AI system is busy. Please try again in a moment."}
-
-def save_new_lead(lead_data):
-    if not st.session_state.user: return None
-    lead_data['user_id'] = st.session_state.user.id
+        response = generate_gemini_response(audio_bytes, prompt, model=model, user_id=user_id)
+    except rate_limit.Throttled as e:
+        return {"error": throttled_message(e)}, "throttled", None
+    except Exception:
+        return {"error": "AI system is busy. Please try again in a moment."}, "api_error", None
+    try:
+        result = json.loads(clean_json_string(response.text))
+    except ValueError:
+        return {"error": "AI system is busy. Please try again in a moment."}, "invalid", response
+    if isinstance(result, list):
+        result = result[0] if len(result) > 0 else {"error": "AI returned empty list."}
+    if not isinstance(result, dict):
+        return {"error": "Audio unclear. Please try again."}, "invalid", response
+    # Same checks as the schema path, counted only: this path keeps its old behavior
+    try:
+        outcome = "no_speech" if omni_schema.validate(result).error else "ok"
+    except omni_schema.OmniSchemaError:
+        outcome = "invalid"
+    return result, outcome, response
+
+def save_new_lead(user_id, sb, lead_data):
+    if not user_id: return None
+    lead_data['user_id'] = user_id
     lead_data['created_at'] = datetime.now().isoformat()
     if not lead_data.get('status'): lead_data['status'] = 'Lead'
     
@@ -592,16 +832,23 @@ def save_new_lead(lead_data):
         if lead_data['transaction_item']:
             lead_data['transactions'] = f"{datetime.now().strftime('%Y-%m-%d')}: {lead_data['transaction_item']}"
         del lead_data['transaction_item']
+
+    # Typed copy of next_outreach for the "Due Soon" range queries
+    lead_data.update(outreach_fields(lead_data.get('next_outreach')))
+    # Normalized phone/email keys for duplicate detection
+    lead_data.update(contact_keys(lead_data.get('contact_info')))
         
     try: 
-        res = supabase.table("leads").insert(lead_data).execute()
+        res = sb.table("leads").insert(lead_data).execute()
         if res.data:
+            index_lead_writes(user_id, res.data[:1])
             return res.data[0]
         return None
+    except rate_limit.Throttled: raise
     except Exception as e: return str(e)
 
-def update_existing_lead(lead_id, new_data, existing_leads_context):
-    if not st.session_state.user: return "Not logged in"
+def update_existing_lead(user_id, sb, lead_id, new_data, existing_leads_context):
+    if not user_id: return "Not logged in"
     
     original = next((item for item in existing_leads_context if str(item["id"]) == str(lead_id)), None)
     
@@ -631,13 +878,66 @@ def update_existing_lead(lead_id, new_data, existing_leads_context):
         "next_outreach": new_data.get('next_outreach') or original.get('next_outreach'), 
         "transactions": final_tx
     }
+    if new_data.get('next_outreach'):
+        final_data.update(outreach_fields(new_data['next_outreach']))
+    if new_data.get('contact_info'):
+        final_data.update(contact_keys(new_data['contact_info']))
 
     try:
-        supabase.table("leads").update(final_data).eq("id", lead_id).execute()
+        sb.table("leads").update(final_data).eq("id", lead_id).execute()
         final_data['id'] = lead_id
+        index_lead_writes(user_id, [final_data])
         return final_data 
+    except rate_limit.Throttled: raise
     except Exception as e: return str(e)
 
+def run_voice_command(user_id, sb, audio_bytes):
+    """
+    Whole voice pipeline for one clip: Gemini, duplicate check, then the lead write.
+    Returns the result card data, or {"error": ...} for anything the user should retry.
+    """
+    try:
+        return voice_command_result(user_id, sb, audio_bytes)
+    except rate_limit.Throttled as e:
+        # Supabase admission (see 2): stop here rather than act on a partial read
+        return {"error": throttled_message(e)}
+
+def voice_command_result(user_id, sb, audio_bytes):
+    existing_leads = load_leads_summary(user_id, sb)
+    result = process_omni_voice(audio_bytes, existing_leads, user_id)
+    if "error" in result: return result
+
+    action = result.get('action')
+    lead_data = result.get('lead_data') or {}
+    if action == "QUERY" and result.get('query'):
+        # Aggregate question: exact answer computed here from the rows already loaded
+        try:
+            result['query_result'] = lead_query.execute(lead_query.validate(result['query']), existing_leads)
+        except lead_query.LeadQueryError as e:
+            print(f"Lead Query Error: {e}")
+            return {"error": "Could not answer that question. Try rephrasing it."}
+        return result
+    if action == "QUERY" and not lead_data.get('name'):
+        return {"error": "Audio unclear. Please try again."}
+
+    if action == "CREATE":
+        # Same phone/email already in the Rolodex: indexed lookup, then update it instead
+        duplicate = find_lead_by_contact(user_id, sb, lead_data.get('contact_info'))
+        if duplicate:
+            action = result['action'] = "UPDATE"
+            result['match_id'] = duplicate['id']
+            existing_leads = [duplicate]
+
+    if action == "CREATE":
+        saved_record = save_new_lead(user_id, sb, lead_data)
+        if saved_record and isinstance(saved_record, dict): result['lead_data']['id'] = saved_record.get('id')
+
+    elif action == "UPDATE" and result.get('match_id'):
+        saved_data = update_existing_lead(user_id, sb, result['match_id'], lead_data, existing_leads)
+        if isinstance(saved_data, dict): result['lead_data'] = saved_data
+        else: return {"error": saved_data}
+    return result
+
 def create_vcard(data):
     lead_info = data.get('lead_data', data)
     vcard = [
@@ -705,9 +1005,22 @@ def render_profile_view_overlay():
     st.subheader("Profile")
     st.markdown('<div class="bold-left-marker"></div>', unsafe_allow_html=True)
     if st.button("Sign Out", key="logout_btn", type="secondary", use_container_width=True):
-        supabase.auth.sign_out()
+        try:
+            # Revoke this user's refresh tokens without touching anyone else's session
+            supabase_pool.auth().admin.sign_out(st.session_state.access_token)
+        except Exception as e:
+            print(f"Sign Out Error: {e}")
+        supabase_pool.release(st.session_state.user.id)
         st.session_state.user = None
+        st.session_state.refresh_token = None
+        st.session_state.access_token = None
+        st.session_state.token_expires_at = None
+        st.session_state.google_auth_url = None
+        st.session_state.entitlement_stamp = None
+        st.session_state.session_cookie_value = None
+        st.session_state.clear_session_cookie = True
         st.session_state.show_profile = False
+        rotate_session_id()
         st.rerun()
 
     # Cancel Subscription with Confirmation Dialog
@@ -723,7 +1036,7 @@ def render_profile_view_overlay():
     my_profile = fetch_user_profile(st.session_state.user.id)
     if my_profile:
         balance = my_profile.get('commission_balance') or 0.00
-        ref_count = count_user_referrals(st.session_state.user.id)
+        ref_count, paying_count = count_user_referrals(my_profile)
         
         saved_method = my_profile.get('payout_method') or "Venmo"
         saved_handle = my_profile.get('payout_handle') or ""
@@ -740,12 +1053,25 @@ def render_profile_view_overlay():
             </div>
             
             <div class="analytics-card analytics-card-green" style="margin-bottom: 16px;">
-                <div class="stat-title">ACTIVE REFERRALS</div>
+                <div class="stat-title">REFERRALS</div>
                 <div class="stat-metric">{ref_count}</div>
-                <div class="stat-sub">Users signed up with your code</div>
+                <div class="stat-sub">Users signed up with your code · {paying_count} subscribed</div>
             </div>
         """, unsafe_allow_html=True)
 
+        # Deeper levels of the network (level 1 is the card above)
+        # (no direct referrals means no downline at all, so skip the query)
+        deeper = [l for l in fetch_downline_counts(st.session_state.user.id) if l['depth'] > 1] if ref_count else []
+        if deeper:
+            rows = "".join(f"<div class=\"stat-sub\">Level {l['depth']}: {l['total']} users · {l['active']} subscribed</div>" for l in deeper)
+            st.markdown(f"""
+                <div class="analytics-card analytics-card-green" style="margin-bottom: 16px;">
+                    <div class="stat-title">YOUR NETWORK</div>
+                    <div class="stat-metric">{ref_count + sum(l['total'] for l in deeper)}</div>
+                    {rows}
+                </div>
+            """, unsafe_allow_html=True)
+
         # 2. REFERRAL LINK
         st.caption("Your Referral Link")
         st.code(referral_link, language="text")
@@ -773,13 +1099,74 @@ def render_profile_view_overlay():
             new_handle = st.text_input(f"Your {new_method} Handle", value=saved_handle, placeholder=placeholders.get(new_method, ""))
             
             if st.form_submit_button("Update Details"):
-                supabase.table("profiles").update({
+                db().table("profiles").update({
                     "payout_method": new_method, 
                     "payout_handle": new_handle
                 }).eq("id", st.session_state.user.id).execute()
+                invalidate_user_profile(st.session_state.user.id)
                 st.success("Details saved.")
                 st.rerun()
 
+    # --- ADMIN ONLY: DIAGNOSTICS ---
+    if is_admin():
+        render_diagnostics_panel()
+
+def is_admin():
+    user = st.session_state.user
+    return bool(user and (getattr(user, "email", "") or "").lower() in ADMIN_EMAILS)
+
+def render_diagnostics_panel():
+    """Per-rerun span timings for this session plus process-wide p50/p95 (same data as /metrics)."""
+    import pandas as pd
+    st.markdown("---")
+    st.subheader("Diagnostics")
+
+    # The newest trace belongs to the rerun drawing this panel and is still open
+    finished = list(st.session_state.trace_history)[:-1]
+    if finished:
+        st.caption("Recent reruns (this session)")
+        st.dataframe(pd.DataFrame([{
+            "at": datetime.fromtimestamp(t.started_at).strftime("%H:%M:%S"),
+            "view": t.label,
+            "ms": round(t.elapsed_ms, 1),
+            "spans": len(t.spans),
+        } for t in reversed(finished)]), hide_index=True, use_container_width=True)
+
+    # Reruns cut short by st.rerun() before any work have no spans; show the last one that did something
+    last = next((t for t in reversed(finished) if t.spans), None)
+    if last:
+        st.caption(f"Spans of the last rerun ({last.label})")
+        st.dataframe(pd.DataFrame([{
+            "span": sp["name"],
+            "start ms": round(sp["start_ms"], 1),
+            "ms": round(sp["ms"], 1),
+            "details": ", ".join(f"{k}={v}" for k, v in sp["attrs"].items()),
+        } for sp in last.spans]), hide_index=True, use_container_width=True)
+
+    summary = tracing.metrics.summary()
+    if summary:
+        st.caption("Process-wide latency (recent window)")
+        st.dataframe(pd.DataFrame([
+            {"span": name, "count": row["count"], "errors": row["errors"],
+             "p50 ms": round(row["p50_ms"], 1), "p95 ms": round(row["p95_ms"], 1), "max ms": round(row["max_ms"], 1)}
+            for name, row in summary.items()
+        ]), hide_index=True, use_container_width=True)
+
+    cache = st.session_state.get('rolodex_cache')
+    if cache and cache.stats:
+        st.caption("Rolodex prefetch (this session)")
+        st.dataframe(pd.DataFrame([
+            {"kind": kind, "outcome": outcome, "count": n} for (kind, outcome), n in sorted(cache.stats.items())
+        ]), hide_index=True, use_container_width=True)
+
+    counters = tracing.metrics.counters()
+    if counters:
+        st.caption("Counters")
+        st.dataframe(pd.DataFrame([
+            {"counter": name, "labels": ", ".join(f"{k}={v}" for k, v in labels), "value": value}
+            for (name, labels), value in sorted(counters.items())
+        ]), hide_index=True, use_container_width=True)
+
 # --- NEW: INSTALL GUIDE OVERLAY ---
 def render_install_guide():
     """Renders the PWA Installation Instructions."""
@@ -810,9 +1197,13 @@ def render_install_guide():
         st.markdown(android_html, unsafe_allow_html=True)
 
 
+# --- SILENT SESSION RESTORE (COOKIE) ---
+restore_session_from_cookie()
+
 # --- INTERCEPTOR: If Profile Mode is active, render it and stop ---
 if st.session_state.show_profile and st.session_state.user:
-    render_profile_view_overlay()
+    with tracing.span("view profile"):
+        render_profile_view_overlay()
     st.stop()
     
 # --- INTERCEPTOR: If Install Guide is active, render it and stop ---
@@ -827,7 +1218,7 @@ def render_header():
     
     with c2:
         try:
-            st.image("nexus_logo.jpg", use_container_width=True)
+            render_logo()
         except:
             st.markdown("<h1 style='text-align: center; color: #FF385C;'>NexusFlowAI</h1>", unsafe_allow_html=True)
             st.markdown("<p style='text-align: center;'>Gravity for leads. Flow for deals.</p>", unsafe_allow_html=True)
@@ -858,10 +1249,10 @@ def handle_google_callback():
         if "code" in query_params:
             code = query_params["code"]
             
-            # 1. Exchange code for session
-            res = supabase.auth.exchange_code_for_session({"auth_code": code})
+            # 1. Exchange code for session (PKCE verifier was kept in the session store under auth_state)
+            res = supabase_pool.finish_oauth(code, query_params.get("auth_state"), store=init_session_store())
             if res.user:
-                st.session_state.user = res.user
+                remember_auth_session(res)
                 st.session_state.is_subscribed = check_subscription_status(res.user.email)
                 
                 # 2. CHECK FOR REFERRAL IN URL (Crucial for Google Signups)
@@ -894,14 +1285,11 @@ if not st.session_state.user:
         redirect_target = f"{APP_BASE_URL}?ref={st.session_state.referral_captured}"
 
     # FIX: Replace broken get_url_for_provider with sign_in_with_oauth
+    # Generated once per session so reruns don't mint a fresh PKCE verifier each time
     try:
-        data = supabase.auth.sign_in_with_oauth({
-            "provider": "google",
-            "options": {
-                "redirect_to": redirect_target
-            }
-        })
-        google_auth_url = data.url
+        if not st.session_state.google_auth_url:
+            st.session_state.google_auth_url, _ = supabase_pool.start_oauth("google", redirect_target, store=init_session_store())
+        google_auth_url = st.session_state.google_auth_url
     except Exception as e:
         # Fallback if the URL generation fails (e.g., config error)
         st.error(f"Config Error: {e}")
@@ -958,8 +1346,8 @@ if not st.session_state.user:
             st.markdown('<div class="bold-left-marker" style="display:none;"></div>', unsafe_allow_html=True)
             if st.button("Log In", type="primary", use_container_width=True):
                 try:
-                    res = supabase.auth.sign_in_with_password({"email": email, "password": password})
-                    st.session_state.user = res.user
+                    res = supabase_pool.auth().sign_in_with_password({"email": email, "password": password})
+                    remember_auth_session(res)
                     st.session_state.is_subscribed = check_subscription_status(res.user.email)
                     ensure_referral_link(res.user.id, res.user.user_metadata)
                     st.rerun()
@@ -970,11 +1358,14 @@ if not st.session_state.user:
             if st.button("Sign Up", type="secondary", use_container_width=True):
                 try:
                     meta = {"referred_by": st.session_state.referral_captured} if st.session_state.referral_captured else {}
-                    res = supabase.auth.sign_up({"email": email, "password": password, "options": {"data": meta}})
+                    res = supabase_pool.auth().sign_up({"email": email, "password": password, "options": {"data": meta}})
                     if res.user: st.success("Account created! Log in."); 
                 except Exception as e: st.error(str(e))
     st.stop()
 
+# Persist the (possibly refreshed) login for the next browser session
+sync_session_cookie()
+
 if not st.session_state.is_subscribed:
     # --- UPGRADE / PAYWALL SCREEN ---
     if "session_id" in st.query_params:
@@ -985,7 +1376,7 @@ if not st.session_state.is_subscribed:
     c1, c2, c3 = st.columns([1, 2, 1], vertical_alignment="center")
     with c2:
         try:
-            st.image("nexus_logo.jpg", use_container_width=True)
+            render_logo()
         except:
             st.markdown("<h1 style='text-align: center; color: #FF385C;'>NexusFlowAI</h1>", unsafe_allow_html=True)
             st.markdown("<p style='text-align: center;'>Gravity for leads. Flow for deals.</p>", unsafe_allow_html=True)
@@ -1035,19 +1426,13 @@ def render_executive_card(data):
     
     display_outreach = outreach
     ics_file = None
-    if outreach:
-        try:
-            outreach_dt = datetime.fromisoformat(str(outreach))
-            est_now = datetime.now() - timedelta(hours=5)
-            delta_days = (outreach_dt.date() - est_now.date()).days
-            
-            if delta_days < 0: display_outreach = f"Overdue ({abs(delta_days)}d)"
-            elif delta_days == 0: display_outreach = f"Today {outreach_dt.strftime('%I:%M %p')}"
-            elif delta_days == 1: display_outreach = f"Tomorrow {outreach_dt.strftime('%I:%M %p')}"
-            else: display_outreach = outreach_dt.strftime("%b %d %I:%M %p")
-                
-            ics_file = create_ics_string(lead.get('name', 'Client'), outreach_dt, lead.get('background', ''))
-        except ValueError: pass
+    # Prefer the typed timestamp; older rows only have the text (ISO when the model followed the prompt)
+    outreach_dt = parse_timestamp(lead.get('next_outreach_at'))
+    if not outreach_dt and outreach:
+        outreach_dt = parse_timestamp(outreach)
+    if outreach_dt:
+        display_outreach = describe_outreach(outreach_dt)
+        ics_file = create_ics_string(lead.get('name', 'Client'), outreach_dt.astimezone(USER_TZ), lead.get('background', ''))
 
     bubbles_html = f'<span class="meta-bubble {status_class}">{status}</span>'
     if display_outreach:
@@ -1101,9 +1486,16 @@ def render_executive_card(data):
                             "contact_info": new_contact, "background": new_bg,
                             "transactions": new_tx, "next_outreach": new_outreach
                         }
+                        # Re-parse only when edited, so "next week" isn't re-anchored on every save
+                        if new_outreach != (lead.get('next_outreach') or ''):
+                            updates.update(outreach_fields(new_outreach))
+                        updates.update(contact_keys(new_contact))
                         try:
-                            supabase.table("leads").update(updates).eq("id", lead_id).execute()
+                            db().table("leads").update(updates).eq("id", lead_id).execute()
                             lead.update(updates)
+                            index_lead_writes(st.session_state.user.id, [{**lead, "id": lead_id}])
+                            rolodex_cache().invalidate("lead", lead_cache_key(st.session_state.user.id, lead_id))
+                            rolodex_cache().invalidate("page")  # name/status shown in the list
                             st.session_state.is_editing = False
                             st.success("Saved.")
                             st.rerun()
@@ -1136,13 +1528,73 @@ def render_executive_card(data):
                         st.download_button("Add to Calendar", data=ics_file, file_name=f"Meeting_{safe_name}.ics", mime="text/calendar", use_container_width=True)
         st.markdown('</div>', unsafe_allow_html=True)
 
+# --- NEW: VOICE JOB POLLING ---
+VOICE_WORKERS = int(os.getenv("VOICE_WORKERS", "4"))
+VOICE_MAX_PENDING = int(os.getenv("VOICE_MAX_PENDING", "32"))
+VOICE_POLL_SECONDS = 1.0
+
+@st.cache_resource
+def init_voice_jobs():
+    return voice_jobs.VoiceJobRunner(workers=VOICE_WORKERS, max_pending=VOICE_MAX_PENDING)
+
+def adopt_finished_voice_job():
+    """Moves a finished job's result into this session (also picks up a job started before a refresh)."""
+    runner = init_voice_jobs()
+    if not st.session_state.voice_job_id and st.session_state.user:
+        latest = runner.latest(st.session_state.user.id)
+        if latest and not latest.claimed: st.session_state.voice_job_id = latest.id
+    job = runner.get(st.session_state.voice_job_id)
+    if job is None:
+        st.session_state.voice_job_id = None
+        return
+    if not job.finished: return
+
+    runner.claim(job)
+    st.session_state.voice_job_id = None
+    result = job.result if job.status == voice_jobs.DONE else {"error": "AI system is busy. Please try again in a moment."}
+    if "error" in result: st.session_state.voice_error = result['error']
+    else: st.session_state.omni_result = result
+    if result.get('action') in ("CREATE", "UPDATE"): rolodex_cache().invalidate()
+
+@st.fragment(run_every=VOICE_POLL_SECONDS)
+def voice_job_status():
+    job = init_voice_jobs().get(st.session_state.voice_job_id)
+    if job is None or job.finished:
+        st.rerun()  # full rerun: adopt_finished_voice_job() shows the card
+    st.markdown("<div style='height: 20vh;'></div>", unsafe_allow_html=True)
+    label = "Analyzing Rolodex..." if job.status == voice_jobs.RUNNING else "Waiting for a free assistant..."
+    st.markdown(f"<p style='text-align:center; color:#717171;'>⏳ {label}</p>", unsafe_allow_html=True)
+
+def render_query_result(answer):
+    """Answer to a question about many leads (see lead_query.execute): the number, per-group counts, then the leads."""
+    groups = "".join(f'<div class="stat-item"><div class="stat-label">{escape(str(g["key"]))}</div><div class="stat-value">{g["count"]}</div></div>' for g in answer['groups'])
+    st.markdown(f"""<div class="airbnb-card" style="border-left: 6px solid #FF385C; padding: 24px;"><div class="stat-label">{escape(answer['title'])}</div><div style="font-size: 48px; font-weight: 900; color: #222; line-height: 1.1;">{answer['count']}</div>{f'<div class="stat-grid">{groups}</div>' if groups else ''}</div>""", unsafe_allow_html=True)
+
+    for row in answer['rows']:
+        markers = '<div class="rolodex-marker"></div>'
+        if str(row.get('status')).strip().lower() == "client": markers += '<div class="client-marker"></div>'
+        st.markdown(markers, unsafe_allow_html=True)
+        label = row.get('name') or 'Unknown'
+        due_at = parse_timestamp(row.get('next_outreach_at'))
+        if due_at: label += f" · {describe_outreach(due_at)}"
+        if st.button(label, key=f"query_row_{row['id']}", use_container_width=True):
+            st.session_state.omni_result = {'lead_data': row, 'action': 'QUERY'}
+            st.rerun()
+    if answer['truncated']: st.caption(f"Showing the first {len(answer['rows'])} of {answer['count']}.")
+
 def view_omni():
+    adopt_finished_voice_job()
+    if st.session_state.voice_job_id:
+        voice_job_status()
+        return
+
     if st.session_state.omni_result:
         if st.button("← New Search", type="secondary"):
             st.session_state.omni_result = None
             st.session_state.is_editing = False
             st.rerun()
-        render_executive_card(st.session_state.omni_result)
+        if 'query_result' in st.session_state.omni_result: render_query_result(st.session_state.omni_result['query_result'])
+        else: render_executive_card(st.session_state.omni_result)
         return
 
     # --- INSTRUCTIONS BLOCK ---
@@ -1179,34 +1631,65 @@ def view_omni():
     with c_mic_2:
         audio_val = st.audio_input("OmniInput", label_visibility="collapsed")
     
-    if audio_val:
-        with st.spinner("Analyzing Rolodex..."):
-            existing_leads = load_leads_summary()
-            result = process_omni_voice(audio_val.read(), existing_leads)
-            
-            if isinstance(result, list):
-                result = result[0] if len(result) > 0 else {"error": "AI returned empty list."}
+    if st.session_state.voice_error:
+        st.error(st.session_state.voice_error)
+        st.session_state.voice_error = None
+
+    # A job that fails fast is adopted in the same script run, with the mic still holding its clip
+    if audio_val and st.session_state.user and audio_val.file_id != st.session_state.voice_clip_id:
+        # Hand the clip to the worker pool; this rerun ends right away and the
+        # fragment polls. The mic is not rendered while a job runs, so the clip is not resubmitted.
+        gemini_client(), model_router(), lead_search_index()  # built (and cached) here in the script thread; the worker reuses them
+        wait = gemini_admission().retry_after(st.session_state.user.id)
+        if wait > 0:
+            st.warning(f"⏳ {throttled_message(rate_limit.Throttled('rate', wait))}")
+            return
+        try:
+            job = init_voice_jobs().submit(st.session_state.user.id, run_voice_command,
+                                           st.session_state.user.id, db(), audio_val.read())
+        except voice_jobs.QueueFull:
+            st.error("The assistant is busy right now. Please try again in a moment.")
+            return
+        st.session_state.voice_job_id = job.id
+        st.session_state.voice_clip_id = audio_val.file_id
+        st.rerun()
 
-            if "error" in result: 
-                st.error(result['error'])
-            else:
-                action = result.get('action')
-                lead_data = result.get('lead_data', {})
-                if action == "QUERY" and not lead_data.get('name'):
-                    st.error("Audio unclear. Please try again.")
-                    return
-
-                if action == "CREATE": 
-                    saved_record = save_new_lead(lead_data)
-                    if saved_record and isinstance(saved_record, dict): result['lead_data']['id'] = saved_record.get('id')
-                         
-                elif action == "UPDATE" and result.get('match_id'): 
-                    saved_data = update_existing_lead(result['match_id'], lead_data, existing_leads)
-                    if isinstance(saved_data, dict): result['lead_data'] = saved_data
-                    else: st.error(saved_data); return
-
-                st.session_state.omni_result = result
-                st.rerun()
+# --- NEW: ROLODEX PREFETCH (see prefetch.py) ---
+# The list pages select only what the list draws; the full record is read when a
+# lead is opened. While page N is on screen page N+1 is read in the background,
+# and the last opened leads stay cached, so Next / Previous / "Back to List" /
+# reopening a lead render from memory.
+ROLODEX_PAGE_SIZE = 50
+ROLODEX_LIST_COLUMNS = "id, name, status"
+PREFETCH_WORKERS = int(os.getenv("PREFETCH_WORKERS", "4"))
+PREFETCH_TTL = int(os.getenv("PREFETCH_TTL", "60"))  # seconds; bounds staleness from writes made elsewhere
+
+@st.cache_resource
+def prefetch_pool():
+    return ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix="prefetch")
+
+def rolodex_cache():
+    """This session's SessionPrefetcher: a few Rolodex pages and the last 20 opened leads."""
+    if 'rolodex_cache' not in st.session_state:
+        st.session_state.rolodex_cache = prefetch.SessionPrefetcher(prefetch_pool(), {"page": 6, "lead": 20}, ttl=PREFETCH_TTL)
+    return st.session_state.rolodex_cache
+
+def lead_cache_key(user_id, lead_id):
+    # Leads arrive as int ids from Supabase but as strings from a voice UPDATE's match_id
+    return (user_id, str(lead_id))
+
+def fetch_rolodex_page(sb, user_id, page):
+    start = page * ROLODEX_PAGE_SIZE
+    return sb.table("leads").select(ROLODEX_LIST_COLUMNS).eq("user_id", user_id)\
+        .order("created_at", desc=True).range(start, start + ROLODEX_PAGE_SIZE - 1).execute().data
+
+def open_lead(lead_id):
+    """Full lead record, from the session cache when it was opened recently (None if it is gone)."""
+    sb = db()
+    def load():
+        rows = sb.table("leads").select("*").eq("id", lead_id).execute().data
+        return rows[0] if rows else None
+    return rolodex_cache().get("lead", lead_cache_key(st.session_state.user.id, lead_id), load)
 
 def view_pipeline():
     if st.session_state.selected_lead:
@@ -1224,31 +1707,31 @@ def view_pipeline():
     c_search, c_filter = st.columns([2, 1])
     with c_search: search_query = st.text_input("Search", placeholder="Find a name...", label_visibility="collapsed")
     with c_filter: filter_status = st.pills("Status", ["All", "Lead", "Client"], default="All", selection_mode="single", label_visibility="collapsed")
+    semantic = st.toggle("Search notes & product fit", key="semantic_search",
+                         help="Ranks leads by meaning, e.g. \"who would want the skincare bundle?\"")
 
     st.markdown("<div style='margin-bottom: 20px;'></div>", unsafe_allow_html=True)
     
     # --- PAGINATION LOGIC ---
-    PAGE_SIZE = 50
-    start = st.session_state.pipeline_page * PAGE_SIZE
-    end = start + PAGE_SIZE - 1
-    
-    # Updated Query with Range
-    query = supabase.table("leads").select("*", count="exact").eq("user_id", st.session_state.user.id).order("created_at", desc=True)
+    user_id = st.session_state.user.id
+    page = st.session_state.pipeline_page
+    sb = db()
     
     # Apply Filters before fetching (Note: Supabase filtering happens on DB side, which is efficient)
     # However, for simple client-side search/filter on partial data, strict DB filtering is better for scale.
     # Since search_query requires text search, we fetch the range first. 
     # Ideally, for massive scale, search should be a DB RPC, but here we paginate the main list.
     
-    if search_query:
+    if search_query and semantic:
+        # Best matches from the user's embedding index, already ranked (full records)
+        leads = semantic_lead_search(user_id, sb, search_query)
+        if not leads: st.caption("No matching contacts found."); return
+    elif search_query:
         # If searching, we skip pagination to find matches (or implement DB-side search)
         # For this stage, we'll fetch all if searching, but paginate default view.
-        leads_response = query.execute()
+        leads = sb.table("leads").select(ROLODEX_LIST_COLUMNS).eq("user_id", user_id).order("created_at", desc=True).execute().data
     else:
-        leads_response = query.range(start, end).execute()
-        
-    leads = leads_response.data
-    total_count = leads_response.count if leads_response.count else 0
+        leads = rolodex_cache().get("page", (user_id, page), lambda: fetch_rolodex_page(sb, user_id, page))
     
     if not leads: 
         if st.session_state.pipeline_page > 0:
@@ -1259,7 +1742,7 @@ def view_pipeline():
     filtered_leads = []
     for l in leads:
         # Apply client side filters on the fetched page
-        if search_query and search_query.lower() not in (l.get('name') or '').lower(): continue
+        if search_query and not semantic and search_query.lower() not in (l.get('name') or '').lower(): continue
         if filter_status and filter_status != "All" and (l.get('status') or 'Lead').lower() != filter_status.lower(): continue
         filtered_leads.append(l)
 
@@ -1274,7 +1757,8 @@ def view_pipeline():
         st.markdown(markers, unsafe_allow_html=True)
         
         if st.button(name, key=f"card_{lead['id']}", use_container_width=True):
-            st.session_state.selected_lead = lead
+            if semantic and search_query: rolodex_cache().put("lead", lead_cache_key(user_id, lead['id']), lead)
+            st.session_state.selected_lead = open_lead(lead['id']) or lead
             st.rerun()
 
     # --- PAGINATION CONTROLS ---
@@ -1293,19 +1777,61 @@ def view_pipeline():
             st.markdown(f"<p style='text-align:center; font-size:12px; padding-top:10px;'>Page {st.session_state.pipeline_page + 1}</p>", unsafe_allow_html=True)
             
         with col_next:
-            # If we fetched a full page, there might be more
-            if len(leads) == PAGE_SIZE:
+            # If we fetched a full page, there might be more: read it now, before the click
+            if len(leads) == ROLODEX_PAGE_SIZE:
+                rolodex_cache().prefetch("page", (user_id, page + 1), lambda: fetch_rolodex_page(sb, user_id, page + 1))
                 if st.button("Next", key="next_page"):
                     st.session_state.pipeline_page += 1
                     st.rerun()
 
+# --- DUE SOON (TYPED next_outreach_at RANGE QUERY) ---
+DUE_SOON_DAYS = 7
+OVERDUE_LOOKBACK_DAYS = 7  # same window as reminder_digest.py; older overdue leads drop off
+
+def view_due_soon():
+    if st.session_state.due_selected_lead:
+        st.markdown('<div class="bold-left-marker"></div>', unsafe_allow_html=True)
+        if st.button("← Back to Due Soon", key="back_to_due", type="secondary"):
+            st.session_state.due_selected_lead = None
+            st.session_state.is_editing = False
+            st.rerun()
+        render_executive_card({'lead_data': st.session_state.due_selected_lead, 'action': 'QUERY'})
+        return
+
+    st.markdown("<h2 style='padding: 24px 0 12px 0;'>Due Soon</h2>", unsafe_allow_html=True)
+    if not st.session_state.user: return
+
+    # Served by the (user_id, next_outreach_at) index: recently overdue + the next DUE_SOON_DAYS days.
+    # The lower bound keeps years-old overdue rows from filling the 100-row limit.
+    now = datetime.now(timezone.utc)
+    horizon = now + timedelta(days=DUE_SOON_DAYS)
+    due = db().table("leads").select("id, name, status, next_outreach, next_outreach_at")\
+        .eq("user_id", st.session_state.user.id)\
+        .gte("next_outreach_at", (now - timedelta(days=OVERDUE_LOOKBACK_DAYS)).isoformat())\
+        .lte("next_outreach_at", horizon.isoformat())\
+        .order("next_outreach_at")\
+        .limit(100).execute().data
+
+    if not due: st.info(f"Nothing due in the next {DUE_SOON_DAYS} days."); return
+
+    for lead in due:
+        markers = '<div class="rolodex-marker"></div>'
+        if str(lead.get('status', 'Lead')).strip().lower() == "client": markers += '<div class="client-marker"></div>'
+        st.markdown(markers, unsafe_allow_html=True)
+        due_at = parse_timestamp(lead['next_outreach_at'])
+        label = f"{lead.get('name', 'Unknown')} · {describe_outreach(due_at)}" if due_at else lead.get('name', 'Unknown')
+        if st.button(label, key=f"due_{lead['id']}", use_container_width=True):
+            st.session_state.due_selected_lead = open_lead(lead['id']) or lead
+            st.rerun()
+
 def view_analytics():
     st.markdown("<h2 style='padding:10px 0 20px 0;'>Performance</h2>", unsafe_allow_html=True)
     if not st.session_state.user: return
     
-    leads = supabase.table("leads").select("*").eq("user_id", st.session_state.user.id).execute().data
+    leads = db().table("leads").select("*").eq("user_id", st.session_state.user.id).execute().data
     if not leads: st.info("Start adding leads to see your stats!"); return
         
+    import pandas as pd  # only this tab needs it
     df = pd.DataFrame(leads)
     total_leads = len(df)
     clients = len(df[df['status'].astype(str).str.strip().str.lower() == 'client'])
@@ -1322,7 +1848,7 @@ def view_analytics():
     <div class="analytics-card analytics-card-red"><div class="stat-title">30-DAY HUSTLE</div><div class="stat-metric">+{recent_leads}</div><div class="stat-sub">New leads added recently</div></div>
     """, unsafe_allow_html=True)
 
-tabs = { "🎙️ Assistant": "omni", "📇 Rolodex": "pipeline", "📊 Analytics": "analytics" }
+tabs = { "🎙️ Assistant": "omni", "📇 Rolodex": "pipeline", "⏰ Due Soon": "due", "📊 Analytics": "analytics" }
 rev_tabs = {v: k for k, v in tabs.items()}
 current_label = rev_tabs.get(st.session_state.active_tab, "🎙️ Assistant")
 selected_label = st.radio("Navigation", options=list(tabs.keys()), index=list(tabs.keys()).index(current_label), label_visibility="collapsed", horizontal=True, key="nav_radio")
@@ -1331,6 +1857,15 @@ if tabs[selected_label] != st.session_state.active_tab:
     st.session_state.is_editing = False
     st.rerun()
 
-if st.session_state.active_tab == "omni": view_omni()
-elif st.session_state.active_tab == "pipeline": view_pipeline()
-elif st.session_state.active_tab == "analytics": view_analytics()
+views = {"omni": view_omni, "pipeline": view_pipeline, "due": view_due_soon, "analytics": view_analytics}
+if st.session_state.active_tab in views:
+    with tracing.span(f"view {st.session_state.active_tab}"):
+        try:
+            views[st.session_state.active_tab]()
+        except rate_limit.Throttled as e:
+            # Supabase admission (see 2): this session is over its request rate, or every slot is taken
+            st.warning(f"⏳ {throttled_message(e)}")
+            if st.button("Try again", key="throttled_retry"): st.rerun()
+
+# Persist what this run changed (runs that stop early are saved at the top of the next one)
+sync_session_store()
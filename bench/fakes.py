@@ -0,0 +1,520 @@
+import json
+import hashlib
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+from urllib.request import urlopen
+
+# ==========================================
+# LOCAL STAND-INS FOR SUPABASE, STRIPE AND GEMINI
+# ==========================================
+# Small HTTP servers that speak just enough of each API for app.py and
+# webhook_server.py to run offline. Every request is counted (that count is
+# the round-trip figure the benchmarks report), and every server can add a
+# fixed per-request latency to model the real network.
+
+STATS_PATH = "/__bench/stats"
+
+def fetch_stats(url):
+    """Counters of a fake running in another process (see STATS_PATH)."""
+    with urlopen(url + STATS_PATH) as res:
+        return json.loads(res.read())
+
+
+class FakeService(ThreadingHTTPServer):
+    """Base server: request counting, optional latency, JSON helpers."""
+    daemon_threads = True
+    request_queue_size = 128  # the default of 5 resets connections when many sessions connect at once
+    name = "service"
+
+    def __init__(self, latency=0.0):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.latency = latency
+        self.calls = Counter()
+        self.bytes_out = 0
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def snapshot(self):
+        """(total requests, per-endpoint counter, response bytes) at this moment."""
+        with self._lock:
+            return sum(self.calls.values()), Counter(self.calls), self.bytes_out
+
+    def stats(self):
+        total, _, bytes_out = self.snapshot()
+        return {"requests": total, "bytes_out": bytes_out}
+
+    def record(self, label, nbytes):
+        with self._lock:
+            self.calls[label] += 1
+            self.bytes_out += nbytes
+
+    def handle(self, method, path, query, headers, body):
+        """Returns (status, headers, payload). Subclasses implement the API."""
+        raise NotImplementedError
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _dispatch(self, method):
+        service = self.server
+        if self.path == STATS_PATH:
+            # Out-of-band counters for benchmark subprocesses; not counted, no latency
+            data = json.dumps(service.stats()).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+        if service.latency:
+            time.sleep(service.latency)
+        parsed = urlparse(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        query = parse_qsl(parsed.query, keep_blank_values=True)
+        status, headers, payload = service.handle(method, parsed.path, query, self.headers, raw)
+        data = b"" if payload is None else (payload if isinstance(payload, bytes) else json.dumps(payload).encode())
+        service.record(f"{method} {re.sub(r'/[0-9a-f-]{8,}$', '/:id', parsed.path)}", len(data))
+        self.send_response(status)
+        self.send_header("Content-Type", headers.pop("Content-Type", "application/json"))
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self): self._dispatch("GET")
+    def do_POST(self): self._dispatch("POST")
+    def do_PATCH(self): self._dispatch("PATCH")
+    def do_DELETE(self): self._dispatch("DELETE")
+
+
+# ------------------------------------------
+# Supabase: PostgREST subset + GoTrue token endpoints
+# ------------------------------------------
+RESERVED_PARAMS = {"select", "order", "limit", "offset", "on_conflict", "columns"}
+
+def _coerce(row_value, raw):
+    """Converts a filter literal to the type of the stored value so comparisons behave like Postgres."""
+    raw = raw.strip('"')
+    if row_value is None or isinstance(row_value, str):
+        if isinstance(row_value, str) and re.match(r"\d{4}-\d{2}-\d{2}", row_value) and re.match(r"\d{4}-\d{2}-\d{2}", raw):
+            return _ts(row_value), _ts(raw)
+        return row_value, raw
+    if isinstance(row_value, bool):
+        return row_value, raw.lower() == "true"
+    if isinstance(row_value, (int, float)):
+        try: return row_value, type(row_value)(raw)
+        except ValueError: return str(row_value), raw
+    return row_value, raw
+
+def _ts(value):
+    dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return dt if dt.tzinfo else dt.astimezone()
+
+def _matches(row, column, expr):
+    negate = expr.startswith("not.")
+    if negate: expr = expr[4:]
+    op, _, raw = expr.partition(".")
+    value = row.get(column)
+    if op == "is":
+        result = value is None if raw == "null" else value is (raw == "true")
+    elif op == "in":
+        options = [v.strip().strip('"') for v in raw.strip("()").split(",")]
+        result = str(value) in options
+    elif op in ("like", "ilike"):
+        pattern = "^" + re.escape(raw).replace(r"\*", ".*").replace("%", ".*") + "$"
+        result = value is not None and re.match(pattern, str(value), re.I if op == "ilike" else 0) is not None
+    else:
+        if value is None:
+            result = False
+        else:
+            a, b = _coerce(value, raw)
+            result = {"eq": a == b, "neq": a != b, "gt": a > b, "gte": a >= b, "lt": a < b, "lte": a <= b}[op]
+    return not result if negate else result
+
+def _or_matches(row, expr):
+    # or=(col.op.val,col.op.val) -- values may be double-quoted
+    parts = re.findall(r'([a-z_0-9]+)\.((?:not\.)?[a-z]+\.(?:"[^"]*"|[^,)]*))', expr)
+    return any(_matches(row, col, cond) for col, cond in parts)
+
+
+class FakeSupabase(FakeService):
+    """In-memory tables behind /rest/v1 and a permissive /auth/v1."""
+    name = "supabase"
+
+    def __init__(self, latency=0.0):
+        super().__init__(latency)
+        self.tables = {}
+        self.tiers = {1: 1000}  # commission_tiers: depth -> cents
+        self.rpcs = {}
+        self.users = {}  # email -> user dict
+        self._ids = Counter()
+        self._data_lock = threading.Lock()
+        self.rpcs.update({
+            "link_referrer": self._rpc_link_referrer,
+            "set_subscription_active": self._rpc_set_subscription_active,
+            "record_commission": self._rpc_record_commission,
+            "record_tiered_commission": self._rpc_record_tiered_commission,
+            "downline_counts": self._rpc_downline_counts,
+            "apply_subscription_states": self._rpc_apply_subscription_states,
+            "record_commissions": self._rpc_record_commissions,
+            "link_stripe_customers": self._rpc_link_stripe_customers,
+            "leads_needing_compaction": self._rpc_leads_needing_compaction,
+            "apply_note_compactions": self._rpc_apply_note_compactions,
+        })
+
+    # --- seeding ---
+    def insert_rows(self, table, rows):
+        with self._data_lock:
+            for row in rows:
+                self._insert(table, dict(row))
+
+    def _insert(self, table, row):
+        for column, value in row.items():
+            # timestamptz columns: Postgres reads naive input as UTC and always returns an offset
+            if column.endswith("_at") and isinstance(value, str) and re.fullmatch(r"\d{4}-\d{2}-\d{2}T[\d:.]+", value):
+                row[column] = value + "+00:00"
+        if "id" not in row and table != "profiles":
+            self._ids[table] += 1
+            row["id"] = self._ids[table]
+        elif isinstance(row.get("id"), int):
+            self._ids[table] = max(self._ids[table], row["id"])
+        self.tables.setdefault(table, []).append(row)
+        return row
+
+    def add_user(self, email, user_id=None):
+        user_id = user_id or str(uuid.uuid4())
+        self.users[email] = {
+            "id": user_id, "aud": "authenticated", "role": "authenticated", "email": email,
+            "app_metadata": {}, "user_metadata": {}, "created_at": "2024-01-01T00:00:00Z",
+        }
+        self.insert_rows("profiles", [{"id": user_id, "email": email, "referral_count": 0,
+                                       "active_referral_count": 0, "commission_balance": 0}])
+        return user_id
+
+    # --- dispatch ---
+    def handle(self, method, path, query, headers, body):
+        if path.startswith("/auth/v1/"):
+            return self._auth(path[len("/auth/v1/"):], dict(query), body)
+        if path.startswith("/rest/v1/rpc/"):
+            args = json.loads(body or b"{}")
+            fn = self.rpcs.get(path.rsplit("/", 1)[1])
+            if not fn: return 404, {}, {"message": "function not found"}
+            with self._data_lock:
+                return 200, {}, fn(**args)
+        if path.startswith("/rest/v1/"):
+            return self._rest(method, path[len("/rest/v1/"):], query, headers, body)
+        return 404, {}, {"message": "not found"}
+
+    def _session(self, user):
+        return {
+            "access_token": f"bench-{user['id']}", "refresh_token": f"refresh-{user['id']}",
+            "token_type": "bearer", "expires_in": 3600, "expires_at": int(time.time()) + 3600,
+            "user": user,
+        }
+
+    def _auth(self, endpoint, query, body):
+        payload = json.loads(body or b"{}")
+        if endpoint == "token":
+            if query.get("grant_type") == "password":
+                user = self.users.get(payload.get("email"))
+            elif query.get("grant_type") == "refresh_token":
+                user_id = str(payload.get("refresh_token", "")).replace("refresh-", "")
+                user = next((u for u in self.users.values() if u["id"] == user_id), None)
+            else:
+                user = next(iter(self.users.values()), None)
+            if not user: return 400, {}, {"error": "invalid_grant", "error_description": "Invalid login"}
+            return 200, {}, self._session(user)
+        if endpoint == "signup":
+            user = self.users.get(payload.get("email")) or self.users[self.add_user(payload.get("email")) and payload.get("email")]
+            return 200, {}, user
+        if endpoint == "logout":
+            return 204, {}, None
+        return 404, {}, {"message": "auth endpoint not faked"}
+
+    def _rest(self, method, table, query, headers, body):
+        filters = [(k, v) for k, v in query if k not in RESERVED_PARAMS]
+        params = dict(query)
+        prefer = headers.get("Prefer", "")
+        with self._data_lock:
+            rows = self.tables.setdefault(table, [])
+            if method == "POST":
+                payload = json.loads(body or b"[]")
+                payload = payload if isinstance(payload, list) else [payload]
+                conflict = [c for c in params.get("on_conflict", "").split(",") if c]
+                out = []
+                for row in payload:
+                    existing = next((r for r in rows if conflict and all(r.get(c) == row.get(c) for c in conflict)), None)
+                    if existing is not None:
+                        existing.update(row)
+                        out.append(existing)
+                    else:
+                        out.append(self._insert(table, dict(row)))
+                return 201, {}, [dict(r) for r in out]
+
+            matched = [r for r in rows if all(
+                _or_matches(r, v) if k == "or" else _matches(r, k, v) for k, v in filters)]
+
+            if method == "PATCH":
+                changes = json.loads(body or b"{}")
+                for r in matched: r.update(changes)
+                return 200, {}, [dict(r) for r in matched]
+            if method == "DELETE":
+                self.tables[table] = [r for r in rows if r not in matched]
+                return 200, {}, [dict(r) for r in matched]
+
+            for spec in reversed([s for s in params.get("order", "").split(",") if s]):
+                column, _, direction = spec.partition(".")
+                matched.sort(key=lambda r: (r.get(column) is None, str(r.get(column)) if not isinstance(r.get(column), (int, float)) else r.get(column)),
+                             reverse=direction.startswith("desc"))
+            total = len(matched)
+            offset = int(params.get("offset", 0))
+            limit = int(params["limit"]) if "limit" in params else None
+            page = matched[offset:offset + limit if limit is not None else None]
+            columns = [c.strip() for c in params.get("select", "*").split(",")]
+            if "*" not in columns:
+                page = [{c: r.get(c) for c in columns} for r in page]
+            else:
+                page = [dict(r) for r in page]
+
+        extra = {}
+        if "count=" in prefer:
+            end = offset + len(page) - 1
+            extra["Content-Range"] = f"{offset}-{end}/{total}" if page else f"*/{total}"
+        return 200, extra, page
+
+    # --- RPCs used by the app and the webhook (simplified semantics) ---
+    def _profile(self, profile_id):
+        return next((p for p in self.tables.get("profiles", []) if p["id"] == profile_id), None)
+
+    def _rpc_link_referrer(self, p_user, p_referrer):
+        me, ref = self._profile(p_user), self._profile(p_referrer)
+        if not me or me.get("referred_by") or p_user == p_referrer: return False
+        me["referred_by"] = p_referrer
+        if ref: ref["referral_count"] = (ref.get("referral_count") or 0) + 1
+        return True
+
+    def _rpc_set_subscription_active(self, p_profile, p_active):
+        me = self._profile(p_profile)
+        if not me or bool(me.get("subscription_active")) == p_active: return False
+        me["subscription_active"] = p_active
+        ref = self._profile(me.get("referred_by"))
+        if ref: ref["active_referral_count"] = max((ref.get("active_referral_count") or 0) + (1 if p_active else -1), 0)
+        return True
+
+    def _rpc_record_commission(self, p_invoice, p_payer, p_referrer, p_amount_cents):
+        credits = self.tables.setdefault("commission_credits", [])
+        if not self._profile(p_referrer) or any(c["stripe_invoice_id"] == p_invoice and c["referrer_id"] == p_referrer for c in credits):
+            return False
+        self._insert("commission_credits", {"referrer_id": p_referrer, "payer_id": p_payer,
+                                            "stripe_invoice_id": p_invoice, "amount_cents": p_amount_cents,
+                                            "created_at": datetime.now().astimezone().isoformat()})
+        ref = self._profile(p_referrer)
+        ref["commission_balance"] = (ref.get("commission_balance") or 0) + p_amount_cents / 100
+        return True
+
+    def _ancestors(self, profile_id):
+        """[(ancestor_id, depth)] by walking referred_by (the real schema reads referral_closure)."""
+        chain, me = [], self._profile(profile_id)
+        while me and me.get("referred_by") and me["referred_by"] not in [a for a, _ in chain] + [profile_id]:
+            chain.append((me["referred_by"], len(chain) + 1))
+            me = self._profile(me["referred_by"])
+        return chain
+
+    def _rpc_record_tiered_commission(self, p_invoice, p_payer):
+        return sum(self._rpc_record_commission(p_invoice, p_payer, ancestor, self.tiers[depth])
+                   for ancestor, depth in self._ancestors(p_payer) if depth in self.tiers)
+
+    def _rpc_downline_counts(self, p_user):
+        levels = {}
+        for p in self.tables.get("profiles", []):
+            depth = next((d for a, d in self._ancestors(p["id"]) if a == p_user), None)
+            if depth:
+                total, active = levels.get(depth, (0, 0))
+                levels[depth] = (total + 1, active + bool(p.get("subscription_active")))
+        return [{"depth": d, "total": t, "active": a} for d, (t, a) in sorted(levels.items())]
+
+    def _rpc_apply_subscription_states(self, p_rows):
+        return sum(self._rpc_set_subscription_active(r["id"], r["active"]) for r in p_rows)
+
+    def _rpc_record_commissions(self, p_rows):
+        return sum(self._rpc_record_tiered_commission(r["invoice"], r["payer"]) for r in p_rows)
+
+    def _rpc_link_stripe_customers(self, p_rows):
+        taken = {p.get("stripe_customer_id") for p in self.tables.get("profiles", [])}
+        linked = 0
+        for r in p_rows:
+            me = self._profile(r["id"])
+            if me and not me.get("stripe_customer_id") and r["customer"] not in taken:
+                me["stripe_customer_id"] = r["customer"]
+                taken.add(r["customer"])
+                linked += 1
+        return linked
+
+    def _rpc_leads_needing_compaction(self, p_min_bytes, p_after_id, p_limit):
+        found = sorted((l for l in self.tables.get("leads", [])
+                        if l["id"] > p_after_id and len((l.get("background") or "").encode()) >= p_min_bytes),
+                       key=lambda l: l["id"])[:p_limit]
+        return [{k: l.get(k) for k in ("id", "user_id", "name", "product_pitch", "background")} for l in found]
+
+    def _rpc_apply_note_compactions(self, p_rows):
+        leads = {l["id"]: l for l in self.tables.get("leads", [])}
+        done = []
+        for r in p_rows:
+            lead = leads.get(r["id"])
+            if not lead or hashlib.md5((lead.get("background") or "").encode()).hexdigest() != r["original_md5"]: continue
+            self._insert("lead_note_archive", {"lead_id": lead["id"], "user_id": lead["user_id"], "background": lead["background"],
+                                               "compacted_at": datetime.now().astimezone().isoformat()})
+            lead["background"] = r["digest"]
+            lead["background_compacted_at"] = datetime.now().astimezone().isoformat()
+            done.append({"id": lead["id"]})
+        return done
+
+
+# ------------------------------------------
+# Stripe: customers, subscriptions, checkout sessions
+# ------------------------------------------
+class FakeStripe(FakeService):
+    name = "stripe"
+
+    def __init__(self, latency=0.0):
+        super().__init__(latency)
+        self.customers = {}      # id -> customer
+        self.subscriptions = {}  # id -> subscription
+        self.invoices = {}       # id -> invoice
+
+    def add_customer(self, email, active=True, metadata=None):
+        cus_id = f"cus_{uuid.uuid4().hex[:14]}"
+        self.customers[cus_id] = {"id": cus_id, "object": "customer", "email": email, "metadata": metadata or {}}
+        if active:
+            sub_id = f"sub_{uuid.uuid4().hex[:14]}"
+            self.subscriptions[sub_id] = {"id": sub_id, "object": "subscription", "customer": cus_id,
+                                          "status": "active", "metadata": metadata or {}}
+        return cus_id
+
+    @staticmethod
+    def _list(url, items):
+        return {"object": "list", "url": url, "has_more": False, "data": items}
+
+    def _page(self, url, items, params):
+        """Cursor pagination (limit / starting_after) like Stripe's list endpoints."""
+        limit = int(params.get("limit", 10))
+        if params.get("starting_after"):
+            ids = [i["id"] for i in items]
+            items = items[ids.index(params["starting_after"]) + 1:] if params["starting_after"] in ids else []
+        return {"object": "list", "url": url, "has_more": len(items) > limit, "data": items[:limit]}
+
+    def add_invoice(self, customer_id, amount_paid=2000, metadata=None):
+        inv_id = f"in_{uuid.uuid4().hex[:14]}"
+        self.invoices[inv_id] = {"id": inv_id, "object": "invoice", "customer": customer_id, "status": "paid",
+                                 "customer_email": self.customers[customer_id]["email"], "amount_paid": amount_paid,
+                                 "created": int(time.time()), "subscription_details": {"metadata": metadata or {}}}
+        return inv_id
+
+    def handle(self, method, path, query, headers, body):
+        params = dict(query)
+        form = dict(parse_qsl(body.decode())) if body else {}
+        if path == "/v1/customers" and method == "GET":
+            found = [c for c in self.customers.values() if not params.get("email") or c["email"] == params["email"]]
+            return 200, {}, self._list(path, found)
+        if path == "/v1/customers" and method == "POST":
+            cus_id = self.add_customer(form.get("email"), active=False)
+            return 200, {}, self.customers[cus_id]
+        if path.startswith("/v1/customers/"):
+            customer = self.customers.get(path.rsplit("/", 1)[1])
+            return (200, {}, customer) if customer else (404, {}, {"error": {"message": "No such customer"}})
+        if path == "/v1/subscriptions" and method == "GET":
+            found = [s for s in self.subscriptions.values()
+                     if (not params.get("customer") or s["customer"] == params["customer"])
+                     and (not params.get("status") or s["status"] == params["status"])]
+            if "data.customer" in [v for k, v in params.items() if k.startswith("expand")]:
+                found = [{**s, "customer": self.customers[s["customer"]]} for s in found]
+            return 200, {}, self._page(path, found, params)
+        if path.startswith("/v1/subscriptions/") and method == "POST":
+            sub = self.subscriptions.get(path.rsplit("/", 1)[1])
+            if sub: sub.update({k: v for k, v in form.items() if "[" not in k})
+            return 200, {}, sub
+        if path == "/v1/invoices" and method == "GET":
+            found = [i for i in self.invoices.values() if not params.get("status") or i["status"] == params["status"]]
+            return 200, {}, self._page(path, found, params)
+        if path == "/v1/checkout/sessions" and method == "POST":
+            session_id = f"cs_{uuid.uuid4().hex[:14]}"
+            return 200, {}, {"id": session_id, "object": "checkout.session", "url": f"https://checkout.invalid/{session_id}"}
+        return 404, {}, {"error": {"message": f"{method} {path} not faked"}}
+
+
+# ------------------------------------------
+# Gemini: scripted generateContent
+# ------------------------------------------
+def _fake_embedding(text, dim):
+    digest = hashlib.sha256(text.encode()).digest() * (dim // 32 + 1)
+    return [b / 255.0 - 0.5 for b in digest[:dim]]
+
+
+class FakeGemini(FakeService):
+    """
+    Replies to generateContent with scripted JSON payloads (cycled), after 'latency'
+    seconds. Each reply carries usageMetadata so token accounting works offline.
+    """
+    name = "gemini"
+
+    def __init__(self, latency=0.0, script=None):
+        super().__init__(latency)
+        self.script = list(script or [])
+        self.last_prompt = None
+        self.prompt_bytes = 0
+        self.prompt_tokens = 0
+        self._turn = 0
+
+    def stats(self):
+        return {**super().stats(), "prompt_bytes": self.prompt_bytes, "prompt_tokens": self.prompt_tokens}
+
+    def handle(self, method, path, query, headers, body):
+        if not path.endswith((":generateContent", ":embedContent", ":batchEmbedContents")):
+            return 404, {}, {"error": {"message": f"{path} not faked"}}
+        request = json.loads(body or b"{}")
+        prompt_text = "".join(part.get("text", "") for content in request.get("contents", []) for part in content.get("parts", []))
+        with self._lock:
+            self.last_prompt = prompt_text
+            self.prompt_bytes += len(prompt_text.encode())
+            self.prompt_tokens += len(prompt_text) // 4
+        if path.endswith(":embedContent"):
+            return 200, {}, {"embedding": {"values": [0.0] * 8}}
+        if path.endswith(":batchEmbedContents"):
+            # Deterministic per text, so identical notes embed identically
+            return 200, {}, {"embeddings": [{"values": _fake_embedding(
+                "".join(p.get("text", "") for p in r.get("content", {}).get("parts", [])),
+                r.get("outputDimensionality") or 8)} for r in request.get("requests", [])]}
+        reply = self.script[self._turn % len(self.script)] if self.script else {"error": "No clear speech detected. Please try again."}
+        self._turn += 1
+        text = reply if isinstance(reply, str) else json.dumps(reply)
+        return 200, {}, {
+            "candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "finishReason": "STOP", "index": 0}],
+            "usageMetadata": {"promptTokenCount": len(prompt_text) // 4, "candidatesTokenCount": len(text) // 4,
+                              "totalTokenCount": (len(prompt_text) + len(text)) // 4},
+            "modelVersion": path.split("/")[-1].split(":")[0],
+        }
@@ -0,0 +1,331 @@
+import os
+import sys
+import io
+import json
+import time
+import wave
+import hmac
+import hashlib
+import argparse
+import importlib
+from types import SimpleNamespace
+from datetime import datetime, timedelta, timezone
+
+from fakes import FakeSupabase, FakeStripe, FakeGemini
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# ==========================================
+# OFFLINE BENCHMARKS (APP + WEBHOOK)
+# ==========================================
+# Drives app.py through Streamlit's AppTest and webhook_server.py through the
+# Flask test client, with Supabase, Stripe and Gemini replaced by the local
+# stand-ins in fakes.py. For every step it reports wall time and the number of
+# round-trips to each external service.
+#
+# Round-trip counts are deterministic, so they are what CI gates on:
+#   python bench/run_bench.py                    # print the report
+#   python bench/run_bench.py --latency-ms 40    # model a real network
+#   python bench/run_bench.py --check            # exit 1 if any count went up vs baseline.json
+#   python bench/run_bench.py --update-baseline  # accept the current counts
+# Wall times are reported only; they depend on the machine.
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+SERVICES = ("supabase", "stripe", "gemini")
+
+SEED_LEADS = 120        # > 2 Rolodex pages of 50
+DUE_SOON_LEADS = 12     # leads with next_outreach_at inside the Due Soon window
+WEBHOOK_SECRET = "whsec_bench"
+
+BENCH_EMAIL = "bench@example.com"
+REFERRER_EMAIL = "referrer@example.com"
+PAYER_EMAIL = "payer@example.com"
+LEGACY_PAYER_EMAIL = "legacy-payer@example.com"  # subscribed before checkout metadata existed
+
+# Gemini replies, in the order the voice scenarios consume them
+GEMINI_SCRIPT = [
+    {"action": "CREATE", "match_id": None, "confidence": "High", "lead_data": {
+        "name": "Dana Whitfield", "contact_info": "(555) 010-4477", "background": "Met at the gym.",
+        "product_pitch": "Starter kit", "status": "Lead", "next_outreach": "tomorrow at 3pm", "transaction_item": None}},
+    {"action": "CREATE", "match_id": None, "confidence": "High", "lead_data": {
+        "name": "Lead 7", "contact_info": "555-000-0007", "background": "Bought a refill.",
+        "product_pitch": None, "status": "Client", "next_outreach": None, "transaction_item": "Refill pack"}},
+    {"action": "QUERY", "match_id": 3, "confidence": "High", "lead_data": {"name": "Lead 3"}},
+    {"action": "QUERY", "match_id": None, "confidence": "High", "lead_data": None, "query": {
+        "title": "Clients", "aggregate": "count", "filters": [{"field": "status", "op": "eq", "value": "Client"}],
+        "group_by": None, "sort_by": "created_at", "descending": True, "limit": 10}},
+]
+
+
+def silent_wav(seconds=1.0, rate=16000):
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(b"\x00\x00" * int(seconds * rate))
+    return buf.getvalue()
+
+
+def submit_voice(at, timeout=60):
+    """Records a clip in the Assistant tab and reruns until the background voice job has finished."""
+    at.audio_input[0].set_value(("clip.wav", silent_wav(), "audio/wav")).run()
+    deadline = time.time() + timeout
+    while not at.exception and at.session_state["voice_job_id"] and time.time() < deadline:
+        time.sleep(0.01)
+        at.run()  # what the polling fragment does in a browser
+    return at
+
+
+def sign_stripe_payload(payload, secret):
+    """Stripe-Signature header for a payload, as Stripe would send it."""
+    ts = int(time.time())
+    sig = hmac.new(secret.encode(), f"{ts}.{payload}".encode(), hashlib.sha256).hexdigest()
+    return f"t={ts},v1={sig}"
+
+
+class Bench:
+    def __init__(self, latency):
+        self.services = {
+            "supabase": FakeSupabase(latency).start(),
+            "stripe": FakeStripe(latency).start(),
+            "gemini": FakeGemini(latency, GEMINI_SCRIPT).start(),
+        }
+        self.results = []  # (scenario, step, seconds, {service: round-trips})
+        self._seed()
+        os.environ.update({
+            "SUPABASE_URL": self.services["supabase"].url,
+            "SUPABASE_KEY": "bench-service-key",
+            "STRIPE_SECRET_KEY": "sk_test_bench",
+            "STRIPE_PRICE_ID": "price_bench",
+            "STRIPE_API_BASE": self.services["stripe"].url,
+            "STRIPE_WEBHOOK_SECRET": WEBHOOK_SECRET,
+            "GOOGLE_API_KEY": "bench-google-key",
+            "GEMINI_BASE_URL": self.services["gemini"].url,
+            "SEMANTIC_INDEX_DIR": "",  # in-memory index: every run starts cold
+        })
+        os.environ.pop("SESSION_COOKIE_SECRET", None)  # the cookie component cannot run headless
+
+    def _seed(self):
+        sb, stripe_fake = self.services["supabase"], self.services["stripe"]
+        self.user_id = sb.add_user(BENCH_EMAIL)
+        self.referrer_id = referrer_id = sb.add_user(REFERRER_EMAIL)
+        self.payer_id = sb.add_user(PAYER_EMAIL)
+        legacy_id = sb.add_user(LEGACY_PAYER_EMAIL)
+        for payer in (self.payer_id, legacy_id):
+            sb._profile(payer)["referred_by"] = referrer_id
+        sb._profile(referrer_id)["referral_count"] = 2
+
+        now = datetime.now(timezone.utc)
+        leads = []
+        for i in range(1, SEED_LEADS + 1):
+            due = now + timedelta(days=i % 6) if i <= DUE_SOON_LEADS else None
+            leads.append({
+                "id": i, "user_id": self.user_id, "name": f"Lead {i}",
+                "contact_info": f"555-000-{i:04d}", "phone_e164": f"+1555000{i:04d}", "email_norm": None,
+                "background": "Seeded for benchmarks.", "product_pitch": "Starter kit",
+                "status": "Client" if i % 5 == 0 else "Lead", "transactions": None,
+                "next_outreach": due.isoformat() if due else None,
+                "next_outreach_at": due.isoformat() if due else None,
+                "created_at": (now - timedelta(hours=i)).isoformat(),
+            })
+        sb.insert_rows("leads", leads)
+
+        stripe_fake.add_customer(BENCH_EMAIL)
+        self.payer_customer = stripe_fake.add_customer(PAYER_EMAIL)
+        self.legacy_customer = stripe_fake.add_customer(LEGACY_PAYER_EMAIL)
+
+    # --- measurement ---
+    def measure(self, scenario, step, fn):
+        before = {name: svc.snapshot()[0] for name, svc in self.services.items()}
+        started = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - started
+        trips = {name: svc.snapshot()[0] - before[name] for name, svc in self.services.items()}
+        self.results.append((scenario, step, elapsed, trips))
+
+    # --- app scenarios ---
+    def new_app(self, signed_in=True, subscribed=True, **state):
+        import streamlit as st
+        from streamlit.testing.v1 import AppTest
+        # Fresh process-level caches per scenario, so each one starts cold
+        st.cache_resource.clear()
+        st.cache_data.clear()
+        at = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=60)
+        if signed_in:
+            at.session_state["user"] = SimpleNamespace(id=self.user_id, email=BENCH_EMAIL, user_metadata={})
+            at.session_state["access_token"] = f"bench-{self.user_id}"
+            at.session_state["refresh_token"] = f"refresh-{self.user_id}"
+            at.session_state["token_expires_at"] = int(time.time()) + 3600
+            at.session_state["is_subscribed"] = subscribed
+        for key, value in state.items():
+            at.session_state[key] = value
+        return at
+
+    @staticmethod
+    def check(at):
+        if at.exception:
+            raise RuntimeError(f"app raised: {at.exception[0].message}")
+        # Background prefetches belong to the step that started them
+        if "rolodex_cache" in at.session_state:
+            at.session_state["rolodex_cache"].settle(timeout=30)
+        return at
+
+    def button(self, at, key):
+        return lambda: self.check(next(b for b in at.button if b.key == key).click().run())
+
+    def run_app_scenarios(self):
+        at = self.new_app(signed_in=False)
+        self.measure("login", "first paint", lambda: self.check(at.run()))
+
+        at = self.new_app(subscribed=False)
+        self.measure("paywall", "first paint", lambda: self.check(at.run()))
+        self.measure("paywall", "subscribe click", lambda: self.check(at.button[0].click().run()))
+
+        at = self.new_app(active_tab="omni")
+        self.measure("omni", "first paint", lambda: self.check(at.run()))
+        self.measure("omni", "voice create", lambda: self.check(submit_voice(at)))
+
+        at = self.new_app(active_tab="omni")
+        at.run()
+        self.measure("omni", "voice duplicate -> update", lambda: self.check(submit_voice(at)))
+
+        at = self.new_app(active_tab="omni")
+        at.run()
+        self.measure("omni", "voice query", lambda: self.check(submit_voice(at)))
+
+        at = self.new_app(active_tab="omni")
+        at.run()
+        self.measure("omni", "voice aggregate query", lambda: self.check(submit_voice(at)))
+
+        at = self.new_app(active_tab="pipeline")
+        self.measure("pipeline", "first paint", lambda: self.check(at.run()))
+        self.measure("pipeline", "next page", self.button(at, "next_page"))
+        self.measure("pipeline", "open lead", lambda: self.check(
+            next(b for b in at.button if b.key.startswith("card_")).click().run()))
+        self.measure("pipeline", "back to list", self.button(at, "back_to_list"))
+        self.measure("pipeline", "reopen lead", lambda: self.check(
+            next(b for b in at.button if b.key.startswith("card_")).click().run()))
+        self.measure("pipeline", "back to list, previous page", lambda: (
+            self.button(at, "back_to_list")(), self.button(at, "prev_page")()))
+
+        at = self.new_app(active_tab="pipeline")
+        at.run()
+        at.toggle(key="semantic_search").set_value(True)
+        self.measure("pipeline", "semantic search (cold index)", lambda: self.check(
+            at.text_input[0].input("who would want the starter kit?").run()))
+        self.measure("pipeline", "semantic search (warm index)", lambda: self.check(
+            at.text_input[0].input("anyone who bought a refill").run()))
+
+        at = self.new_app(active_tab="due")
+        self.measure("due soon", "first paint", lambda: self.check(at.run()))
+        self.measure("due soon", "open lead", lambda: self.check(
+            next(b for b in at.button if b.key.startswith("due_")).click().run()))
+
+        at = self.new_app(active_tab="analytics")
+        self.measure("analytics", "first paint", lambda: self.check(at.run()))
+
+        at = self.new_app(show_profile=True)
+        self.measure("profile", "first paint", lambda: self.check(at.run()))
+
+    # --- webhook scenarios ---
+    def post_event(self, client, event_type, obj):
+        payload = json.dumps({"id": f"evt_{event_type}", "object": "event", "type": event_type,
+                              "data": {"object": obj}})
+        res = client.post("/webhook", data=payload, content_type="application/json",
+                          headers={"Stripe-Signature": sign_stripe_payload(payload, WEBHOOK_SECRET)})
+        if res.status_code != 200:
+            raise RuntimeError(f"webhook returned {res.status_code} for {event_type}")
+
+    def run_webhook_scenarios(self):
+        import webhook_server
+        webhook_server = importlib.reload(webhook_server)  # pick up the bench env
+        client = webhook_server.app.test_client()
+        # Checkout metadata (what the app attaches) is copied onto subscriptions and invoices
+        metadata = {"user_id": self.payer_id, "referred_by": self.referrer_id}
+        invoice = {"id": "in_bench", "object": "invoice", "customer": self.payer_customer,
+                   "customer_email": PAYER_EMAIL, "amount_paid": 2000,
+                   "subscription_details": {"metadata": metadata}}
+        subscription = {"id": "sub_bench", "object": "subscription", "customer": self.payer_customer,
+                        "status": "active", "metadata": metadata}
+        legacy_invoice = {"id": "in_legacy_1", "object": "invoice", "customer": self.legacy_customer,
+                          "customer_email": LEGACY_PAYER_EMAIL, "amount_paid": 2000}
+        self.measure("webhook", "invoice.payment_succeeded", lambda: self.post_event(client, "invoice.payment_succeeded", invoice))
+        self.measure("webhook", "invoice retry (idempotent)", lambda: self.post_event(client, "invoice.payment_succeeded", invoice))
+        self.measure("webhook", "customer.subscription.updated", lambda: self.post_event(client, "customer.subscription.updated", subscription))
+        self.measure("webhook", "legacy invoice (email match)", lambda: self.post_event(client, "invoice.payment_succeeded", legacy_invoice))
+        self.measure("webhook", "legacy invoice (cached)", lambda: self.post_event(
+            client, "invoice.payment_succeeded", {**legacy_invoice, "id": "in_legacy_2"}))
+
+    def stop(self):
+        for svc in self.services.values():
+            svc.stop()
+
+
+# ------------------------------------------
+# Reporting / baseline
+# ------------------------------------------
+def format_report(results, latency_ms):
+    lines = [f"Offline benchmarks (service latency {latency_ms:g} ms per request)", ""]
+    header = f"{'scenario':<10} {'step':<32} {'wall ms':>9} " + " ".join(f"{s:>9}" for s in SERVICES)
+    lines += [header, "-" * len(header)]
+    for scenario, step, elapsed, trips in results:
+        lines.append(f"{scenario:<10} {step:<32} {elapsed * 1000:>9.1f} " + " ".join(f"{trips[s]:>9}" for s in SERVICES))
+    totals = {s: sum(r[3][s] for r in results) for s in SERVICES}
+    lines.append("-" * len(header))
+    lines.append(f"{'total':<10} {'':<32} {sum(r[2] for r in results) * 1000:>9.1f} " + " ".join(f"{totals[s]:>9}" for s in SERVICES))
+    return "\n".join(lines)
+
+def as_baseline(results):
+    return {f"{scenario} / {step}": trips for scenario, step, _, trips in results}
+
+def compare_to_baseline(results, baseline):
+    """Returns a list of regressions: steps whose round-trips to any service went up (or are new)."""
+    regressions = []
+    for key, trips in as_baseline(results).items():
+        expected = baseline.get(key)
+        if expected is None:
+            regressions.append(f"{key}: not in baseline (run with --update-baseline)")
+            continue
+        for service, count in trips.items():
+            if count > expected.get(service, 0):
+                regressions.append(f"{key}: {service} round-trips {expected.get(service, 0)} -> {count}")
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Offline latency / round-trip benchmarks for app.py and webhook_server.py.")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Added latency per fake-service request")
+    parser.add_argument("--check", action="store_true", help="Fail if round-trips regress against baseline.json")
+    parser.add_argument("--update-baseline", action="store_true", help="Write the current round-trips to baseline.json")
+    parser.add_argument("--out", help="Also write the report to this file")
+    args = parser.parse_args()
+
+    bench = Bench(args.latency_ms / 1000)
+    try:
+        bench.run_app_scenarios()
+        bench.run_webhook_scenarios()
+    finally:
+        bench.stop()
+
+    report = format_report(bench.results, args.latency_ms)
+    print(report)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(report + "\n")
+
+    if args.update_baseline:
+        with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+            json.dump(as_baseline(bench.results), f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"\n📌 Baseline written to {BASELINE_PATH}")
+    elif args.check:
+        with open(BASELINE_PATH, encoding="utf-8") as f:
+            regressions = compare_to_baseline(bench.results, json.load(f))
+        if regressions:
+            print("\n❌ Round-trip regressions:")
+            for line in regressions:
+                print(f"   {line}")
+            sys.exit(1)
+        print("\n✅ No round-trip regressions.")
@@ -0,0 +1,159 @@
+import os
+import sys
+import csv
+import json
+import time
+import resource
+import argparse
+import subprocess
+from types import SimpleNamespace
+from datetime import datetime
+
+from fakes import FakeSupabase, FakeGemini, fetch_stats
+from synthetic_leads import generate_leads
+from run_bench import submit_voice
+
+ROOT = os.path.dirname(os.path.abspath(os.path.dirname(__file__)))
+
+# ==========================================
+# ROLODEX SCALING SUITE
+# ==========================================
+# Cost of the O(N) paths as a user's Rolodex grows:
+#   omni      - voice command: the whole Rolodex is serialized into the Gemini prompt
+#   search    - Rolodex search: unpaginated fetch of every lead, filtered in Python
+#   analytics - Performance tab: every lead loaded into a DataFrame
+# For each size the fakes are seeded in this process, and each view runs in a
+# fresh subprocess so its peak RSS is the app's alone.
+#   python bench/scaling.py                          # 10, 1k, 10k, 100k
+#   python bench/scaling.py --sizes 10 1000
+#   python bench/scaling.py --csv bench_scaling.csv  # append rows, labelled by release
+
+DEFAULT_SIZES = [10, 1_000, 10_000, 100_000]
+VIEWS = ["omni", "search", "analytics"]
+USER_ID = "00000000-0000-4000-8000-000000000001"
+SEARCH_TERM = "Maria"  # one of the generator's 40 first names
+
+GEMINI_REPLY = {"action": "QUERY", "match_id": 1, "confidence": "High", "lead_data": {"name": "Maria Garcia"}}
+
+def rss_kb():
+    """Peak RSS of this process in KB (ru_maxrss is KB on Linux, bytes on macOS)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+# ------------------------------------------
+# Child: one view against already-seeded fakes
+# ------------------------------------------
+def run_view(view):
+    from streamlit.testing.v1 import AppTest
+    at = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=900)
+    at.session_state["user"] = SimpleNamespace(id=USER_ID, email="scale@example.com", user_metadata={})
+    at.session_state["access_token"] = f"bench-{USER_ID}"
+    at.session_state["refresh_token"] = f"refresh-{USER_ID}"
+    at.session_state["token_expires_at"] = int(time.time()) + 3600
+    at.session_state["is_subscribed"] = True
+    at.session_state["active_tab"] = {"omni": "omni", "search": "pipeline", "analytics": "analytics"}[view]
+
+    if view == "omni":
+        at.run()
+        step = lambda: submit_voice(at, timeout=900)
+    elif view == "search":
+        at.run()
+        step = lambda: at.text_input[0].set_value(SEARCH_TERM).run()
+    else:
+        # Warm up on the (query-free) Assistant tab so the step excludes the cold import;
+        # the step is the tab switch a user makes
+        at.session_state["active_tab"] = "omni"
+        at.run()
+        step = lambda: at.radio(key="nav_radio").set_value("📊 Analytics").run()
+
+    urls = {"supabase": os.environ["SUPABASE_URL"], "gemini": os.environ["GEMINI_BASE_URL"]}
+    before = {name: fetch_stats(url) for name, url in urls.items()}
+    rss_before = rss_kb()
+    started = time.perf_counter()
+    step()
+    wall = time.perf_counter() - started
+    after = {name: fetch_stats(url) for name, url in urls.items()}
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+
+    print(json.dumps({
+        "wall_ms": wall * 1000,
+        "round_trips": sum(after[n]["requests"] - before[n]["requests"] for n in urls),
+        "response_bytes": after["supabase"]["bytes_out"] - before["supabase"]["bytes_out"],
+        "prompt_bytes": after["gemini"]["prompt_bytes"] - before["gemini"]["prompt_bytes"],
+        "prompt_tokens": after["gemini"]["prompt_tokens"] - before["gemini"]["prompt_tokens"],
+        "peak_rss_kb": rss_kb(),
+        "rss_growth_kb": rss_kb() - rss_before,
+    }))
+
+# ------------------------------------------
+# Parent: seed, spawn, tabulate
+# ------------------------------------------
+def measure(size, views):
+    supabase, gemini = FakeSupabase().start(), FakeGemini(script=[GEMINI_REPLY]).start()
+    try:
+        supabase.insert_rows("profiles", [{"id": USER_ID, "email": "scale@example.com"}])
+        supabase.insert_rows("leads", generate_leads(size, USER_ID))
+        env = {**os.environ,
+               "SUPABASE_URL": supabase.url, "SUPABASE_KEY": "bench-service-key",
+               "GOOGLE_API_KEY": "bench-google-key", "GEMINI_BASE_URL": gemini.url}
+        for var in ("SESSION_COOKIE_SECRET", "STRIPE_SECRET_KEY"):
+            env.pop(var, None)
+        rows = []
+        for view in views:
+            proc = subprocess.run([sys.executable, __file__, "--child", view], env=env,
+                                  capture_output=True, text=True, cwd=ROOT)
+            if proc.returncode != 0:
+                raise RuntimeError(f"{view} @ {size} failed:\n{proc.stderr[-2000:]}")
+            rows.append({"leads": size, "view": view, **json.loads(proc.stdout.strip().splitlines()[-1])})
+        return rows
+    finally:
+        supabase.stop()
+        gemini.stop()
+
+def format_table(rows):
+    header = f"{'leads':>8} {'view':<10} {'wall ms':>10} {'trips':>6} {'resp KB':>10} {'prompt KB':>10} {'~tokens':>10} {'peak RSS MB':>12} {'Δ RSS MB':>9}"
+    lines = [header, "-" * len(header)]
+    for r in rows:
+        lines.append(
+            f"{r['leads']:>8} {r['view']:<10} {r['wall_ms']:>10.1f} {r['round_trips']:>6} "
+            f"{r['response_bytes'] / 1024:>10.1f} {r['prompt_bytes'] / 1024:>10.1f} {r['prompt_tokens']:>10} "
+            f"{r['peak_rss_kb'] / 1024:>12.1f} {r['rss_growth_kb'] / 1024:>9.1f}")
+    return "\n".join(lines)
+
+def release_label():
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True,
+                              text=True, cwd=ROOT, check=True).stdout.strip()
+    except Exception:
+        return "unknown"
+
+def append_csv(path, rows):
+    label, stamp = release_label(), datetime.now().isoformat(timespec="seconds")
+    new_file = not os.path.exists(path)
+    with open(path, "a", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=["release", "run_at", *rows[0].keys()])
+        if new_file: writer.writeheader()
+        for r in rows:
+            writer.writerow({"release": label, "run_at": stamp, **r})
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Per-view cost curves as the Rolodex grows.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="Leads per user to test")
+    parser.add_argument("--views", nargs="+", choices=VIEWS, default=VIEWS)
+    parser.add_argument("--csv", help="Append results to this CSV (one row per size/view, labelled by git describe)")
+    parser.add_argument("--child", choices=VIEWS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_view(args.child)
+        sys.exit(0)
+
+    results = []
+    for size in args.sizes:
+        print(f"⏱️  {size} leads...", file=sys.stderr)
+        results.extend(measure(size, args.views))
+    print(format_table(results))
+    if args.csv:
+        append_csv(args.csv, results)
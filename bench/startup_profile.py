@@ -0,0 +1,143 @@
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# ==========================================
+# COLD-START PROFILE
+# ==========================================
+# What a fresh container pays before the first user sees the login screen:
+# interpreter + Streamlit start-up, then the imports app.py triggers and the
+# time to first paint of the login screen. Every run is a new process with
+# python -X importtime, so nothing is warm.
+#   python bench/startup_profile.py              # 3 cold runs, medians
+#   python bench/startup_profile.py --check      # fail if the login screen imports a heavy module
+#   python bench/startup_profile.py --csv startup.csv
+
+# Only needed after sign-in (see the lazy imports in app.py). numpy is not in
+# the list: Streamlit's own image handling (page icon, logo) imports it.
+HEAVY_MODULES = ["pandas", "google.genai", "stripe"]
+MARK = "--startup-profile: app run--"
+
+
+def child():
+    """One cold start. Prints JSON on stdout; -X importtime writes to stderr."""
+    started = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+    harness_s = time.perf_counter() - started
+
+    at = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=120)
+    print(MARK, file=sys.stderr, flush=True)
+    started = time.perf_counter()
+    at.run()
+    first_paint_s = time.perf_counter() - started
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+
+    print(json.dumps({
+        "harness_ms": harness_s * 1000,
+        "first_paint_ms": first_paint_s * 1000,
+        "heavy_loaded": [m for m in HEAVY_MODULES if m in sys.modules],
+    }))
+
+
+def parse_importtime(stderr):
+    """[(package, cumulative_us)] for top-level imports made after MARK, i.e. by app.py itself."""
+    lines = stderr.splitlines()
+    if MARK in lines:
+        lines = lines[lines.index(MARK) + 1:]
+    found = []
+    for line in lines:
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if name.startswith("   "):  # nested import, already counted in its parent
+            continue
+        found.append((name.strip(), int(cumulative)))
+    return found
+
+
+def run_once(env):
+    started = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", os.path.abspath(__file__), "--child"],
+                          cwd=ROOT, env=env, capture_output=True, text=True)
+    process_s = time.perf_counter() - started
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr[-2000:])
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result["process_ms"] = process_s * 1000
+    result["imports"] = parse_importtime(proc.stderr)
+    result["app_import_ms"] = sum(us for _, us in result["imports"]) / 1000
+    return result
+
+
+def report(runs, top):
+    med = lambda key: statistics.median(r[key] for r in runs)
+    totals = {}
+    for r in runs:
+        for name, us in r["imports"]:
+            totals.setdefault(name, []).append(us)
+    slowest = sorted(((statistics.median(v) / 1000, k) for k, v in totals.items()), reverse=True)[:top]
+    lines = [
+        f"Cold runs          {len(runs)}",
+        f"Process total ms   {med('process_ms'):.0f}  (interpreter + test harness + app)",
+        f"Harness import ms  {med('harness_ms'):.0f}  (streamlit itself)",
+        f"Login first paint  {med('first_paint_ms'):.0f} ms, of which imports {med('app_import_ms'):.0f} ms",
+        f"Heavy modules      {', '.join(runs[-1]['heavy_loaded']) or 'none'} loaded by the login screen",
+        "",
+        f"Slowest imports triggered by app.py (median cumulative ms, top {top}):",
+    ]
+    lines += [f"  {ms:8.1f}  {name}" for ms, name in slowest]
+    return "\n".join(lines)
+
+
+def git_describe():
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], cwd=ROOT,
+                              capture_output=True, text=True).stdout.strip() or "unknown"
+    except OSError:
+        return "unknown"
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Cold-start import and first-paint profile of app.py's login screen.")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--runs", type=int, default=3, help="Cold processes to start")
+    parser.add_argument("--top", type=int, default=15, help="Imports to list")
+    parser.add_argument("--check", action="store_true", help="Fail if the login screen loads any of " + ", ".join(HEAVY_MODULES))
+    parser.add_argument("--csv", help="Append a row (labelled with git describe) to this CSV")
+    args = parser.parse_args()
+
+    if args.child:
+        child()
+        sys.exit(0)
+
+    # The login screen makes no network calls; unroutable endpoints keep it that way
+    env = {**os.environ, "SUPABASE_URL": "http://127.0.0.1:9", "SUPABASE_KEY": "startup-profile-key",
+           "STRIPE_SECRET_KEY": "sk_test_startup", "GOOGLE_API_KEY": "startup-profile"}
+    env.pop("METRICS_PORT", None)
+    runs = [run_once(env) for _ in range(args.runs)]
+    print(report(runs, args.top))
+
+    if args.csv:
+        new_file = not os.path.exists(args.csv)
+        with open(args.csv, "a", encoding="utf-8") as f:
+            if new_file:
+                f.write("release,process_ms,harness_ms,first_paint_ms,app_import_ms,heavy_loaded\n")
+            f.write(f"{git_describe()},{statistics.median(r['process_ms'] for r in runs):.0f},"
+                    f"{statistics.median(r['harness_ms'] for r in runs):.0f},"
+                    f"{statistics.median(r['first_paint_ms'] for r in runs):.0f},"
+                    f"{statistics.median(r['app_import_ms'] for r in runs):.0f},"
+                    f"{' '.join(runs[-1]['heavy_loaded'])}\n")
+
+    heavy = runs[-1]["heavy_loaded"]
+    if args.check:
+        if heavy:
+            print(f"\n❌ Login screen imports {', '.join(heavy)}")
+            sys.exit(1)
+        print("\n✅ No heavy modules on the login screen.")
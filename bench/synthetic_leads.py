@@ -0,0 +1,87 @@
+import random
+from datetime import datetime, timedelta, timezone
+
+# ==========================================
+# SYNTHETIC ROLODEX GENERATOR
+# ==========================================
+# Realistic-looking leads for the scaling suite: varied names, contact info,
+# multi-sentence background notes, product fit, transaction histories and
+# next-outreach dates. Generation is seeded, so a given (n, seed) always
+# produces the same Rolodex and runs can be compared across releases.
+
+FIRST_NAMES = [
+    "Maria", "James", "Aisha", "Chen", "Sofia", "Marcus", "Priya", "Daniel", "Fatima", "Luis",
+    "Hannah", "Kwame", "Elena", "Tyler", "Mei", "Jamal", "Olivia", "Diego", "Nadia", "Ethan",
+    "Grace", "Omar", "Chloe", "Andre", "Yuki", "Samuel", "Leah", "Rafael", "Zoe", "Victor",
+    "Ava", "Malik", "Isabel", "Connor", "Amara", "Noah", "Lucia", "Devon", "Ingrid", "Mateo",
+]
+LAST_NAMES = [
+    "Garcia", "Johnson", "Okafor", "Nguyen", "Rossi", "Williams", "Patel", "Kim", "Haddad", "Lopez",
+    "Schmidt", "Mensah", "Popescu", "Brooks", "Tanaka", "Washington", "Murphy", "Alvarez", "Ivanova", "Clarke",
+    "Bennett", "Farouk", "Dubois", "Reyes", "Sato", "Adeyemi", "Cohen", "Moreau", "Hughes", "Silva",
+]
+EMAIL_DOMAINS = ["gmail.com", "yahoo.com", "outlook.com", "icloud.com", "hotmail.com"]
+
+MET_AT = [
+    "Met at the Saturday farmers market", "Introduced by a mutual friend at a birthday party",
+    "Came to the spin class on Tuesday", "Sat next to me at the kids' soccer game",
+    "Replied to my Instagram story", "Neighbor from two doors down", "Coworker of my sister",
+    "Stopped by the booth at the wellness expo", "Friend of a current client", "Met in line at the coffee shop",
+]
+INTERESTS = [
+    "trying to lose 15 lbs before the wedding", "training for a half marathon", "struggles with energy in the afternoons",
+    "looking for cleaner skincare", "wants a side income for the holidays", "interested in meal-prep help",
+    "asked about sleep support", "has two toddlers and no time", "just started going to the gym",
+    "skeptical but curious after seeing results on a friend",
+]
+FOLLOW_UPS = [
+    "Prefers texts over calls.", "Best reached after 6pm.", "Wants to loop in their partner before deciding.",
+    "Asked for samples first.", "Budget is tight until payday on the 15th.", "Very responsive, follow up soon.",
+    "Said to check back after vacation.", "Interested in the business side too.", "",
+]
+PRODUCTS = [
+    "Starter kit", "Protein shake bundle", "Collagen + vitamin C", "Skincare trio", "Sleep support pack",
+    "Energy sticks", "Business builder pack", "Refill subscription", "Travel-size sampler", "Family wellness box",
+]
+
+
+def _contact(rng, first, last):
+    phone = f"({rng.randint(201, 989)}) {rng.randint(200, 999)}-{rng.randint(0, 9999):04d}"
+    email = f"{first}.{last}{rng.randint(1, 99)}@{rng.choice(EMAIL_DOMAINS)}".lower()
+    roll = rng.random()
+    if roll < 0.5: return phone
+    if roll < 0.75: return email
+    return f"{phone} / {email}"
+
+def _transactions(rng, created_at, now):
+    count = rng.choices([0, 1, 2, 4, 8], weights=[50, 20, 15, 10, 5])[0]
+    if not count: return None
+    span = max((now - created_at).days, 1)
+    days = sorted(rng.randint(0, span) for _ in range(count))
+    return "\n".join(f"• {(created_at + timedelta(days=d)).strftime('%Y-%m-%d')}: {rng.choice(PRODUCTS)}" for d in days)
+
+def generate_leads(n, user_id, seed=42, start_id=1, now=None):
+    """n lead rows for one user, shaped like the leads table."""
+    rng = random.Random(seed)
+    now = now or datetime.now(timezone.utc)
+    leads = []
+    for i in range(n):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        created_at = now - timedelta(days=rng.randint(0, 720), minutes=rng.randint(0, 1440))
+        transactions = _transactions(rng, created_at, now)
+        background = f"{rng.choice(MET_AT)}; {rng.choice(INTERESTS)}. {rng.choice(FOLLOW_UPS)}".strip()
+        next_at = now + timedelta(days=rng.randint(-10, 45), hours=rng.randint(0, 10)) if rng.random() < 0.3 else None
+        leads.append({
+            "id": start_id + i,
+            "user_id": user_id,
+            "name": f"{first} {last}",
+            "contact_info": _contact(rng, first, last),
+            "background": background,
+            "product_pitch": rng.choice(PRODUCTS),
+            "status": "Client" if transactions else "Lead",
+            "transactions": transactions,
+            "next_outreach": next_at.isoformat() if next_at else None,
+            "next_outreach_at": next_at.isoformat() if next_at else None,
+            "created_at": created_at.isoformat(),
+        })
+    return leads
@@ -0,0 +1,190 @@
+import os
+import sys
+import json
+import time
+import random
+import socket
+import argparse
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+from fakes import FakeSupabase, FakeStripe
+from run_bench import sign_stripe_payload
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# ==========================================
+# WEBHOOK LOAD TEST
+# ==========================================
+# Replays correctly signed Stripe events at a fixed rate (open loop: a slow
+# server does not slow the sender down) and reports achieved throughput and
+# latency percentiles.
+#   python bench/webhook_load.py --rate 200 --duration 20
+#       starts the Supabase/Stripe stand-ins and webhook_server under gunicorn
+#   python bench/webhook_load.py --url http://host:5000 --secret whsec_...
+#       targets an already running server (its own Supabase!)
+
+DEFAULT_SECRET = "whsec_load"
+EVENT_MIX = {"invoice.payment_succeeded": 0.8, "customer.subscription.updated": 0.2}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+# ------------------------------------------
+# Fixtures
+# ------------------------------------------
+def seed(supabase, stripe_fake, payers):
+    """
+    Creates referrers and payers (about half of them referred).
+    Returns [(email, customer_id, checkout metadata or None)]; a quarter are legacy
+    subscribers whose events carry no metadata and are resolved by email.
+    """
+    referrers = [supabase.add_user(f"referrer{i}@example.com") for i in range(max(payers // 10, 1))]
+    accounts = []
+    for i in range(payers):
+        email = f"payer{i}@example.com"
+        user_id = supabase.add_user(email)
+        referrer = referrers[i % len(referrers)] if i % 2 == 0 else None
+        supabase._profile(user_id)["referred_by"] = referrer
+        metadata = None if i % 4 == 3 else {"user_id": user_id, **({"referred_by": referrer} if referrer else {})}
+        accounts.append((email, stripe_fake.add_customer(email), metadata))
+    return accounts
+
+def build_fixtures(accounts, count, seed_value=7):
+    """count (event_type, payload) pairs, drawn from EVENT_MIX. Invoice ids are unique, so every credit is new."""
+    rng = random.Random(seed_value)
+    types_, weights = zip(*EVENT_MIX.items())
+    fixtures = []
+    for i in range(count):
+        event_type = rng.choices(types_, weights)[0]
+        email, customer, metadata = rng.choice(accounts)
+        if event_type == "invoice.payment_succeeded":
+            obj = {"id": f"in_load_{i}", "object": "invoice", "customer": customer,
+                   "customer_email": email, "amount_paid": 2000}
+            if metadata: obj["subscription_details"] = {"metadata": metadata}
+        else:
+            obj = {"id": f"sub_load_{i}", "object": "subscription", "customer": customer,
+                   "status": rng.choice(["active", "active", "active", "past_due"])}
+            if metadata: obj["metadata"] = metadata
+        payload = json.dumps({"id": f"evt_load_{i}", "object": "event", "type": event_type,
+                              "created": int(time.time()), "data": {"object": obj}})
+        fixtures.append((event_type, payload))
+    return fixtures
+
+# ------------------------------------------
+# Server under test
+# ------------------------------------------
+def start_server(env, port):
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "webhook_server:app"],
+        cwd=ROOT, env={**env, "PORT": str(port), "WEBHOOK_LOG_LEVEL": "warning"},
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"gunicorn exited:\n{proc.stderr.read().decode()[-2000:]}")
+        try:
+            if httpx.get(f"{url}/healthz", timeout=1).status_code == 200:
+                return proc, url
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError("webhook server did not become healthy")
+
+# ------------------------------------------
+# Load
+# ------------------------------------------
+def replay(url, fixtures, rate, secret, concurrency):
+    """Sends fixtures at 'rate' per second. Returns [(event_type, status, seconds, lag)]."""
+    results = []
+    client = httpx.Client(timeout=30, limits=httpx.Limits(max_connections=concurrency))
+
+    def send(event_type, payload, due):
+        lag = time.perf_counter() - due
+        started = time.perf_counter()
+        try:
+            status = client.post(f"{url}/webhook", content=payload, headers={
+                "Content-Type": "application/json",
+                "Stripe-Signature": sign_stripe_payload(payload, secret),  # signed at send time, inside the 5 min tolerance
+            }).status_code
+        except httpx.HTTPError:
+            status = 0
+        results.append((event_type, status, time.perf_counter() - started, lag))
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for i, (event_type, payload) in enumerate(fixtures):
+            due = t0 + i / rate
+            pause = due - time.perf_counter()
+            if pause > 0: time.sleep(pause)
+            pool.submit(send, event_type, payload, due)
+    client.close()
+    return results, time.perf_counter() - t0
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(int(q * len(values)), len(values) - 1)] if values else 0.0
+
+def report(results, elapsed, rate, supabase_trips=None):
+    ok = [r for r in results if r[1] == 200]
+    latencies = [r[2] for r in results]
+    lines = [
+        f"Target rate      {rate:g} events/s",
+        f"Achieved rate    {len(ok) / elapsed:.1f} events/s ({len(ok)}/{len(results)} OK in {elapsed:.1f}s)",
+        f"Latency ms       p50 {percentile(latencies, .5) * 1000:.1f}  p95 {percentile(latencies, .95) * 1000:.1f}  "
+        f"p99 {percentile(latencies, .99) * 1000:.1f}  max {max(latencies, default=0) * 1000:.1f}",
+        f"Sender lag ms    p95 {percentile([r[3] for r in results], .95) * 1000:.1f} (high = the load generator itself fell behind)",
+    ]
+    failures = {}
+    for event_type, status, _, _ in results:
+        if status != 200: failures[(event_type, status)] = failures.get((event_type, status), 0) + 1
+    for (event_type, status), n in sorted(failures.items()):
+        lines.append(f"Failed           {n} x {event_type} -> HTTP {status or 'connection error'}")
+    if supabase_trips is not None and results:
+        lines.append(f"Supabase trips   {supabase_trips} ({supabase_trips / len(results):.2f} per event)")
+    return "\n".join(lines)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Replay signed Stripe events against webhook_server at a target rate.")
+    parser.add_argument("--rate", type=float, default=50, help="Events per second")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds of load")
+    parser.add_argument("--concurrency", type=int, default=64, help="Max requests in flight")
+    parser.add_argument("--payers", type=int, default=1000, help="Seeded paying users (local mode)")
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="Stand-in Supabase/Stripe latency per request")
+    parser.add_argument("--url", help="Target an already running server instead of starting one")
+    parser.add_argument("--secret", default=DEFAULT_SECRET, help="Webhook signing secret the server expects")
+    args = parser.parse_args()
+
+    count = int(args.rate * args.duration)
+    if args.url:
+        accounts = [(f"payer{i}@example.com", f"cus_load_{i}", None) for i in range(args.payers)]
+        results, elapsed = replay(args.url, build_fixtures(accounts, count), args.rate, args.secret, args.concurrency)
+        print(report(results, elapsed, args.rate))
+        sys.exit(0)
+
+    supabase = FakeSupabase(args.latency_ms / 1000).start()
+    stripe_fake = FakeStripe(args.latency_ms / 1000).start()
+    server = None
+    try:
+        fixtures = build_fixtures(seed(supabase, stripe_fake, args.payers), count)
+        env = {**os.environ, "SUPABASE_URL": supabase.url, "SUPABASE_KEY": "load-service-key",
+               "STRIPE_SECRET_KEY": "sk_test_load", "STRIPE_API_BASE": stripe_fake.url,
+               "STRIPE_WEBHOOK_SECRET": args.secret}
+        server, url = start_server(env, free_port())
+        before = supabase.snapshot()[0]
+        results, elapsed = replay(url, fixtures, args.rate, args.secret, args.concurrency)
+        print(report(results, elapsed, args.rate, supabase.snapshot()[0] - before))
+        events = [l for l in httpx.get(f"{url}/metrics").text.splitlines() if l.startswith("nexus_webhook_events_total")]
+        print("\n" + "\n".join(events))
+    finally:
+        if server: server.terminate()
+        supabase.stop()
+        stripe_fake.stop()
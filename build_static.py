@@ -0,0 +1,89 @@
+import os
+import re
+import argparse
+import urllib.request
+
+from PIL import Image
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(ROOT, "static")
+SOURCE_LOGO = os.path.join(ROOT, "nexus_logo.jpg")
+
+# ==========================================
+# STATIC ASSET BUILD
+# ==========================================
+# Generates what app.py serves from static/ (see section 1.1 there):
+#   --logo   right-sized logo and icon variants from nexus_logo.jpg (committed)
+#   --fonts  self-hosted Roboto (latin subset, woff2) from Google Fonts
+# Usage: python build_static.py [--logo] [--fonts] [--force]   (no flag = both)
+# The Dockerfile runs --fonts at build time; files already present are kept.
+
+# (file, width) for the header logo, WebP at 1x and 2x of its widest column
+LOGO_VARIANTS = [("logo-640.webp", 640), ("logo-1280.webp", 1280)]
+# (file, size) square PNG icons: favicon / page_icon, iOS home screen, Android
+ICON_VARIANTS = [("icon-32.png", 32), ("icon-180.png", 180), ("icon-192.png", 192)]
+
+FONT_WEIGHTS = [400, 500, 700, 900]
+FONTS_CSS_URL = "https://fonts.googleapis.com/css2?family=Roboto:wght@400;500;700;900&display=swap"
+# Google Fonts only returns woff2 to browsers it recognizes
+BROWSER_UA = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36"
+
+
+def build_logo(force=False):
+    logo = Image.open(SOURCE_LOGO).convert("RGB")
+    for name, width in LOGO_VARIANTS:
+        path = os.path.join(STATIC_DIR, name)
+        if os.path.exists(path) and not force: continue
+        height = round(logo.height * width / logo.width)
+        logo.resize((width, height), Image.LANCZOS).save(path, "WEBP", quality=82, method=6)
+        print(f"🖼️ {name} {width}x{height} {os.path.getsize(path) / 1024:.1f} KB")
+
+    # Icons are square: the wide logo is centered on its own (near white) background
+    side = max(logo.size)
+    square = Image.new("RGB", (side, side), logo.getpixel((0, 0)))
+    square.paste(logo, ((side - logo.width) // 2, (side - logo.height) // 2))
+    for name, size in ICON_VARIANTS:
+        path = os.path.join(STATIC_DIR, name)
+        if os.path.exists(path) and not force: continue
+        square.resize((size, size), Image.LANCZOS).save(path, "PNG", optimize=True)
+        print(f"🖼️ {name} {size}x{size} {os.path.getsize(path) / 1024:.1f} KB")
+
+
+def build_fonts(force=False):
+    fonts_dir = os.path.join(STATIC_DIR, "fonts")
+    os.makedirs(fonts_dir, exist_ok=True)
+    wanted = [w for w in FONT_WEIGHTS if force or not os.path.exists(os.path.join(fonts_dir, f"roboto-{w}.woff2"))]
+    if not wanted:
+        print("ℹ️ Fonts already present.")
+        return
+
+    request = urllib.request.Request(FONTS_CSS_URL, headers={"User-Agent": BROWSER_UA})
+    css = urllib.request.urlopen(request, timeout=30).read().decode()
+    # One @font-face per (subset, weight); keep the latin subset only
+    for subset, body in re.findall(r"/\* ([\w-]+) \*/\s*@font-face\s*{([^}]*)}", css):
+        weight = int(re.search(r"font-weight:\s*(\d+)", body).group(1))
+        if subset != "latin" or weight not in wanted: continue
+        url = re.search(r"url\((https://[^)]+\.woff2)\)", body).group(1)
+        path = os.path.join(fonts_dir, f"roboto-{weight}.woff2")
+        with urllib.request.urlopen(url, timeout=30) as src, open(path, "wb") as dst:
+            dst.write(src.read())
+        print(f"🔤 roboto-{weight}.woff2 {os.path.getsize(path) / 1024:.1f} KB")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build the logo/icon variants and self-hosted fonts in static/.")
+    parser.add_argument("--logo", action="store_true", help="Logo and icon variants")
+    parser.add_argument("--fonts", action="store_true", help="Download Roboto woff2 files")
+    parser.add_argument("--force", action="store_true", help="Rebuild files that already exist")
+    args = parser.parse_args()
+    both = not (args.logo or args.fonts)
+
+    os.makedirs(STATIC_DIR, exist_ok=True)
+    if args.logo or both:
+        build_logo(args.force)
+    if args.fonts or both:
+        try:
+            build_fonts(args.force)
+        except OSError as e:
+            # The CSS falls back to the system font stack, so a failed download is not fatal
+            print(f"⚠️ Font download failed: {e}")
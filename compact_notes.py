@@ -0,0 +1,203 @@
+import os
+import argparse
+import hashlib
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from supabase import create_client, Client
+from dotenv import load_dotenv
+from tenacity import retry, stop_after_attempt, wait_exponential
+from rate_limit import TokenBucket
+
+# Load environment variables
+load_dotenv()
+
+# --- Configuration ---
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_KEY = os.getenv("SUPABASE_KEY")  # MUST be the SERVICE_ROLE key to bypass RLS
+GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL")  # optional override, used by bench/
+
+COMPACT_MODEL = os.getenv("GEMINI_MODEL_LITE", "gemini-2.0-flash-lite")
+MIN_BYTES = int(os.getenv("COMPACT_MIN_BYTES", "2000"))        # backgrounds at least this long are compacted
+DIGEST_CHARS = int(os.getenv("COMPACT_DIGEST_CHARS", "600"))   # hard cap on the digest that replaces them
+GEMINI_RATE = float(os.getenv("COMPACT_GEMINI_RATE", "2"))     # summaries/s (shared project quota with the app)
+PAGE_SIZE = 200
+WRITE_BATCH = 100
+CHARS_PER_TOKEN = 4  # rough Gemini tokenization for English text
+
+# ==========================================
+# BACKGROUND-NOTES COMPACTION
+# ==========================================
+# Every UPDATE can extend leads.background, and the whole Rolodex (backgrounds
+# included) goes into each voice prompt. This job keeps backgrounds bounded:
+# 1. Page through leads whose background is >= COMPACT_MIN_BYTES
+#    (leads_needing_compaction, keyset on id).
+# 2. Summarize each into a digest of at most COMPACT_DIGEST_CHARS with Gemini
+#    (flash-lite), rate-limited; at most --per-user leads per user per run so
+#    one heavy user cannot use up a run.
+# 3. apply_note_compactions() archives the full text in lead_note_archive and
+#    swaps in the digest, skipping leads whose notes changed in the meantime.
+# 4. Report the bytes saved and the prompt tokens saved per voice command.
+# --extractive skips the model and keeps the most recent notes (offline runs).
+# Usage: python compact_notes.py [--dry-run] [--extractive] [--per-user 200] [--workers 4]
+
+SUMMARY_PROMPT = """Condense the sales notes below about {name} into at most {chars} characters.
+Keep the concrete facts a salesperson needs: family and life details, preferences, needs and objections,
+what they bought and when, promised follow-ups. Drop repetition and filler. When notes conflict, the newest wins.
+Plain text only, no headings or markdown.
+
+NOTES:
+{notes}"""
+
+def iter_candidates(supabase, min_bytes):
+    after_id = 0
+    while True:
+        page = supabase.rpc('leads_needing_compaction', {
+            'p_min_bytes': min_bytes, 'p_after_id': after_id, 'p_limit': PAGE_SIZE
+        }).execute().data
+        yield from page
+        if len(page) < PAGE_SIZE:
+            return
+        after_id = page[-1]['id']
+
+def bound(text, limit=DIGEST_CHARS):
+    """Cuts text to at most `limit` characters, at a sentence or word boundary when there is one."""
+    text = " ".join((text or "").split())
+    if len(text) <= limit:
+        return text
+    cut = text[:limit - 1]
+    for stop in (". ", "; ", " "):
+        at = cut.rfind(stop)
+        if at >= limit // 2:
+            cut = cut[:at + 1]
+            break
+    return cut.rstrip() + "…"
+
+def extractive_digest(notes, limit=DIGEST_CHARS):
+    """No-model digest: the most recent notes (they are appended at the end), marked as such."""
+    prefix = "[Earlier notes archived] "
+    tail = " ".join(notes.split())[-(limit - len(prefix)):]
+    space = tail.find(" ")
+    if 0 <= space < 40: tail = tail[space + 1:]
+    return prefix + tail
+
+def gemini_summarizer(limiter):
+    from google import genai
+    from google.genai import types
+    client = genai.Client(
+        api_key=GOOGLE_API_KEY,
+        http_options=types.HttpOptions(base_url=GEMINI_BASE_URL) if GEMINI_BASE_URL else None,
+    )
+    config = types.GenerateContentConfig(temperature=0.2, max_output_tokens=DIGEST_CHARS // 3)
+
+    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=2, max=10))
+    def summarize(lead):
+        limiter.acquire()
+        prompt = SUMMARY_PROMPT.format(name=lead.get('name') or "this lead", chars=DIGEST_CHARS, notes=lead['background'])
+        response = client.models.generate_content(model=COMPACT_MODEL, contents=prompt, config=config)
+        usage = response.usage_metadata
+        spent = (usage.prompt_token_count or 0, usage.candidates_token_count or 0) if usage else (0, 0)
+        return bound(response.text), spent
+    return summarize
+
+def compact(lead, summarize):
+    """(row for apply_note_compactions or None, (prompt, output) tokens spent)"""
+    notes = lead['background']
+    digest, spent = summarize(lead) if summarize else (extractive_digest(notes), (0, 0))
+    if not digest or len(digest.encode()) >= len(notes.encode()):
+        return None, spent
+    return {'id': lead['id'], 'original_md5': hashlib.md5(notes.encode()).hexdigest(), 'digest': digest}, spent
+
+def run(supabase, summarize, per_user, workers, dry_run):
+    stats = Counter()
+    saved_by_user = Counter()
+    taken = Counter()
+    batch = []
+
+    def flush(batch):
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(lambda lead: _safe_compact(lead, summarize), batch))
+        rows = []
+        for lead, (row, spent, failed) in zip(batch, results):
+            stats['model_prompt_tokens'] += spent[0]
+            stats['model_output_tokens'] += spent[1]
+            if failed: stats['failed'] += 1
+            elif row: rows.append((lead, row))
+            else: stats['unchanged'] += 1
+        if not rows: return
+        applied = {r['id'] for r in supabase.rpc('apply_note_compactions', {'p_rows': [row for _, row in rows]}).execute().data or []}
+        stats['compacted'] += len(applied)
+        stats['changed_meanwhile'] += len(rows) - len(applied)
+        for lead, row in rows:
+            if lead['id'] not in applied: continue
+            saved = len(lead['background'].encode()) - len(row['digest'].encode())
+            stats['bytes_saved'] += saved
+            saved_by_user[lead['user_id']] += saved
+
+    for lead in iter_candidates(supabase, MIN_BYTES):
+        stats['candidates'] += 1
+        stats['bytes_before'] += len(lead['background'].encode())
+        if taken[lead['user_id']] >= per_user:
+            stats['deferred'] += 1
+            continue
+        taken[lead['user_id']] += 1
+        if dry_run:
+            # Projection without model calls: every digest at its full cap
+            saved = max(len(lead['background'].encode()) - DIGEST_CHARS, 0)
+            stats['bytes_saved'] += saved
+            saved_by_user[lead['user_id']] += saved
+            continue
+        batch.append(lead)
+        if len(batch) >= WRITE_BATCH:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+    return stats, saved_by_user
+
+def _safe_compact(lead, summarize):
+    try:
+        row, spent = compact(lead, summarize)
+        return row, spent, False
+    except Exception as e:
+        print(f"⚠️ Lead {lead['id']}: {e}")
+        return None, (0, 0), True
+
+def report(stats, saved_by_user, dry_run):
+    saved = stats['bytes_saved']
+    before = stats['bytes_before']
+    lines = [
+        f"🔎 {stats['candidates']} lead(s) with notes >= {MIN_BYTES} bytes ({before / 1024:.1f} KB), "
+        f"{stats['deferred']} deferred by the per-user cap.",
+    ]
+    if not dry_run:
+        lines.append(f"✅ Compacted {stats['compacted']}, {stats['unchanged']} not worth it, "
+                     f"{stats['changed_meanwhile']} changed meanwhile, {stats['failed']} failed.")
+    verb = "Would save" if dry_run else "Saved"
+    lines.append(f"💾 {verb} {saved / 1024:.1f} KB of background text ({saved / before * 100 if before else 0:.0f}%), "
+                 f"~{saved // CHARS_PER_TOKEN} prompt tokens across {len(saved_by_user)} user(s).")
+    if saved_by_user:
+        top = max(saved_by_user.values())
+        lines.append(f"   Every voice command sends the whole Rolodex: ~{top // CHARS_PER_TOKEN} fewer prompt tokens per command "
+                     f"for the heaviest user, ~{saved // CHARS_PER_TOKEN // len(saved_by_user)} on average.")
+    if stats['model_prompt_tokens']:
+        lines.append(f"🤖 Summaries cost {stats['model_prompt_tokens']} prompt + {stats['model_output_tokens']} output tokens ({COMPACT_MODEL}).")
+    return "\n".join(lines)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Summarize oversized lead notes into bounded digests and archive the full text.")
+    parser.add_argument("--dry-run", action="store_true", help="Count candidates and projected savings, no model calls or writes")
+    parser.add_argument("--extractive", action="store_true", help="Keep the most recent notes instead of asking Gemini for a summary")
+    parser.add_argument("--per-user", type=int, default=200, help="At most this many leads per user per run")
+    parser.add_argument("--workers", type=int, default=4, help="Summaries in flight (the rate limit still applies)")
+    args = parser.parse_args()
+
+    supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+    summarize = None
+    if not (args.extractive or args.dry_run):
+        if not GOOGLE_API_KEY:
+            raise SystemExit("❌ GOOGLE_API_KEY is not set (use --extractive to compact without the model).")
+        summarize = gemini_summarizer(TokenBucket(GEMINI_RATE))
+
+    stats, saved_by_user = run(supabase, summarize, args.per_user, args.workers, args.dry_run)
+    print(report(stats, saved_by_user, args.dry_run))
@@ -0,0 +1,40 @@
+import re
+
+# ==========================================
+# CONTACT MATCH KEYS
+# ==========================================
+# contact_info is free text ("555.123.4567 / Jane@Mail.com"). On write we derive
+# two normalized keys, an E.164 phone number and a lower-cased email. They are
+# stored in leads.phone_e164 / leads.email_norm, which have unique-per-user
+# indexes, so "same person said twice" becomes an indexed lookup instead of
+# relying on the model to spot the duplicate in the Rolodex.
+
+DEFAULT_COUNTRY_CODE = "1"  # NANP; numbers without a country code are assumed US/CA
+
+EMAIL_RE = re.compile(r"[A-Za-z0-9._%+-]+@[A-Za-z0-9-]+(?:\.[A-Za-z0-9-]+)*\.[A-Za-z]{2,}")
+PHONE_RE = re.compile(r"\+?\d[\d\s().-]{5,}\d")
+
+def normalize_email(contact_info):
+    """First email address in the text, lower-cased, or None."""
+    if not contact_info: return None
+    match = EMAIL_RE.search(str(contact_info))
+    return match.group(0).lower() if match else None
+
+def normalize_phone(contact_info):
+    """First phone number in the text as E.164 ('+15551234567'), or None."""
+    if not contact_info: return None
+    text = EMAIL_RE.sub(" ", str(contact_info))  # digits inside emails are not phone numbers
+    for match in PHONE_RE.finditer(text):
+        raw = match.group(0)
+        digits = re.sub(r"\D", "", raw)
+        if raw.startswith("+"):
+            if 8 <= len(digits) <= 15: return f"+{digits}"
+        elif len(digits) == 10:
+            return f"+{DEFAULT_COUNTRY_CODE}{digits}"
+        elif len(digits) == 11 and digits.startswith(DEFAULT_COUNTRY_CODE):
+            return f"+{digits}"
+    return None
+
+def contact_keys(contact_info):
+    """Normalized key columns for a lead's contact_info."""
+    return {"phone_e164": normalize_phone(contact_info), "email_norm": normalize_email(contact_info)}
@@ -0,0 +1,138 @@
+import os
+import argparse
+from collections import defaultdict
+from supabase import create_client, Client
+from dotenv import load_dotenv
+from contact_keys import contact_keys
+
+# Load environment variables
+load_dotenv()
+
+# --- Configuration ---
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_KEY = os.getenv("SUPABASE_KEY")  # MUST be the SERVICE_ROLE key to bypass RLS
+
+PAGE_SIZE = 1000
+WRITE_BATCH = 500
+
+LEAD_COLUMNS = "id, user_id, created_at, name, contact_info, background, product_pitch, transactions, status, next_outreach, next_outreach_at, phone_e164, email_norm"
+
+# ==========================================
+# BULK DUPLICATE CLUSTERING
+# ==========================================
+# 1. Stream every lead (keyset pages) and derive its normalized phone/email keys.
+# 2. Cluster per user: leads sharing a phone OR an email end up in one cluster
+#    (union-find, so A~B by phone and B~C by email gives {A, B, C}).
+# 3. Each cluster is folded into its oldest lead; the rest are deleted. Keys are
+#    written on every survivor. Writes go through apply_lead_merges() in batches.
+# Usage: python dedupe_leads.py [--dry-run]
+
+def iter_leads(supabase):
+    last_id = 0
+    while True:
+        page = supabase.table('leads').select(LEAD_COLUMNS)\
+            .gt('id', last_id).order('id').limit(PAGE_SIZE).execute().data
+        yield from page
+        if len(page) < PAGE_SIZE:
+            return
+        last_id = page[-1]['id']
+
+def cluster_leads(leads):
+    """Returns a list of clusters (lists of leads, oldest first) keyed on shared phone/email per user."""
+    parent = {}
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    owner_of_key = {}
+    for lead in leads:
+        parent[lead['id']] = lead['id']
+        for col, val in lead['_keys'].items():
+            if not val: continue
+            key = (lead['user_id'], col, val)
+            if key in owner_of_key:
+                parent[find(lead['id'])] = find(owner_of_key[key])
+            else:
+                owner_of_key[key] = lead['id']
+
+    clusters = defaultdict(list)
+    for lead in leads:
+        clusters[find(lead['id'])].append(lead)
+    return [sorted(c, key=lambda l: (l.get('created_at') or '', l['id'])) for c in clusters.values()]
+
+def _join_unique(values, sep):
+    seen = []
+    for v in values:
+        v = (v or "").strip()
+        if v and v not in seen: seen.append(v)
+    return sep.join(seen) or None
+
+def merge_cluster(cluster):
+    """Folds a cluster into its oldest lead. Returns (merge row, key row)."""
+    keep = cluster[0]
+    phones = [l['_keys']['phone_e164'] for l in cluster if l['_keys']['phone_e164']]
+    emails = [l['_keys']['email_norm'] for l in cluster if l['_keys']['email_norm']]
+    upcoming = [l for l in cluster if l.get('next_outreach_at')]
+    outreach_src = max(upcoming, key=lambda l: l['next_outreach_at']) if upcoming else keep
+
+    merge = {
+        'keep': keep['id'],
+        'drop': [l['id'] for l in cluster[1:]],
+        'name': keep.get('name') or _join_unique((l.get('name') for l in cluster), " / "),
+        'contact_info': _join_unique((l.get('contact_info') for l in cluster), " / "),
+        'background': _join_unique((l.get('background') for l in cluster), "\n\n"),
+        'product_pitch': keep.get('product_pitch') or _join_unique((l.get('product_pitch') for l in cluster), "; "),
+        'transactions': _join_unique((l.get('transactions') for l in cluster), "\n"),
+        'status': "Client" if any(str(l.get('status')).lower() == "client" for l in cluster) else (keep.get('status') or "Lead"),
+        'next_outreach': outreach_src.get('next_outreach'),
+        'next_outreach_at': outreach_src.get('next_outreach_at'),
+    }
+    key_row = {'id': keep['id'], 'phone_e164': phones[0] if phones else None, 'email_norm': emails[0] if emails else None}
+    return merge, key_row
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Key existing leads by phone/email and merge duplicates.")
+    parser.add_argument("--dry-run", action="store_true", help="Report clusters without writing")
+    args = parser.parse_args()
+
+    supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+
+    leads = []
+    for lead in iter_leads(supabase):
+        lead['_keys'] = contact_keys(lead.get('contact_info'))
+        leads.append(lead)
+    clusters = cluster_leads(leads)
+
+    merges, keys = [], []
+    for cluster in clusters:
+        if len(cluster) > 1:
+            merge, key_row = merge_cluster(cluster)
+            merges.append(merge)
+            keys.append(key_row)
+        else:
+            lead = cluster[0]
+            wanted = lead['_keys']
+            if wanted['phone_e164'] != lead.get('phone_e164') or wanted['email_norm'] != lead.get('email_norm'):
+                keys.append({'id': lead['id'], **wanted})
+
+    dropped = sum(len(m['drop']) for m in merges)
+    print(f"🔎 {len(leads)} leads scanned: {len(merges)} duplicate cluster(s), {dropped} lead(s) to merge, {len(keys)} key update(s).")
+    if args.dry_run:
+        for m in merges[:20]:
+            print(f"   keep {m['keep']} <- {m['drop']} ({m['name']})")
+    else:
+        # A cluster's merge and its key row always land in the same batch
+        merge_ids = {m['keep'] for m in merges}
+        plain_keys = [k for k in keys if k['id'] not in merge_ids]
+        merge_keys = {k['id']: k for k in keys if k['id'] in merge_ids}
+        for i in range(0, len(merges), WRITE_BATCH):
+            batch = merges[i:i + WRITE_BATCH]
+            supabase.rpc('apply_lead_merges', {
+                'p_merges': batch, 'p_keys': [merge_keys[m['keep']] for m in batch]
+            }).execute()
+        for i in range(0, len(plain_keys), WRITE_BATCH):
+            supabase.rpc('apply_lead_merges', {'p_merges': [], 'p_keys': plain_keys[i:i + WRITE_BATCH]}).execute()
+        print(f"✅ Merged {dropped} duplicate lead(s) and keyed {len(keys)} lead(s).")
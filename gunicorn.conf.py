@@ -0,0 +1,27 @@
+import os
+
+# ==========================================
+# GUNICORN (WEBHOOK SERVER)
+# ==========================================
+# gunicorn -c gunicorn.conf.py webhook_server:app
+# The webhook is I/O bound (Stripe signature check, then 1-3 Supabase calls), so
+# it scales with threads. Keep one worker unless you need more CPU: /metrics is
+# per worker, and with several workers each scrape only sees one of them.
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv("WEBHOOK_WORKERS", "1"))
+worker_class = "gthread"
+threads = int(os.getenv("WEBHOOK_THREADS", "8"))
+
+# Stripe gives up after ~10s (and retries later), so a request older than this is wasted work
+timeout = int(os.getenv("WEBHOOK_TIMEOUT", "10"))
+graceful_timeout = 20
+keepalive = 5
+
+# Recycle workers now and then to cap slow leaks
+max_requests = 10000
+max_requests_jitter = 1000
+
+accesslog = "-"
+errorlog = "-"
+loglevel = os.getenv("WEBHOOK_LOG_LEVEL", "info")
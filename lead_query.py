@@ -0,0 +1,207 @@
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from outreach_time import USER_TZ, user_now
+
+# ==========================================
+# LOCAL LEAD QUERIES
+# ==========================================
+# For questions about many leads ("how many clients did I close this month",
+# "who is overdue") the model returns a small structured query instead of an
+# answer; execute() runs it over the Rolodex rows the voice pipeline already
+# loaded, with vectorized pandas masks. Counts and lists are therefore exact,
+# whatever the Rolodex size. QUERY_SCHEMA is embedded in
+# omni_schema.RESPONSE_SCHEMA; pandas is imported on first execute() only.
+
+TEXT_FIELDS = ("name", "status", "product_pitch", "background", "transactions", "contact_info")
+# last_sale_at is derived: the latest YYYY-MM-DD date written into transactions
+DATE_FIELDS = ("created_at", "next_outreach_at", "last_sale_at")
+FIELDS = TEXT_FIELDS + DATE_FIELDS
+OPS = ("eq", "neq", "contains", "gt", "gte", "lt", "lte", "is_null", "not_null")
+AGGREGATES = ("count", "list")
+GROUP_FIELDS = ("status", "product_pitch")
+
+DEFAULT_LIMIT = 25
+MAX_LIMIT = 100
+ROW_FIELDS = ("id", "name", "status", "product_pitch", "background", "contact_info",
+              "next_outreach", "transactions", "created_at", "next_outreach_at")
+
+QUERY_SCHEMA = {
+    "type": "OBJECT",
+    "nullable": True,
+    "description": "Only for questions about many leads (counts, lists, overdue, by status).",
+    "properties": {
+        "title": {"type": "STRING", "description": "Short heading for the answer, e.g. 'Clients closed this month'."},
+        "aggregate": {"type": "STRING", "enum": list(AGGREGATES)},
+        "filters": {
+            "type": "ARRAY",
+            "items": {
+                "type": "OBJECT",
+                "properties": {
+                    "field": {"type": "STRING", "enum": list(FIELDS)},
+                    "op": {"type": "STRING", "enum": list(OPS)},
+                    "value": {"type": "STRING", "nullable": True,
+                              "description": "Text, an ISO date (YYYY-MM-DD) or 'now'; null for is_null/not_null."},
+                },
+                "required": ["field", "op"],
+            },
+        },
+        "group_by": {"type": "STRING", "enum": list(GROUP_FIELDS), "nullable": True},
+        "sort_by": {"type": "STRING", "enum": list(FIELDS), "nullable": True},
+        "descending": {"type": "BOOLEAN", "nullable": True},
+        "limit": {"type": "INTEGER", "nullable": True},
+    },
+    "required": ["title", "aggregate"],
+    "propertyOrdering": ["title", "aggregate", "filters", "group_by", "sort_by", "descending", "limit"],
+}
+
+
+class LeadQueryError(ValueError):
+    """A query outside QUERY_SCHEMA (unknown field, op or value)."""
+
+
+@dataclass
+class Filter:
+    field: str
+    op: str
+    value: str = None
+
+
+@dataclass
+class LeadQuery:
+    title: str
+    aggregate: str = "list"
+    filters: list = field(default_factory=list)
+    group_by: str = None
+    sort_by: str = None
+    descending: bool = False
+    limit: int = DEFAULT_LIMIT
+
+
+def _pick(data, key, allowed):
+    value = data.get(key)
+    if value is not None and value not in allowed:
+        raise LeadQueryError(f"{key}: {value!r} not in {allowed}")
+    return value
+
+
+def validate(data):
+    """dict (as decoded from the model) -> LeadQuery, raising LeadQueryError."""
+    if not isinstance(data, dict):
+        raise LeadQueryError("query: expected an object")
+    filters = []
+    for raw in data.get("filters") or []:
+        if not isinstance(raw, dict):
+            raise LeadQueryError("filters: expected objects")
+        f = Filter(_pick(raw, "field", FIELDS), _pick(raw, "op", OPS), raw.get("value"))
+        if f.field is None or f.op is None:
+            raise LeadQueryError("filters: field and op are required")
+        if f.op not in ("is_null", "not_null"):
+            if f.value is None or str(f.value).strip() == "":
+                raise LeadQueryError(f"filters: {f.field} {f.op} needs a value")
+            if f.field in DATE_FIELDS:
+                _parse_date(f.value)
+            elif f.op in ("gt", "gte", "lt", "lte"):
+                raise LeadQueryError(f"filters: {f.op} only applies to {DATE_FIELDS}")
+        filters.append(f)
+    try:
+        limit = int(data.get("limit") or DEFAULT_LIMIT)
+    except (TypeError, ValueError):
+        raise LeadQueryError("limit: expected an integer") from None
+    return LeadQuery(
+        title=str(data.get("title") or "Your leads").strip(),
+        aggregate=_pick(data, "aggregate", AGGREGATES) or "list",
+        filters=filters,
+        group_by=_pick(data, "group_by", GROUP_FIELDS),
+        sort_by=_pick(data, "sort_by", FIELDS),
+        descending=bool(data.get("descending")),
+        limit=max(1, min(limit, MAX_LIMIT)),
+    )
+
+
+def _parse_date(value):
+    """'now' or an ISO date/timestamp -> aware datetime (date only: midnight in the user's timezone)."""
+    text = str(value).strip()
+    if text.lower() in ("now", "today"):
+        now = user_now()
+        return now if text.lower() == "now" else now.replace(hour=0, minute=0, second=0, microsecond=0)
+    try:
+        dt = datetime.fromisoformat(text.replace("Z", "+00:00"))
+    except ValueError:
+        raise LeadQueryError(f"not a date: {value!r}") from None
+    return dt if dt.tzinfo else dt.replace(tzinfo=USER_TZ)
+
+
+def _frame(leads):
+    import pandas as pd
+    df = pd.DataFrame(leads)
+    for col in TEXT_FIELDS + ("id", "next_outreach"):
+        if col not in df.columns: df[col] = None
+    df["status"] = df["status"].fillna("Lead").astype(str).str.strip().str.title()
+    # Explicit formats: pandas >= 2 otherwise infers one from the first row, and PostgREST drops
+    # zero fractions ("...T10:00:00+00:00" next to "...T10:00:00.123456+00:00"), so rows would become NaT
+    for col in ("created_at", "next_outreach_at"):
+        df[col] = pd.to_datetime(df[col] if col in df.columns else None, utc=True, errors="coerce", format="ISO8601")
+    # Latest sale date written by the voice pipeline ("• 2026-10-19: Refill pack")
+    sale_dates = df["transactions"].fillna("").astype(str).str.extractall(r"(\d{4}-\d{2}-\d{2})")[0]
+    latest = pd.to_datetime(sale_dates, errors="coerce", format="%Y-%m-%d").groupby(level=0).max()
+    df["last_sale_at"] = latest.reindex(df.index).dt.tz_localize(USER_TZ).dt.tz_convert("UTC")
+    return df
+
+
+def _mask(df, f):
+    import pandas as pd
+    col = df[f.field]
+    if f.op == "is_null":
+        return col.isna() | (col.astype(str).str.strip() == "") if f.field in TEXT_FIELDS else col.isna()
+    if f.op == "not_null":
+        return ~_mask(df, Filter(f.field, "is_null"))
+    if f.field in DATE_FIELDS:
+        value = pd.Timestamp(_parse_date(f.value)).tz_convert("UTC")
+        if f.op == "eq":  # same calendar day for the user
+            return col.dt.tz_convert(USER_TZ).dt.date == value.tz_convert(USER_TZ).date()
+        if f.op == "neq":
+            return ~_mask(df, Filter(f.field, "eq", f.value)) & col.notna()
+        if f.op == "contains":
+            raise LeadQueryError("contains does not apply to dates")
+        return {"gt": col > value, "gte": col >= value, "lt": col < value, "lte": col <= value}[f.op]
+    text = col.fillna("").astype(str).str.strip().str.lower()
+    value = str(f.value).strip().lower()
+    if f.op == "contains":
+        return text.str.contains(value, regex=False)
+    return text == value if f.op == "eq" else text != value
+
+
+def _jsonable(value):
+    if value is None: return None
+    if hasattr(value, "isoformat"):
+        return None if str(value) == "NaT" else value.isoformat()
+    if isinstance(value, float) and value != value:  # NaN
+        return None
+    return value.item() if hasattr(value, "item") else value
+
+
+def execute(query, leads):
+    """
+    Runs a LeadQuery over lead dicts. Returns plain JSON-able data for the result card:
+    {title, aggregate, count, groups: [{key, count}], rows: [lead dicts], truncated}.
+    """
+    result = {"title": query.title, "aggregate": query.aggregate, "count": 0, "groups": [], "rows": [], "truncated": False}
+    if not leads: return result
+    df = _frame(leads)
+    for f in query.filters:
+        df = df[_mask(df, f)]
+    result["count"] = int(len(df))
+
+    if query.group_by:
+        counts = df[query.group_by].fillna("(none)").astype(str).value_counts()
+        result["groups"] = [{"key": key, "count": int(n)} for key, n in counts.items()]
+    if query.aggregate == "list" or (query.aggregate == "count" and not query.group_by and len(df) <= query.limit):
+        if query.sort_by:
+            sort_key = df[query.sort_by]
+            if query.sort_by in TEXT_FIELDS: sort_key = sort_key.fillna("").astype(str).str.lower()
+            df = df.loc[sort_key.sort_values(ascending=not query.descending, na_position="last").index]
+        shown = df.head(query.limit)
+        result["truncated"] = len(df) > len(shown)
+        result["rows"] = [{col: _jsonable(row.get(col)) for col in ROW_FIELDS} for row in shown.to_dict("records")]
+    return result
@@ -0,0 +1,114 @@
+import io
+import os
+import threading
+import time
+import wave
+from collections import defaultdict, deque
+
+import tracing
+
+# ==========================================
+# GEMINI MODEL TIERING
+# ==========================================
+# Picks the model for one voice command from what makes it expensive:
+#   lite      short clip, small Rolodex      ("pull up John")
+#   standard  everything in between          (the old fixed gemini-2.0-flash)
+#   pro       long clip or very large Rolodex (a two-minute meeting debrief)
+# A tier whose recent calls mostly fail or run over its latency budget is
+# skipped for the next one up; its bad calls age out of the health window after
+# HEALTH_SECONDS, so it gets traffic again. Every call is counted per
+# tier (requests by outcome, latency histogram, tokens, estimated USD) so the
+# thresholds below can be tuned from /metrics.
+
+
+class Tier:
+    def __init__(self, name, model, usd_per_m_input, usd_per_m_output, latency_budget_s):
+        self.name = name
+        self.model = model
+        self.usd_per_m_input = usd_per_m_input    # audio input price, USD per 1M tokens
+        self.usd_per_m_output = usd_per_m_output
+        self.latency_budget_s = latency_budget_s  # p95 above this counts as unhealthy
+
+    def cost(self, prompt_tokens, output_tokens):
+        return ((prompt_tokens or 0) * self.usd_per_m_input + (output_tokens or 0) * self.usd_per_m_output) / 1e6
+
+
+STANDARD_MODEL_ID = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
+
+# Cheapest first; models overridable per deployment
+TIERS = [
+    Tier("lite", os.getenv("GEMINI_MODEL_LITE", "gemini-2.0-flash-lite"), 0.075, 0.30, 6.0),
+    Tier("standard", STANDARD_MODEL_ID, 0.70, 0.40, 12.0),
+    Tier("pro", os.getenv("GEMINI_MODEL_PRO", "gemini-2.5-flash"), 1.00, 2.50, 30.0),
+]
+
+LITE_MAX_SECONDS = float(os.getenv("ROUTER_LITE_MAX_SECONDS", "10"))
+LITE_MAX_LEADS = int(os.getenv("ROUTER_LITE_MAX_LEADS", "100"))
+PRO_MIN_SECONDS = float(os.getenv("ROUTER_PRO_MIN_SECONDS", "60"))
+PRO_MIN_LEADS = int(os.getenv("ROUTER_PRO_MIN_LEADS", "500"))
+
+HEALTH_WINDOW = 50          # recent calls kept per tier
+HEALTH_SECONDS = 300        # ... and only those newer than this count
+HEALTH_MIN_CALLS = 10       # fewer than this: always healthy
+HEALTH_MAX_ERROR_RATE = 0.25
+
+
+def audio_seconds(audio_bytes):
+    """Duration of a WAV clip (what st.audio_input records); 16 kHz mono 16-bit estimate otherwise."""
+    try:
+        with wave.open(io.BytesIO(audio_bytes), "rb") as w:
+            return w.getnframes() / float(w.getframerate())
+    except (wave.Error, EOFError):
+        return len(audio_bytes or b"") / 32000.0
+
+
+class ModelRouter:
+    def __init__(self, tiers=TIERS):
+        self.tiers = list(tiers)
+        self._recent = defaultdict(lambda: deque(maxlen=HEALTH_WINDOW))  # tier name -> (at, ok, seconds)
+        self._lock = threading.Lock()
+
+    def base_tier(self, seconds, lead_count):
+        """Tier by workload alone."""
+        if seconds >= PRO_MIN_SECONDS or lead_count >= PRO_MIN_LEADS:
+            return self.tiers[-1]
+        if seconds <= LITE_MAX_SECONDS and lead_count <= LITE_MAX_LEADS:
+            return self.tiers[0]
+        return self.standard
+
+    @property
+    def standard(self):
+        """The middle tier (the model every command used before routing)."""
+        return self.tiers[len(self.tiers) // 2]
+
+    def healthy(self, tier):
+        cutoff = time.monotonic() - HEALTH_SECONDS
+        with self._lock:
+            recent = [(ok, s) for at, ok, s in self._recent[tier.name] if at >= cutoff]
+        if len(recent) < HEALTH_MIN_CALLS:
+            return True
+        errors = sum(1 for ok, _ in recent if not ok)
+        if errors / len(recent) > HEALTH_MAX_ERROR_RATE:
+            return False
+        latencies = sorted(s for _, s in recent)
+        return latencies[int(0.95 * (len(latencies) - 1))] <= tier.latency_budget_s
+
+    def choose(self, seconds, lead_count):
+        """The workload's tier, or the next healthy one above it (the workload's tier if none is)."""
+        base = self.base_tier(seconds, lead_count)
+        start = self.tiers.index(base)
+        tier = next((t for t in self.tiers[start:] if self.healthy(t)), base)
+        tracing.incr("model_tier_routed_total", tier=tier.name, escalated=str(tier is not base).lower())
+        return tier
+
+    def record(self, tier, seconds, outcome, prompt_tokens=None, output_tokens=None):
+        """One finished command on `tier`; outcome is 'ok' or a failure label ('invalid', 'api_error', ...)."""
+        ok = outcome in ("ok", "no_speech")
+        with self._lock:
+            self._recent[tier.name].append((time.monotonic(), ok, seconds))
+        tracing.incr("model_tier_requests_total", tier=tier.name, outcome=outcome)
+        tracing.observe("model_tier_seconds", seconds, tier=tier.name)
+        if prompt_tokens or output_tokens:
+            tracing.incr("model_tier_tokens_total", prompt_tokens or 0, tier=tier.name, kind="prompt")
+            tracing.incr("model_tier_tokens_total", output_tokens or 0, tier=tier.name, kind="output")
+            tracing.incr("model_tier_cost_usd_total", tier.cost(prompt_tokens, output_tokens), tier=tier.name)
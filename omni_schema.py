@@ -0,0 +1,148 @@
+import json
+from dataclasses import dataclass, field, asdict
+
+import lead_query
+
+# ==========================================
+# OMNI-TOOL RESPONSE SCHEMA
+# ==========================================
+# The voice prompt used to describe its JSON in prose; the reply was then
+# fence-stripped by hand and every caller special-cased lists and missing keys.
+# RESPONSE_SCHEMA goes to Gemini as GenerateContentConfig.response_schema, so
+# decoding is constrained to this shape, and parse() turns the reply into an
+# OmniResult or raises OmniSchemaError. The schema is a plain dict (Gemini's
+# OpenAPI subset) so importing this module does not pull in google.genai.
+
+ACTIONS = ("CREATE", "UPDATE", "QUERY")
+STATUSES = ("Lead", "Client")
+CONFIDENCES = ("High", "Low")
+LEAD_FIELDS = ("name", "contact_info", "background", "product_pitch", "status", "next_outreach", "transaction_item")
+
+_NULLABLE_STRING = {"type": "STRING", "nullable": True}
+
+RESPONSE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "error": {**_NULLABLE_STRING, "description": "Set only when the audio has no clear speech, name or intent."},
+        "action": {"type": "STRING", "enum": list(ACTIONS), "nullable": True},
+        "match_id": {**_NULLABLE_STRING, "description": "Rolodex id of the matched lead (UPDATE/QUERY)."},
+        "confidence": {"type": "STRING", "enum": list(CONFIDENCES)},
+        "lead_data": {
+            "type": "OBJECT",
+            "nullable": True,
+            "properties": {
+                "name": _NULLABLE_STRING,
+                "contact_info": _NULLABLE_STRING,
+                "background": {**_NULLABLE_STRING, "description": "Updated summary, or null if unchanged."},
+                "product_pitch": {**_NULLABLE_STRING, "description": "Null unless the user changed the product fit."},
+                "status": {"type": "STRING", "enum": list(STATUSES), "nullable": True},
+                "next_outreach": {**_NULLABLE_STRING, "description": "ISO 8601 (YYYY-MM-DDTHH:MM:SS) or free text."},
+                "transaction_item": {**_NULLABLE_STRING, "description": "Item sold in this note, or null."},
+            },
+            "propertyOrdering": list(LEAD_FIELDS),
+        },
+        "query": lead_query.QUERY_SCHEMA,
+    },
+    "required": ["confidence"],
+    # error first: on silence the model can stop right after it
+    "propertyOrdering": ["error", "action", "match_id", "confidence", "lead_data", "query"],
+}
+
+
+class OmniSchemaError(ValueError):
+    """The model reply is not valid JSON or does not match RESPONSE_SCHEMA."""
+
+
+@dataclass
+class LeadData:
+    name: str = None
+    contact_info: str = None
+    background: str = None
+    product_pitch: str = None
+    status: str = None
+    next_outreach: str = None
+    transaction_item: str = None
+
+
+@dataclass
+class OmniResult:
+    action: str = None
+    match_id: str = None
+    lead_data: LeadData = field(default_factory=LeadData)
+    confidence: str = None
+    error: str = None
+    query: lead_query.LeadQuery = None  # QUERY about many leads, run locally by lead_query.execute()
+
+    def to_dict(self):
+        """
+        The dict shape run_voice_command() and the result card work with: 'error' only when set,
+        lead_data without its null fields (the card falls back to its defaults for those).
+        """
+        if self.error:
+            return {"error": self.error}
+        out = asdict(self)
+        out.pop("error")
+        out["lead_data"] = {key: value for key, value in out["lead_data"].items() if value is not None}
+        if out["query"] is None: out.pop("query")
+        return out
+
+
+def _optional_str(data, key, allowed=None):
+    value = data.get(key)
+    if value is None:
+        return None
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        value = str(value)
+    if not isinstance(value, str):
+        raise OmniSchemaError(f"{key}: expected a string, got {type(value).__name__}")
+    value = value.strip()
+    if not value:
+        return None
+    if allowed and value not in allowed:
+        raise OmniSchemaError(f"{key}: {value!r} not in {allowed}")
+    return value
+
+
+def validate(data):
+    """dict -> OmniResult, raising OmniSchemaError on anything outside RESPONSE_SCHEMA."""
+    if not isinstance(data, dict):
+        raise OmniSchemaError(f"expected an object, got {type(data).__name__}")
+    error = _optional_str(data, "error")
+    if error:
+        return OmniResult(error=error)
+
+    raw_lead = data.get("lead_data") or {}
+    if not isinstance(raw_lead, dict):
+        raise OmniSchemaError("lead_data: expected an object")
+    lead = LeadData(**{key: _optional_str(raw_lead, key, STATUSES if key == "status" else None) for key in LEAD_FIELDS})
+
+    action = _optional_str(data, "action", ACTIONS)
+    if action is None:
+        raise OmniSchemaError("action is required unless error is set")
+    match_id = _optional_str(data, "match_id")
+    if action == "UPDATE" and match_id is None:
+        raise OmniSchemaError("UPDATE without match_id")
+    if action == "CREATE" and not lead.name:
+        raise OmniSchemaError("CREATE without lead_data.name")
+    query = None
+    if action == "QUERY" and data.get("query"):
+        try:
+            query = lead_query.validate(data["query"])
+        except lead_query.LeadQueryError as e:
+            raise OmniSchemaError(f"query: {e}") from None
+    return OmniResult(action=action, match_id=match_id, lead_data=lead,
+                      confidence=_optional_str(data, "confidence", CONFIDENCES), query=query)
+
+
+def parse(response):
+    """
+    OmniResult from a generate_content() response made with RESPONSE_SCHEMA.
+    Uses the SDK's already-decoded response.parsed when present, else strict json.loads(response.text).
+    """
+    data = getattr(response, "parsed", None)
+    if data is None:
+        try:
+            data = json.loads(response.text or "")
+        except ValueError as e:
+            raise OmniSchemaError(f"invalid JSON: {e}") from None
+    return validate(data)
@@ -0,0 +1,156 @@
+import re
+from datetime import datetime, timedelta, timezone
+
+# ==========================================
+# NEXT-OUTREACH PARSING
+# ==========================================
+# next_outreach arrives as free text: strict ISO from the model most of the
+# time, but also "tomorrow at 3pm" or "next Tuesday" from the model or from
+# the edit form. parse_outreach() turns it into an aware timestamp on write, and
+# the result is stored in leads.next_outreach_at (timestamptz, indexed).
+# The raw text is kept in next_outreach for display. Values read back from
+# timestamptz columns go through parse_timestamp(), which is ISO only.
+
+# The app treats every user as US Eastern (fixed UTC-5), same as the prompt
+USER_TZ = timezone(timedelta(hours=-5))
+DEFAULT_HOUR = 9  # date-only phrases ("tomorrow") mean 9:00 AM
+
+# Full names plus the usual abbreviations ("tue", "tues", "thu", "thurs", "weds", ...)
+WEEKDAY_RES = [re.compile(rf"\b{pattern}\b") for pattern in (
+    r"mon(?:day)?", r"tue(?:s|sday)?", r"wed(?:s|nesday)?", r"thu(?:r|rs|rsday)?",
+    r"fri(?:day)?", r"sat(?:urday)?", r"sun(?:day)?",
+)]
+NUMBER_WORDS = {
+    "a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
+    "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10, "couple": 2, "few": 3,
+}
+DAYPARTS = {"morning": 9, "noon": 12, "lunch": 12, "afternoon": 14, "evening": 18, "tonight": 20}
+
+TIME_RE = re.compile(r"\b(at\s+)?(\d{1,2})(?::(\d{2}))?\s*(am|pm|a\.m\.|p\.m\.)?(?=\s|$|[,.])")
+# Python 3.10's fromisoformat only takes 3 or 6 fractional digits, and PostgREST
+# drops trailing zeros ("08.12345+00:00"), so the fraction is normalized first
+ISO_RE = re.compile(r"(\d{4}-\d{2}-\d{2}(?:[T ]\d{2}:\d{2}(?::\d{2})?)?)(?:\.(\d+))?(Z|[+-]\d{2}(?::?\d{2})?)?", re.IGNORECASE)
+IN_RE = re.compile(r"\bin\s+(\d+|" + "|".join(NUMBER_WORDS) + r")\s+(minute|hour|day|week|month)s?\b")
+
+def user_now():
+    return datetime.now(USER_TZ)
+
+def parse_timestamp(value):
+    """
+    Strict ISO-8601 (what the timestamptz columns hold) -> aware datetime, or None.
+    Never falls back to phrase parsing. Naive values are taken as USER_TZ.
+    """
+    if value is None: return None
+    if isinstance(value, datetime):
+        return value if value.tzinfo else value.replace(tzinfo=USER_TZ)
+    match = ISO_RE.fullmatch(str(value).strip())
+    if not match: return None
+    base, fraction, offset = match.groups()
+    text = base.replace(" ", "T")
+    if fraction: text += "." + fraction[:6].ljust(6, "0")
+    if offset:
+        offset = "+00:00" if offset.upper() == "Z" else offset
+        if ":" not in offset: offset = offset[:3] + ":" + (offset[3:] or "00")
+        text += offset
+    try:
+        dt = datetime.fromisoformat(text)
+    except ValueError:
+        return None
+    if len(base) == 10:  # date only
+        dt = dt.replace(hour=DEFAULT_HOUR)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=USER_TZ)
+    return dt
+
+def _time_of_day(text):
+    """Returns (hour, minute) mentioned in the phrase, or None."""
+    for part, hour in DAYPARTS.items():
+        if re.search(rf"\b{part}\b", text):
+            return hour, 0
+    for match in TIME_RE.finditer(text):
+        said_at, hour, minute, meridiem = match.group(1), int(match.group(2)), int(match.group(3) or 0), match.group(4)
+        # A bare number is only a time with "at", minutes or am/pm ("in 3 days" is not 3 o'clock)
+        if not meridiem and match.group(3) is None:
+            if not said_at: continue
+            if 1 <= hour <= 7: hour += 12  # "at 3" during business hours means 3 PM
+        if meridiem and meridiem.startswith("p") and hour < 12: hour += 12
+        if meridiem and meridiem.startswith("a") and hour == 12: hour = 0
+        if hour < 24 and minute < 60:
+            return hour, minute
+    return None
+
+def parse_outreach(value, now=None):
+    """
+    Parses an ISO timestamp or a relative phrase ("tomorrow 3pm", "in 5 days",
+    "next friday", "tonight") into an aware datetime. Returns None if the text
+    does not name a point in time.
+    """
+    if value is None: return None
+    if isinstance(value, datetime):
+        return value if value.tzinfo else value.replace(tzinfo=USER_TZ)
+    text = str(value).strip()
+    if not text: return None
+
+    iso = parse_timestamp(text)
+    if iso: return iso
+
+    now = (now or user_now()).astimezone(USER_TZ)
+    text = text.lower()
+    day = None
+
+    match = IN_RE.search(text)
+    if match:
+        qty = match.group(1)
+        qty = int(qty) if qty.isdigit() else NUMBER_WORDS[qty]
+        unit = match.group(2)
+        if unit in ("minute", "hour"):
+            return (now + timedelta(**{f"{unit}s": qty})).replace(second=0, microsecond=0)
+        days = qty * {"day": 1, "week": 7, "month": 30}[unit]
+        day = now + timedelta(days=days)
+    elif "day after tomorrow" in text:
+        day = now + timedelta(days=2)
+    elif "tomorrow" in text:
+        day = now + timedelta(days=1)
+    elif "today" in text or "tonight" in text:
+        day = now
+    elif "next week" in text:
+        day = now + timedelta(days=7 - now.weekday())  # following Monday
+    elif "next month" in text:
+        day = (now.replace(day=1) + timedelta(days=32)).replace(day=1)
+    else:
+        for i, weekday_re in enumerate(WEEKDAY_RES):
+            match = weekday_re.search(text)
+            if match:
+                ahead = (i - now.weekday()) % 7
+                if ahead == 0 or text[:match.start()].rstrip().endswith("next"):
+                    ahead = ahead or 7
+                day = now + timedelta(days=ahead)
+                break
+
+    clock = _time_of_day(text)
+    if day is None:
+        # Only a time of day: the next occurrence of it
+        if not clock: return None
+        candidate = now.replace(hour=clock[0], minute=clock[1], second=0, microsecond=0)
+        return candidate if candidate > now else candidate + timedelta(days=1)
+
+    hour, minute = clock if clock else (DEFAULT_HOUR, 0)
+    return day.replace(hour=hour, minute=minute, second=0, microsecond=0)
+
+def outreach_fields(value, now=None):
+    """Columns to write for a next_outreach value: the raw text plus the parsed UTC timestamp."""
+    parsed = parse_outreach(value, now)
+    return {
+        "next_outreach": value or None,
+        "next_outreach_at": parsed.astimezone(timezone.utc).isoformat() if parsed else None,
+    }
+
+def describe_outreach(outreach_dt, now=None):
+    """Short label for a card: 'Overdue (3d)', 'Today 03:00 PM', 'Tomorrow 09:00 AM' or 'Mar 04 09:00 AM'."""
+    local = outreach_dt.astimezone(USER_TZ) if outreach_dt.tzinfo else outreach_dt.replace(tzinfo=USER_TZ)
+    today = (now or user_now()).astimezone(USER_TZ).date()
+    delta_days = (local.date() - today).days
+    if delta_days < 0: return f"Overdue ({abs(delta_days)}d)"
+    if delta_days == 0: return f"Today {local.strftime('%I:%M %p')}"
+    if delta_days == 1: return f"Tomorrow {local.strftime('%I:%M %p')}"
+    return local.strftime("%b %d %I:%M %p")
@@ -0,0 +1,92 @@
+import os
+import csv
+import argparse
+from datetime import datetime, timezone
+from supabase import create_client, Client
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# --- Configuration ---
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_KEY = os.getenv("SUPABASE_KEY")  # MUST be the SERVICE_ROLE key to bypass RLS
+
+PAYOUT_METHODS = ["Venmo", "CashApp", "PayPal", "Zelle"]
+PAGE_SIZE = 1000  # PostgREST max rows per response on Supabase
+
+# ==========================================
+# MONTHLY PAYOUT RUN
+# ==========================================
+# 1. run_payout() (supabase/migrations) settles the period in ONE transaction:
+#    it claims every unpaid commission credit before the end of the month,
+#    aggregates them per referrer into payout_lines and debits the wallets.
+#    Re-running a period returns the same batch and changes nothing.
+# 2. The batch's lines are streamed back in pages and written to one CSV per
+#    payout method. Lines without a usable method/handle go to needs_review.csv.
+#
+# Usage: python payout_run.py --period 2026-09 [--out payouts]
+
+def previous_month():
+    now = datetime.now(timezone.utc)
+    year, month = (now.year, now.month - 1) if now.month > 1 else (now.year - 1, 12)
+    return f"{year:04d}-{month:02d}"
+
+def iter_payout_lines(supabase, batch_id):
+    """Streams every line of a batch, PAGE_SIZE rows per request."""
+    start = 0
+    while True:
+        page = supabase.table('payout_lines')\
+            .select('referrer_id, payout_method, payout_handle, amount_cents, credit_count')\
+            .eq('batch_id', batch_id)\
+            .order('referrer_id')\
+            .range(start, start + PAGE_SIZE - 1)\
+            .execute().data
+        yield from page
+        if len(page) < PAGE_SIZE:
+            return
+        start += PAGE_SIZE
+
+def export_batch(supabase, batch, out_dir):
+    """Writes <out_dir>/<period>/<method>.csv files. Returns {file_name: (rows, cents)}."""
+    period_dir = os.path.join(out_dir, batch['period'])
+    os.makedirs(period_dir, exist_ok=True)
+
+    files, writers, totals = {}, {}, {}
+    try:
+        for line in iter_payout_lines(supabase, batch['id']):
+            method = line.get('payout_method')
+            name = method.lower() if method in PAYOUT_METHODS and line.get('payout_handle') else "needs_review"
+            if name not in writers:
+                files[name] = open(os.path.join(period_dir, f"{name}.csv"), "w", newline="")
+                writers[name] = csv.writer(files[name])
+                writers[name].writerow(["referrer_id", "method", "handle", "amount_usd", "credits"])
+                totals[name] = (0, 0)
+            writers[name].writerow([
+                line['referrer_id'], method or "", line.get('payout_handle') or "",
+                f"{line['amount_cents'] / 100:.2f}", line['credit_count']
+            ])
+            rows, cents = totals[name]
+            totals[name] = (rows + 1, cents + line['amount_cents'])
+    finally:
+        for f in files.values():
+            f.close()
+    return totals
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Settle referral commissions for a month and export payout files.")
+    parser.add_argument("--period", default=previous_month(), help="Month to settle, YYYY-MM (default: last month)")
+    parser.add_argument("--out", default="payouts", help="Output directory")
+    args = parser.parse_args()
+
+    supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+
+    batch = supabase.rpc('run_payout', {'p_period': args.period}).execute().data
+    print(f"💰 Payout batch #{batch['id']} for {batch['period']}: "
+          f"{batch['referrer_count']} referrers, ${batch['total_cents'] / 100:,.2f} total")
+
+    totals = export_batch(supabase, batch, args.out)
+    for name, (rows, cents) in sorted(totals.items()):
+        print(f"   {name}.csv: {rows} payouts, ${cents / 100:,.2f}")
+    if "needs_review" in totals:
+        print("⚠️ Some referrers have no payout method/handle on file. See needs_review.csv.")
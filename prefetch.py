@@ -0,0 +1,74 @@
+from collections import Counter
+from concurrent.futures import Future, wait
+
+import tracing
+from ttl_cache import TTLCache
+
+# ==========================================
+# PER-SESSION PREFETCH CACHE
+# ==========================================
+# Every click in the Rolodex ends in st.rerun(), and the rerun used to query
+# Supabase again for whatever it draws. A SessionPrefetcher lives in one
+# session's state and holds recent reads as Futures, per kind ("page", "lead"),
+# in a small LRU with a TTL:
+#   - prefetch() starts a read on the shared pool while the current page is on
+#     screen (e.g. page N+1), so the click that needs it finds it done.
+#   - get() returns the cached value (waiting for a read still in flight) or
+#     loads it now; each call counts as hit / wait / miss, per session and in
+#     prefetch_requests_total.
+# The TTL bounds staleness from writes made elsewhere (another device, a voice
+# job); writes made by this session call invalidate()/put().
+
+
+class SessionPrefetcher:
+    def __init__(self, executor, sizes, ttl=60):
+        self._executor = executor
+        self._caches = {kind: TTLCache(max_size=size, ttl=ttl) for kind, size in sizes.items()}
+        self.stats = Counter()  # (kind, outcome) -> count, for this session
+
+    def _count(self, kind, outcome):
+        self.stats[(kind, outcome)] += 1
+        tracing.incr("prefetch_requests_total", kind=kind, outcome=outcome)
+
+    def get(self, kind, key, load):
+        """Cached value for key, else load() (now, in the calling thread) and cache it."""
+        cache = self._caches[kind]
+        future = cache.get(key)
+        if future is not None:
+            outcome = "hit" if future.done() else "wait"
+            try:
+                value = future.result()
+                self._count(kind, outcome)
+                return value
+            except Exception as e:
+                # A failed prefetch is just a miss; the load below raises to the caller if it fails again
+                print(f"Prefetch Error ({kind} {key}): {e}")
+                cache.pop(key)
+        self._count(kind, "miss")
+        value = load()
+        self.put(kind, key, value)
+        return value
+
+    def prefetch(self, kind, key, load):
+        """Starts load() in the background unless key is cached or already loading."""
+        cache = self._caches[kind]
+        if cache.get(key) is not None:
+            return
+        cache.set(key, self._executor.submit(load))
+        self._count(kind, "prefetch")
+
+    def put(self, kind, key, value):
+        future = Future()
+        future.set_result(value)
+        self._caches[kind].set(key, future)
+
+    def invalidate(self, kind=None, key=None):
+        """Drops one key, one kind, or everything."""
+        for name, cache in self._caches.items():
+            if kind is not None and name != kind: continue
+            if key is None: cache.clear()
+            else: cache.pop(key)
+
+    def settle(self, timeout=None):
+        """Waits for reads still in flight (bench/tests: keeps round-trip counts per step)."""
+        wait([future for cache in self._caches.values() for future in cache.values()], timeout=timeout)
@@ -0,0 +1,153 @@
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+import tracing
+from ttl_cache import TTLCache
+
+# ==========================================
+# RATE LIMITING
+# ==========================================
+class TokenBucket:
+    """
+    Thread-safe token bucket: refills at `rate` tokens per second up to `capacity`.
+    acquire() blocks until a token is free; try_acquire() never blocks.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(rate, 1))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens=1):
+        with self._lock:
+            self._refill()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+    def wait_time(self, tokens=1):
+        """Seconds until `tokens` would be available (0 if they are now)."""
+        with self._lock:
+            self._refill()
+            return max(tokens - self._tokens, 0) / self.rate
+
+    def acquire(self, tokens=1):
+        while not self.try_acquire(tokens):
+            time.sleep(max(self.wait_time(tokens), 0.001))
+
+
+class FairSemaphore:
+    """
+    At most `limit` holders at once. Waiters queue per key (e.g. user id) and a
+    freed slot goes to the next key in round-robin order, so one key with many
+    waiters cannot starve the others.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self._active = 0
+        self._queues = OrderedDict()  # key -> deque of waiting Events, keys in round-robin order
+        self._lock = threading.Lock()
+
+    def acquire(self, key, timeout=None):
+        """True once a slot is held, False after `timeout` seconds without one."""
+        with self._lock:
+            if self._active < self.limit and not self._queues:
+                self._active += 1
+                return True
+            waiter = threading.Event()
+            self._queues.setdefault(key, deque()).append(waiter)
+        if waiter.wait(timeout):
+            return True
+        with self._lock:
+            if waiter.is_set():  # handed a slot just as the wait timed out
+                return True
+            queue = self._queues[key]
+            queue.remove(waiter)
+            if not queue: del self._queues[key]
+        return False
+
+    def release(self):
+        with self._lock:
+            if not self._queues:
+                self._active -= 1
+                return
+            # Hand the slot straight to the next key's oldest waiter; that key moves to the back
+            key, queue = self._queues.popitem(last=False)
+            waiter = queue.popleft()
+            if queue: self._queues[key] = queue
+            waiter.set()
+
+    def waiting(self):
+        with self._lock:
+            return sum(len(queue) for queue in self._queues.values())
+
+
+class Throttled(Exception):
+    """Raised by Admission.slot() when a call would have to wait longer than max_wait."""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(f"{reason}: retry in {retry_after:.1f}s")
+        self.reason = reason            # "rate" (this key's bucket) or "busy" (every slot taken)
+        self.retry_after = retry_after  # seconds
+
+
+class Admission:
+    """
+    Admission control for one upstream: a TokenBucket per key (rate per second,
+    `burst` capacity) in front of a FairSemaphore shared by every key. slot()
+    waits up to max_wait for both, then raises Throttled.
+    """
+
+    def __init__(self, name, rate, burst, max_concurrent, max_wait=5.0, max_keys=10000):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.max_wait = max_wait
+        self.semaphore = FairSemaphore(max_concurrent)
+        self._buckets = TTLCache(max_size=max_keys, ttl=600)  # idle keys drop out (and come back with a full bucket)
+        self._lock = threading.Lock()
+
+    def _bucket(self, key):
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = TokenBucket(self.rate, self.burst)
+                self._buckets.set(key, bucket)
+            return bucket
+
+    def retry_after(self, key):
+        """Seconds until `key` may call again (0: now). Does not take a token."""
+        return self._bucket(key).wait_time()
+
+    def _reject(self, reason, retry_after):
+        tracing.incr("admission_rejected_total", limiter=self.name, reason=reason)
+        raise Throttled(reason, retry_after)
+
+    @contextmanager
+    def slot(self, key, max_wait=None):
+        max_wait = self.max_wait if max_wait is None else max_wait
+        started = time.monotonic()
+        bucket = self._bucket(key)
+        wait = bucket.wait_time()
+        if wait > max_wait:
+            self._reject("rate", wait)
+        bucket.acquire()
+        remaining = max_wait - (time.monotonic() - started)
+        if not self.semaphore.acquire(key, timeout=max(remaining, 0)):
+            self._reject("busy", 1.0)
+        tracing.observe("admission_wait_seconds", time.monotonic() - started, limiter=self.name)
+        try:
+            yield
+        finally:
+            self.semaphore.release()
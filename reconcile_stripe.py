@@ -0,0 +1,183 @@
+import os
+import csv
+import argparse
+from datetime import datetime, timedelta, timezone
+import stripe
+from supabase import create_client, Client
+from dotenv import load_dotenv
+from rate_limit import TokenBucket
+
+# Load environment variables
+load_dotenv()
+
+# --- Configuration ---
+STRIPE_API_KEY = os.getenv("STRIPE_SECRET_KEY")
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_KEY = os.getenv("SUPABASE_KEY")  # MUST be the SERVICE_ROLE key to bypass RLS
+
+stripe.api_key = STRIPE_API_KEY
+if os.getenv("STRIPE_API_BASE"):
+    stripe.api_base = os.getenv("STRIPE_API_BASE")
+stripe.max_network_retries = 3  # retries 429s and network errors with backoff
+
+STRIPE_PAGE = 100         # Stripe's max page size for list calls
+STRIPE_RATE = float(os.getenv("STRIPE_RECONCILE_RATE", "20"))  # list calls/s (live limit is 100 reads/s, shared with the app)
+PAGE_SIZE = 1000          # PostgREST max rows per response on Supabase
+WRITE_BATCH = 500
+
+# ==========================================
+# NIGHTLY STRIPE <-> PROFILES RECONCILIATION
+# ==========================================
+# Catches anything a missed webhook left behind:
+# 1. Stream every active subscription and every paid invoice in the window from
+#    Stripe (100 per page, rate-limited, customer expanded so no per-row calls).
+# 2. Stream profiles and the window's commission credits from Supabase in pages.
+# 3. Compare as sets: who should be active vs who is, which invoices of referred
+#    payers have no credit, which customers are not linked to their profile.
+# 4. Apply the corrections in bulk RPCs (apply_subscription_states,
+#    record_commissions, link_stripe_customers) and write a CSV diff report.
+# At 100k customers that is ~2k Stripe list calls: under two minutes at 20/s.
+# Usage: python reconcile_stripe.py [--since-days 35] [--dry-run] [--report reconcile_reports]
+
+def iter_stripe(resource, limiter, **params):
+    """Pages through a Stripe list endpoint, one rate-limited call per 100 objects."""
+    starting_after = None
+    while True:
+        limiter.acquire()
+        page = resource.list(limit=STRIPE_PAGE, starting_after=starting_after, **params)
+        yield from page.data
+        if not page.has_more or not page.data:
+            return
+        starting_after = page.data[-1].id
+
+def iter_table(supabase, table, columns, key='id', **filters):
+    """Keyset-pages a table ordered by 'key'."""
+    last = None
+    while True:
+        query = supabase.table(table).select(columns)
+        for column, value in filters.items():
+            query = query.gte(column, value)
+        if last is not None:
+            query = query.gt(key, last)
+        page = query.order(key).limit(PAGE_SIZE).execute().data
+        yield from page
+        if len(page) < PAGE_SIZE:
+            return
+        last = page[-1][key]
+
+def _meta(obj, *path):
+    """Nested metadata as a plain dict ({} if any step is missing)."""
+    for step in path:
+        obj = obj.get(step) if isinstance(obj, dict) else getattr(obj, step, None)
+        if obj is None: return {}
+    return obj.to_dict() if hasattr(obj, 'to_dict') else dict(obj)
+
+class ProfileIndex:
+    """In-memory lookup of profiles by id, Stripe customer and email."""
+
+    def __init__(self, profiles):
+        self.by_id = {p['id']: p for p in profiles}
+        self.by_customer = {p['stripe_customer_id']: p for p in profiles if p.get('stripe_customer_id')}
+        self.by_email = {}
+        for p in profiles:
+            if p.get('email'):
+                self.by_email.setdefault(p['email'].strip().lower(), p)
+        self.links = {}  # profile id -> customer id, for email matches with no customer on file
+
+    def resolve(self, customer_id, email, metadata):
+        """Profile for a Stripe object: metadata user_id, then customer id, then email."""
+        profile = self.by_id.get(metadata.get('user_id')) or self.by_customer.get(customer_id)
+        if profile:
+            return profile
+        profile = self.by_email.get((email or "").strip().lower())
+        if profile and customer_id and not profile.get('stripe_customer_id') and customer_id not in self.by_customer:
+            self.links[profile['id']] = customer_id
+            self.by_customer[customer_id] = profile
+        return profile
+
+def reconcile(supabase, since, limiter):
+    """Returns (corrections, diff rows) without writing anything."""
+    profiles = ProfileIndex(list(iter_table(supabase, 'profiles', 'id, email, referred_by, subscription_active, stripe_customer_id')))
+    diff = []
+
+    # --- Entitlements ---
+    should_be_active = set()
+    for sub in iter_stripe(stripe.Subscription, limiter, status='active', expand=['data.customer']):
+        customer = sub.customer
+        customer_id = customer if isinstance(customer, str) else customer.id
+        email = None if isinstance(customer, str) else customer.email
+        profile = profiles.resolve(customer_id, email, _meta(sub, 'metadata'))
+        if profile:
+            should_be_active.add(profile['id'])
+        else:
+            diff.append(('unmatched_subscription', '', email or '', customer_id, sub.id, 'no profile for this customer'))
+
+    is_active = {pid for pid, p in profiles.by_id.items() if p.get('subscription_active')}
+    states = [{'id': pid, 'active': True} for pid in should_be_active - is_active]
+    states += [{'id': pid, 'active': False} for pid in is_active - should_be_active]
+    for row in states:
+        p = profiles.by_id[row['id']]
+        diff.append(('activate' if row['active'] else 'deactivate', p['id'], p.get('email') or '', p.get('stripe_customer_id') or '', '', ''))
+
+    # --- Commissions ---
+    # Credits are written within seconds of payment; a day of slack covers clock skew
+    credited = {c['stripe_invoice_id'] for c in iter_table(
+        supabase, 'commission_credits', 'id, stripe_invoice_id', created_at=(since - timedelta(days=1)).isoformat())}
+    credits = []
+    for invoice in iter_stripe(stripe.Invoice, limiter, status='paid', created={'gte': int(since.timestamp())}):
+        if not invoice.amount_paid or invoice.id in credited:
+            continue
+        metadata = _meta(invoice, 'subscription_details', 'metadata') or _meta(invoice, 'parent', 'subscription_details', 'metadata')
+        payer = profiles.resolve(invoice.customer, invoice.customer_email, metadata)
+        if not payer or not payer.get('referred_by'):
+            continue
+        credits.append({'invoice': invoice.id, 'payer': payer['id']})  # every tier is credited, see record_commissions()
+        diff.append(('missing_credit', payer['id'], payer.get('email') or '', invoice.customer, invoice.id, f"referrer {payer['referred_by']}"))
+
+    links = [{'id': pid, 'customer': cid} for pid, cid in profiles.links.items()]
+    for row in links:
+        diff.append(('link_customer', row['id'], profiles.by_id[row['id']].get('email') or '', row['customer'], '', ''))
+
+    return {'states': states, 'credits': credits, 'links': links}, diff
+
+def apply_corrections(supabase, corrections):
+    totals = {}
+    for key, rpc, arg in (('links', 'link_stripe_customers', 'p_rows'),
+                          ('states', 'apply_subscription_states', 'p_rows'),
+                          ('credits', 'record_commissions', 'p_rows')):
+        rows = corrections[key]
+        totals[key] = 0
+        for i in range(0, len(rows), WRITE_BATCH):
+            totals[key] += supabase.rpc(rpc, {arg: rows[i:i + WRITE_BATCH]}).execute().data or 0
+    return totals
+
+def write_report(path, diff):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(['kind', 'profile_id', 'email', 'stripe_customer', 'stripe_object', 'detail'])
+        writer.writerows(diff)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Reconcile Stripe subscriptions/invoices with profiles and commission credits.")
+    parser.add_argument("--since-days", type=int, default=35, help="Paid invoices created in the last N days are checked")
+    parser.add_argument("--dry-run", action="store_true", help="Report differences without writing")
+    parser.add_argument("--report", default="reconcile_reports", help="Directory for the CSV diff report")
+    args = parser.parse_args()
+
+    supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+    since = datetime.now(timezone.utc) - timedelta(days=args.since_days)
+    started = datetime.now(timezone.utc)
+
+    corrections, diff = reconcile(supabase, since, TokenBucket(STRIPE_RATE))
+    report_path = os.path.join(args.report, f"reconcile-{started.strftime('%Y-%m-%dT%H%M%S')}.csv")
+    write_report(report_path, diff)
+
+    print(f"🔎 {len(corrections['states'])} entitlement fix(es), {len(corrections['credits'])} missing credit(s), "
+          f"{len(corrections['links'])} customer link(s). Report: {report_path}")
+    if args.dry_run:
+        print("ℹ️ Dry run, nothing written.")
+    else:
+        applied = apply_corrections(supabase, corrections)
+        print(f"✅ Applied: {applied['states']} entitlement(s), {applied['credits']} credit(s), {applied['links']} link(s) "
+              f"in {(datetime.now(timezone.utc) - started).total_seconds():.0f}s.")
@@ -0,0 +1,118 @@
+import os
+import argparse
+from collections import defaultdict
+from datetime import datetime, timedelta, time as dt_time
+from supabase import create_client, Client
+from dotenv import load_dotenv
+from outreach_time import USER_TZ, parse_outreach, parse_timestamp, user_now
+
+# Load environment variables
+load_dotenv()
+
+# --- Configuration ---
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_KEY = os.getenv("SUPABASE_KEY")  # MUST be the SERVICE_ROLE key to bypass RLS
+
+PAGE_SIZE = 1000           # rows per read (Supabase max rows)
+WRITE_BATCH = 500          # digests per upsert
+OVERDUE_LOOKBACK_DAYS = 7  # overdue leads older than this drop out of the digest
+
+# ==========================================
+# DAILY REMINDER DIGESTS
+# ==========================================
+# One range scan over leads.next_outreach_at (indexed) for ALL users, grouped
+# in memory, then written back as reminder_digests rows in bulk upserts.
+# No per-user queries. Run once a day (e.g. a Railway cron):
+#   python reminder_digest.py                 # digests for today
+#   python reminder_digest.py --date 2026-10-20
+#   python reminder_digest.py --backfill      # parse next_outreach on older rows
+
+def due_window(day):
+    """[start, end) in UTC: overdue for up to OVERDUE_LOOKBACK_DAYS, through the end of 'day'."""
+    start = datetime.combine(day - timedelta(days=OVERDUE_LOOKBACK_DAYS), dt_time.min, USER_TZ)
+    end = datetime.combine(day + timedelta(days=1), dt_time.min, USER_TZ)
+    return start, end
+
+def collect_due_leads(supabase, day):
+    """Returns {user_id: [digest item, ...]} for every lead due in the window."""
+    start, end = due_window(day)
+    by_user = defaultdict(list)
+    offset = 0
+    while True:
+        page = supabase.table('leads')\
+            .select('id, user_id, name, status, next_outreach, next_outreach_at')\
+            .gte('next_outreach_at', start.isoformat())\
+            .lt('next_outreach_at', end.isoformat())\
+            .order('next_outreach_at')\
+            .order('id')\
+            .range(offset, offset + PAGE_SIZE - 1)\
+            .execute().data
+        for lead in page:
+            due_at = parse_timestamp(lead['next_outreach_at'])
+            by_user[lead['user_id']].append({
+                'lead_id': lead['id'],
+                'name': lead.get('name'),
+                'status': lead.get('status'),
+                'due_at': lead['next_outreach_at'],
+                'overdue': due_at is not None and due_at.astimezone(USER_TZ).date() < day,
+                'note': lead.get('next_outreach'),
+            })
+        if len(page) < PAGE_SIZE:
+            return by_user
+        offset += PAGE_SIZE
+
+def write_digests(supabase, day, by_user):
+    rows = [
+        {'user_id': user_id, 'digest_date': day.isoformat(), 'lead_count': len(items), 'items': items}
+        for user_id, items in by_user.items()
+    ]
+    for i in range(0, len(rows), WRITE_BATCH):
+        supabase.table('reminder_digests')\
+            .upsert(rows[i:i + WRITE_BATCH], on_conflict='user_id,digest_date')\
+            .execute()
+    return len(rows)
+
+def backfill_outreach_at(supabase):
+    """Parses next_outreach for rows written before next_outreach_at existed. Relative text is anchored at created_at."""
+    last_id, parsed, skipped = 0, 0, 0
+    while True:
+        page = supabase.table('leads')\
+            .select('id, next_outreach, created_at')\
+            .not_.is_('next_outreach', 'null')\
+            .is_('next_outreach_at', 'null')\
+            .gt('id', last_id)\
+            .order('id')\
+            .limit(PAGE_SIZE)\
+            .execute().data
+        if not page:
+            return parsed, skipped
+        updates = []
+        for lead in page:
+            anchor = parse_timestamp(lead.get('created_at'))
+            due_at = parse_outreach(lead['next_outreach'], now=anchor)
+            if due_at:
+                updates.append({'id': lead['id'], 'at': due_at.isoformat()})
+            else:
+                skipped += 1
+        if updates:
+            supabase.rpc('set_next_outreach_at', {'p_rows': updates}).execute()
+            parsed += len(updates)
+        last_id = page[-1]['id']
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build daily reminder digests from leads.next_outreach_at.")
+    parser.add_argument("--date", help="Digest day in the user's timezone, YYYY-MM-DD (default: today)")
+    parser.add_argument("--backfill", action="store_true", help="Parse next_outreach into next_outreach_at for older rows")
+    args = parser.parse_args()
+
+    supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+
+    if args.backfill:
+        parsed, skipped = backfill_outreach_at(supabase)
+        print(f"✅ Backfilled next_outreach_at on {parsed} lead(s); {skipped} had no parseable date.")
+    else:
+        day = datetime.strptime(args.date, "%Y-%m-%d").date() if args.date else user_now().date()
+        by_user = collect_due_leads(supabase, day)
+        written = write_digests(supabase, day, by_user)
+        total = sum(len(items) for items in by_user.values())
+        print(f"📬 {written} digest(s) for {day} covering {total} due lead(s).")
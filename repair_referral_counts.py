@@ -0,0 +1,23 @@
+import os
+from supabase import create_client, Client
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# --- Configuration ---
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_KEY = os.getenv("SUPABASE_KEY")  # MUST be the SERVICE_ROLE key to bypass RLS
+
+# ==========================================
+# REFERRAL COUNTER REPAIR JOB
+# ==========================================
+# profiles.referral_count / active_referral_count are maintained incrementally.
+# This recounts every referrer in a single set-based statement (see
+# recount_referrals() in supabase/migrations) and fixes any drift.
+# Usage: python repair_referral_counts.py
+
+if __name__ == '__main__':
+    supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+    fixed = supabase.rpc('recount_referrals').execute().data
+    print(f"✅ Referral counters repaired on {fixed or 0} profile(s).")
@@ -0,0 +1,266 @@
+import os
+import re
+import time
+import atexit
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# ==========================================
+# SEMANTIC LEAD SEARCH
+# ==========================================
+# One embedding matrix per user over each lead's product_pitch + background,
+# so "who would want the skincare bundle?" is a cosine top-K over a NumPy
+# matrix instead of a Gemini call carrying the whole Rolodex.
+#   - Rows are L2-normalized float32 in memory (scores = one mat-vec) and
+#     float16 on disk: <SEMANTIC_INDEX_DIR>/<sha1(user id)>.npz, no pickle.
+#   - Each row keeps a hash of the text it was embedded from; upsert()/sync()
+#     embed only leads whose text changed. App writes call upsert(); sync()
+#     against the leads table catches anything written elsewhere, so an index
+#     lost with a container is rebuilt rather than wrong.
+#   - HashingEmbedder is deterministic and offline (tests, bench, no API key);
+#     GeminiEmbedder uses Gemini's embedding model.
+
+SAVE_INTERVAL = 10.0  # seconds between writes of a changed index to disk
+SYNC_INTERVAL = 300.0  # seconds before sync() re-reads the leads table for a user
+MAX_USERS_IN_MEMORY = 256
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def lead_text(lead):
+    """What a lead is searched by: product fit first, then background notes."""
+    return "\n".join(part.strip() for part in (lead.get("product_pitch") or "", lead.get("background") or "") if part and part.strip())
+
+
+def text_hash(text):
+    return int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), "little")
+
+
+def _normalize(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32, copy=False)
+
+
+class HashingEmbedder:
+    """
+    Deterministic bag-of-features embedder: words, word bigrams and character
+    4-grams (so 'skincare' and 'skin care' overlap), signed-hashed into `dim` buckets.
+    """
+
+    def __init__(self, dim=256):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def _features(self, text):
+        words = _TOKEN.findall(text.lower())
+        for w in words:
+            yield w, 1.0
+            padded = f"#{w}#"
+            for i in range(max(len(padded) - 3, 1)):
+                yield "c:" + padded[i:i + 4], 0.5
+        for a, b in zip(words, words[1:]):
+            yield f"b:{a} {b}", 0.7
+            yield "c:" + (a + b)[-4:], 0.3
+
+    def embed(self, texts, query=False):
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, weight in self._features(text):
+                h = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), "little")
+                out[row, h % self.dim] += weight if (h >> 63) else -weight
+        return _normalize(out)
+
+
+class GeminiEmbedder:
+    """Gemini embeddings (batched), with the retrieval task type set for documents vs queries."""
+
+    BATCH = 100
+
+    def __init__(self, client, model="text-embedding-004", dim=256):
+        self.client = client
+        self.model = model
+        self.dim = dim
+        self.name = f"gemini:{model}:{dim}"
+
+    def embed(self, texts, query=False):
+        from google.genai import types
+        config = types.EmbedContentConfig(task_type="RETRIEVAL_QUERY" if query else "RETRIEVAL_DOCUMENT",
+                                          output_dimensionality=self.dim)
+        rows = []
+        for start in range(0, len(texts), self.BATCH):
+            response = self.client.models.embed_content(model=self.model, contents=texts[start:start + self.BATCH], config=config)
+            rows.extend(e.values for e in response.embeddings)
+        return _normalize(np.asarray(rows, dtype=np.float32).reshape(len(texts), self.dim))
+
+
+class LeadIndex:
+    """One user's rows. Not thread-safe on its own; SemanticIndex holds a lock per user."""
+
+    def __init__(self, dim):
+        self.ids = np.empty(0, dtype=np.str_)
+        self.hashes = np.empty(0, dtype=np.uint64)
+        self.vectors = np.empty((0, dim), dtype=np.float32)
+        self.dirty = False
+        self.saved_at = time.monotonic()
+        self.synced_at = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def upsert(self, embedder, leads):
+        """Embeds new leads and leads whose text changed. Returns how many were embedded."""
+        position = {lead_id: i for i, lead_id in enumerate(self.ids.tolist())}
+        changed = {}
+        for lead in leads:
+            lead_id, text = str(lead["id"]), lead_text(lead)
+            i = position.get(lead_id)
+            if i is None or int(self.hashes[i]) != text_hash(text):
+                changed[lead_id] = text
+        if not changed:
+            return 0
+
+        new_ids = list(changed)
+        vectors = embedder.embed([changed[i] or " " for i in new_ids])
+        hashes = np.array([text_hash(changed[i]) for i in new_ids], dtype=np.uint64)
+        existing = [position.get(i) for i in new_ids]
+        update = [(n, i) for n, i in enumerate(existing) if i is not None]
+        if update:
+            rows, targets = zip(*update)
+            self.vectors[list(targets)] = vectors[list(rows)]
+            self.hashes[list(targets)] = hashes[list(rows)]
+        append = [n for n, i in enumerate(existing) if i is None]
+        if append:
+            self.ids = np.concatenate([self.ids, np.array([new_ids[n] for n in append], dtype=np.str_)])
+            self.hashes = np.concatenate([self.hashes, hashes[append]])
+            self.vectors = np.concatenate([self.vectors, vectors[append]])
+        self.dirty = True
+        return len(new_ids)
+
+    def retain(self, lead_ids):
+        """Drops rows whose lead is gone."""
+        keep = np.isin(self.ids, np.array([str(i) for i in lead_ids], dtype=np.str_))
+        if keep.all(): return
+        self.ids, self.hashes, self.vectors = self.ids[keep], self.hashes[keep], self.vectors[keep]
+        self.dirty = True
+
+    def search(self, query_vector, k):
+        """[(lead id, cosine score)], best first."""
+        if not len(self): return []
+        scores = self.vectors @ query_vector
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(str(self.ids[i]), float(scores[i])) for i in top]
+
+    def save(self, path, embedder_name):
+        tmp = path + ".tmp.npz"
+        np.savez(tmp, ids=self.ids, hashes=self.hashes, vectors=self.vectors.astype(np.float16),
+                 embedder=np.array(embedder_name))
+        os.replace(tmp, path)
+        self.dirty = False
+        self.saved_at = time.monotonic()
+
+    @classmethod
+    def load(cls, path, embedder):
+        """The saved index, or an empty one if there is none or it was built by another embedder."""
+        index = cls(embedder.dim)
+        if not path or not os.path.exists(path): return index
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                if str(data["embedder"]) != embedder.name: return index
+                index.ids = data["ids"]
+                index.hashes = data["hashes"]
+                index.vectors = data["vectors"].astype(np.float32)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Semantic Index Error (load {path}): {e}")
+        return index
+
+
+class SemanticIndex:
+    """Per-user LeadIndex objects, loaded from `directory` on first use (directory=None: memory only)."""
+
+    def __init__(self, embedder, directory=None):
+        self.embedder = embedder
+        self.directory = directory
+        if directory: os.makedirs(directory, exist_ok=True)
+        self._indexes = OrderedDict()  # user id -> LeadIndex, least recently used first
+        self._locks = {}               # user id -> lock
+        self._lock = threading.Lock()
+        atexit.register(self.flush)
+
+    def _path(self, user_id):
+        if not self.directory: return None
+        return os.path.join(self.directory, hashlib.sha1(str(user_id).encode()).hexdigest() + ".npz")
+
+    def _user_lock(self, user_id):
+        with self._lock:
+            return self._locks.setdefault(user_id, threading.Lock())
+
+    def _index(self, user_id):
+        """The user's LeadIndex (caller holds the user's lock). Evicted indexes are saved first."""
+        with self._lock:
+            index = self._indexes.get(user_id)
+            if index is not None:
+                self._indexes.move_to_end(user_id)
+                return index
+        index = LeadIndex.load(self._path(user_id), self.embedder)
+        with self._lock:
+            self._indexes[user_id] = index
+            evicted = self._indexes.popitem(last=False) if len(self._indexes) > MAX_USERS_IN_MEMORY else None
+        if evicted:
+            # Another user's lock is not held here; a concurrent write to it only makes this save slightly stale
+            self._save_quietly(*evicted)
+        return index
+
+    def _save_quietly(self, user_id, index):
+        try:
+            self._maybe_save(user_id, index, force=True)
+        except OSError as e:
+            print(f"Semantic Index Error (save): {e}")
+
+    def _maybe_save(self, user_id, index, force=False):
+        path = self._path(user_id)
+        if path and index.dirty and (force or time.monotonic() - index.saved_at >= SAVE_INTERVAL):
+            index.save(path, self.embedder.name)
+
+    def upsert(self, user_id, leads):
+        """Call after writing leads (dicts with id, product_pitch, background)."""
+        with self._user_lock(user_id):
+            index = self._index(user_id)
+            embedded = index.upsert(self.embedder, leads)
+            self._maybe_save(user_id, index)
+            return embedded
+
+    def needs_sync(self, user_id):
+        with self._lock:
+            index = self._indexes.get(user_id)
+        return index is None or index.synced_at is None or time.monotonic() - index.synced_at >= SYNC_INTERVAL
+
+    def sync(self, user_id, leads):
+        """Makes the index match `leads` (the user's whole Rolodex): embeds what changed, drops what is gone."""
+        with self._user_lock(user_id):
+            index = self._index(user_id)
+            embedded = index.upsert(self.embedder, leads)
+            index.retain([lead["id"] for lead in leads])
+            index.synced_at = time.monotonic()
+            self._maybe_save(user_id, index, force=embedded > 0)
+            return embedded
+
+    def search(self, user_id, query, k=10, min_score=0.0):
+        """[(lead id as str, score)] for a free-text question, best first."""
+        query_vector = self.embedder.embed([query], query=True)[0]
+        with self._user_lock(user_id):
+            hits = self._index(user_id).search(query_vector, k)
+        return [(lead_id, score) for lead_id, score in hits if score > min_score]
+
+    def flush(self):
+        """Writes every changed index now (also runs at exit)."""
+        with self._lock:
+            indexes = list(self._indexes.items())
+        for user_id, index in indexes:
+            with self._user_lock(user_id):
+                self._save_quietly(user_id, index)
@@ -0,0 +1,159 @@
+import json
+import hashlib
+import sqlite3
+import threading
+import time
+import zlib
+from urllib.parse import urlparse
+
+from ttl_cache import TTLCache
+
+# ==========================================
+# EXTERNAL SESSION STORE
+# ==========================================
+# st.session_state only lives in the memory of the replica that served the
+# websocket, so a redeploy or a second replica loses every session. The app
+# mirrors a fixed set of session keys into one of these backends, keyed by a
+# random session id kept in a browser cookie:
+#   memory                      this process only (the default; survives reconnects)
+#   sqlite:///data/sessions.db  one file shared by replicas on the same volume
+#   redis://host:6379/0         Redis or anything that speaks its protocol
+# Values are compact JSON, zlib-compressed when that is smaller, with a TTL
+# that restarts on every save.
+
+COMPRESS_MIN_BYTES = 256
+
+
+def dumps(state):
+    """dict -> bytes: b'j' + JSON, or b'z' + zlib(JSON) when that is smaller."""
+    raw = json.dumps(state, separators=(",", ":"), default=str).encode()
+    if len(raw) >= COMPRESS_MIN_BYTES:
+        packed = zlib.compress(raw, 6)
+        if len(packed) < len(raw):
+            return b"z" + packed
+    return b"j" + raw
+
+
+def loads(blob):
+    if not blob: return None
+    blob = bytes(blob)
+    raw = zlib.decompress(blob[1:]) if blob[:1] == b"z" else blob[1:]
+    return json.loads(raw)
+
+
+class MemoryBackend:
+    def __init__(self, ttl, max_size=20000):
+        self._cache = TTLCache(max_size=max_size, ttl=ttl)
+
+    def get(self, sid):
+        return self._cache.get(sid)
+
+    def set(self, sid, blob):
+        self._cache.set(sid, blob)
+
+    def delete(self, sid):
+        self._cache.pop(sid)
+
+
+class SQLiteBackend:
+    def __init__(self, path, ttl):
+        self.ttl = ttl
+        self._local = threading.local()  # one connection per thread
+        self.path = path
+        with self._conn() as conn:
+            conn.execute("create table if not exists sessions (sid text primary key, data blob not null, expires_at real not null)")
+            conn.execute("create index if not exists sessions_expires_idx on sessions (expires_at)")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("pragma journal_mode=wal")
+            self._local.conn = conn
+        return conn
+
+    def get(self, sid):
+        row = self._conn().execute("select data from sessions where sid = ? and expires_at > ?", (sid, time.time())).fetchone()
+        return row[0] if row else None
+
+    def set(self, sid, blob):
+        now = time.time()
+        with self._conn() as conn:
+            conn.execute("insert into sessions (sid, data, expires_at) values (?, ?, ?) "
+                         "on conflict (sid) do update set data = excluded.data, expires_at = excluded.expires_at",
+                         (sid, blob, now + self.ttl))
+            # Cheap amortized cleanup instead of a separate sweeper
+            if int(now) % 100 == 0:
+                conn.execute("delete from sessions where expires_at <= ?", (now,))
+
+    def delete(self, sid):
+        with self._conn() as conn:
+            conn.execute("delete from sessions where sid = ?", (sid,))
+
+
+class RedisBackend:
+    def __init__(self, url, ttl, prefix="nexus:session:"):
+        import redis  # only needed for this backend
+        self._redis = redis.Redis.from_url(url, socket_timeout=2)
+        self.ttl = int(ttl)
+        self.prefix = prefix
+
+    def get(self, sid):
+        return self._redis.get(self.prefix + sid)
+
+    def set(self, sid, blob):
+        self._redis.set(self.prefix + sid, blob, ex=self.ttl)
+
+    def delete(self, sid):
+        self._redis.delete(self.prefix + sid)
+
+
+def open_backend(url, ttl):
+    """Backend for a SESSION_STORE url (see above)."""
+    scheme = urlparse(url or "memory").scheme or url
+    if scheme == "memory":
+        return MemoryBackend(ttl)
+    if scheme == "sqlite":
+        return SQLiteBackend(url[len("sqlite:///"):] or "sessions.db", ttl)
+    if scheme in ("redis", "rediss", "unix"):
+        return RedisBackend(url, ttl)
+    raise ValueError(f"Unsupported SESSION_STORE: {url}")
+
+
+class SessionStore:
+    """Loads and saves session snapshots (plain dicts). Failures are logged, never raised into the app."""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def load(self, sid):
+        try:
+            return loads(self.backend.get(sid))
+        except Exception as e:
+            print(f"Session Store Error (load): {e}")
+            return None
+
+    def save(self, sid, state, last_digest=None):
+        """
+        Writes the snapshot unless it is identical to the one saved as last_digest.
+        Returns the digest to pass next time (last_digest again if the write failed).
+        """
+        blob = dumps(state)
+        digest = hashlib.sha256(blob).hexdigest()
+        if digest == last_digest: return digest
+        try:
+            self.backend.set(sid, blob)
+            return digest
+        except Exception as e:
+            print(f"Session Store Error (save): {e}")
+            return last_digest
+
+    @staticmethod
+    def digest(state):
+        return hashlib.sha256(dumps(state)).hexdigest()
+
+    def delete(self, sid):
+        try:
+            self.backend.delete(sid)
+        except Exception as e:
+            print(f"Session Store Error (delete): {e}")
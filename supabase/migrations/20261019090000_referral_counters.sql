@@ -0,0 +1,118 @@
+-- Denormalized referral counters.
+-- profiles.referral_count / active_referral_count replace the count="exact"
+-- scan over referred_by that ran every time a user opened their profile.
+-- They are maintained incrementally by link_referrer() (app login) and
+-- set_subscription_active() (webhook), and recount_referrals() repairs drift.
+--
+-- Deploy note: subscription state lives in Stripe, so this migration cannot
+-- backfill subscription_active; every existing profile starts as false and
+-- every active_referral_count as 0. Run `python reconcile_stripe.py` once
+-- after applying 20261019140000_stripe_reconciliation.sql: it sets
+-- subscription_active from Stripe through apply_subscription_states(), which
+-- also moves the referrers' active counts.
+
+alter table public.profiles
+    add column if not exists referral_count integer not null default 0,
+    add column if not exists active_referral_count integer not null default 0,
+    add column if not exists subscription_active boolean not null default false;
+
+create index if not exists profiles_referred_by_idx on public.profiles (referred_by);
+
+-- Links p_user to p_referrer (only if not linked yet) and bumps the referrer's
+-- counters in the same transaction. Returns true when a link was created.
+create or replace function public.link_referrer(p_user uuid, p_referrer uuid)
+returns boolean
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+    v_active boolean;
+begin
+    if p_user is distinct from auth.uid() and coalesce(auth.role(), '') <> 'service_role' then
+        raise exception 'link_referrer: not allowed';
+    end if;
+    if p_referrer is null or p_referrer = p_user then
+        return false;
+    end if;
+
+    update profiles
+       set referred_by = p_referrer
+     where id = p_user
+       and referred_by is null
+    returning subscription_active into v_active;
+    if not found then
+        return false;
+    end if;
+
+    update profiles
+       set referral_count = referral_count + 1,
+           active_referral_count = active_referral_count + (case when v_active then 1 else 0 end)
+     where id = p_referrer;
+    return true;
+end;
+$$;
+
+-- Records a subscription state change for p_profile. On an actual transition
+-- the referrer's active_referral_count moves by one. Webhook (service role) only.
+create or replace function public.set_subscription_active(p_profile uuid, p_active boolean)
+returns boolean
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+    v_referrer uuid;
+begin
+    update profiles
+       set subscription_active = p_active
+     where id = p_profile
+       and subscription_active is distinct from p_active
+    returning referred_by into v_referrer;
+    if not found then
+        return false;
+    end if;
+
+    if v_referrer is not null then
+        update profiles
+           set active_referral_count = greatest(active_referral_count + (case when p_active then 1 else -1 end), 0)
+         where id = v_referrer;
+    end if;
+    return true;
+end;
+$$;
+
+-- Bulk repair: recounts every referrer in one set-based statement and returns
+-- the number of profiles whose counters were wrong.
+create or replace function public.recount_referrals()
+returns integer
+language sql
+security definer
+set search_path = public
+as $$
+    with counts as (
+        select referred_by as id,
+               count(*) as total,
+               count(*) filter (where subscription_active) as active
+          from profiles
+         where referred_by is not null
+         group by referred_by
+    ), fixed as (
+        update profiles p
+           set referral_count = coalesce(c.total, 0),
+               active_referral_count = coalesce(c.active, 0)
+          from profiles p2
+          left join counts c on c.id = p2.id
+         where p.id = p2.id
+           and (p.referral_count, p.active_referral_count)
+               is distinct from (coalesce(c.total, 0)::int, coalesce(c.active, 0)::int)
+        returning p.id
+    )
+    select count(*)::integer from fixed;
+$$;
+
+revoke execute on function public.set_subscription_active(uuid, boolean) from public, anon, authenticated;
+revoke execute on function public.recount_referrals() from public, anon, authenticated;
+
+-- Backfill totals for existing referrals
+select public.recount_referrals();
@@ -0,0 +1,155 @@
+-- Commission ledger and batch payouts.
+-- Every credit the webhook grants is now a row in commission_credits, keyed by
+-- Stripe invoice so webhook retries cannot double-credit. profiles.commission_balance
+-- stays as the running "wallet" figure shown in the app. run_payout() settles a
+-- month in one transaction: it claims the unpaid credits, aggregates them per
+-- referrer into payout_lines, and debits the wallets.
+
+create table if not exists public.commission_credits (
+    id bigint generated always as identity primary key,
+    referrer_id uuid not null references public.profiles (id),
+    payer_id uuid references public.profiles (id),
+    stripe_invoice_id text not null,
+    amount_cents integer not null check (amount_cents > 0),
+    created_at timestamptz not null default now(),
+    payout_batch_id bigint,
+    unique (stripe_invoice_id, referrer_id)
+);
+
+create index if not exists commission_credits_unpaid_idx
+    on public.commission_credits (created_at) where payout_batch_id is null;
+create index if not exists commission_credits_batch_idx
+    on public.commission_credits (payout_batch_id);
+
+create table if not exists public.payout_batches (
+    id bigint generated always as identity primary key,
+    period text not null unique check (period ~ '^\d{4}-\d{2}$'),
+    period_end timestamptz not null,
+    referrer_count integer not null default 0,
+    total_cents bigint not null default 0,
+    created_at timestamptz not null default now()
+);
+
+alter table public.commission_credits
+    drop constraint if exists commission_credits_payout_batch_fk,
+    add constraint commission_credits_payout_batch_fk
+        foreign key (payout_batch_id) references public.payout_batches (id);
+
+create table if not exists public.payout_lines (
+    batch_id bigint not null references public.payout_batches (id),
+    referrer_id uuid not null,
+    payout_method text,
+    payout_handle text,
+    amount_cents bigint not null,
+    credit_count integer not null,
+    primary key (batch_id, referrer_id)
+);
+
+create index if not exists payout_lines_method_idx on public.payout_lines (batch_id, payout_method);
+
+-- Service role only, apart from referrers reading their own credits
+alter table public.commission_credits enable row level security;
+alter table public.payout_batches enable row level security;
+alter table public.payout_lines enable row level security;
+
+drop policy if exists "Referrers read own credits" on public.commission_credits;
+create policy "Referrers read own credits" on public.commission_credits
+    for select using (referrer_id = auth.uid());
+
+-- Idempotent credit write used by the webhook. Returns false if this invoice
+-- already credited this referrer (or the referrer profile no longer exists).
+create or replace function public.record_commission(
+    p_invoice text, p_payer uuid, p_referrer uuid, p_amount_cents integer
+)
+returns boolean
+language plpgsql
+security definer
+set search_path = public
+as $$
+begin
+    if not exists (select 1 from profiles where id = p_referrer) then
+        return false;
+    end if;
+
+    insert into commission_credits (referrer_id, payer_id, stripe_invoice_id, amount_cents)
+    values (p_referrer, p_payer, p_invoice, p_amount_cents)
+    on conflict (stripe_invoice_id, referrer_id) do nothing;
+    if not found then
+        return false;
+    end if;
+
+    update profiles
+       set commission_balance = coalesce(commission_balance, 0) + p_amount_cents / 100.0
+     where id = p_referrer;
+    return true;
+end;
+$$;
+
+-- Settles every unpaid credit created before the end of p_period ('YYYY-MM', UTC).
+-- Re-running a period returns the existing batch without touching anything.
+create or replace function public.run_payout(p_period text)
+returns public.payout_batches
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+    v_batch payout_batches;
+    v_end timestamptz := (to_date(p_period, 'YYYY-MM') + interval '1 month')::timestamp at time zone 'UTC';
+begin
+    -- One payout run at a time
+    perform pg_advisory_xact_lock(hashtext('public.run_payout'));
+
+    select * into v_batch from payout_batches where period = p_period;
+    if found then
+        return v_batch;
+    end if;
+
+    insert into payout_batches (period, period_end)
+    values (p_period, v_end)
+    returning * into v_batch;
+
+    with claimed as (
+        update commission_credits
+           set payout_batch_id = v_batch.id
+         where payout_batch_id is null
+           and created_at < v_end
+        returning referrer_id, amount_cents
+    ), totals as (
+        select referrer_id, sum(amount_cents) as amount_cents, count(*) as credit_count
+          from claimed
+         group by referrer_id
+    ), lines as (
+        insert into payout_lines (batch_id, referrer_id, payout_method, payout_handle, amount_cents, credit_count)
+        select v_batch.id, t.referrer_id, p.payout_method, p.payout_handle, t.amount_cents, t.credit_count
+          from totals t
+          left join profiles p on p.id = t.referrer_id
+        returning referrer_id, amount_cents
+    ), debited as (
+        update profiles p
+           set commission_balance = greatest(coalesce(p.commission_balance, 0) - l.amount_cents / 100.0, 0)
+          from lines l
+         where p.id = l.referrer_id
+        returning p.id
+    )
+    update payout_batches
+       set referrer_count = (select count(*) from lines),
+           total_cents = (select coalesce(sum(amount_cents), 0) from lines)
+     where id = v_batch.id
+    returning * into v_batch;
+
+    return v_batch;
+end;
+$$;
+
+revoke execute on function public.record_commission(text, uuid, uuid, integer) from public, anon, authenticated;
+revoke execute on function public.run_payout(text) from public, anon, authenticated;
+
+-- Carry existing wallet balances into the ledger so the first run pays them out.
+-- Filtered on the rounded amount: a balance under half a cent rounds to 0,
+-- which amount_cents > 0 would reject, aborting the migration.
+insert into public.commission_credits (referrer_id, stripe_invoice_id, amount_cents)
+select id, 'legacy-balance', round(commission_balance * 100)::integer
+  from public.profiles
+ where round(coalesce(commission_balance, 0) * 100) > 0
+on conflict (stripe_invoice_id, referrer_id) do nothing;
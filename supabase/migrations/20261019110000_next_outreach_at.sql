@@ -0,0 +1,52 @@
+-- Typed next outreach.
+-- leads.next_outreach stays the free text shown in the app; next_outreach_at is
+-- the parsed timestamp (outreach_time.parse_outreach) written alongside it.
+-- Rows written before this migration are filled by `python reminder_digest.py --backfill`.
+
+alter table public.leads
+    add column if not exists next_outreach_at timestamptz;
+
+-- "Due Soon" view: one user's upcoming/overdue leads
+create index if not exists leads_user_next_outreach_idx
+    on public.leads (user_id, next_outreach_at)
+    where next_outreach_at is not null;
+
+-- Reminder digest worker: everything due in a window, across users
+create index if not exists leads_next_outreach_idx
+    on public.leads (next_outreach_at, user_id)
+    where next_outreach_at is not null;
+
+-- One digest per user per day, produced by reminder_digest.py
+create table if not exists public.reminder_digests (
+    user_id uuid not null references public.profiles (id) on delete cascade,
+    digest_date date not null,
+    lead_count integer not null,
+    items jsonb not null,
+    created_at timestamptz not null default now(),
+    primary key (user_id, digest_date)
+);
+
+alter table public.reminder_digests enable row level security;
+
+drop policy if exists "Users read own digests" on public.reminder_digests;
+create policy "Users read own digests" on public.reminder_digests
+    for select using (user_id = auth.uid());
+
+-- Bulk write of parsed timestamps: p_rows = [{"id": <lead id>, "at": "<timestamptz>"}, ...]
+create or replace function public.set_next_outreach_at(p_rows jsonb)
+returns integer
+language sql
+security definer
+set search_path = public
+as $$
+    with updated as (
+        update leads l
+           set next_outreach_at = r.at
+          from jsonb_to_recordset(p_rows) as r(id bigint, at timestamptz)
+         where l.id = r.id
+        returning l.id
+    )
+    select count(*)::integer from updated;
+$$;
+
+revoke execute on function public.set_next_outreach_at(jsonb) from public, anon, authenticated;
@@ -0,0 +1,64 @@
+-- Normalized contact keys for duplicate detection.
+-- Written by the app on every insert/update (contact_keys.contact_keys()).
+-- Existing rows are keyed and their duplicates merged by `python dedupe_leads.py`.
+-- The new columns start out null, so the unique indexes can be built immediately.
+
+alter table public.leads
+    add column if not exists phone_e164 text,
+    add column if not exists email_norm text;
+
+create unique index if not exists leads_user_phone_e164_uidx
+    on public.leads (user_id, phone_e164)
+    where phone_e164 is not null;
+
+create unique index if not exists leads_user_email_norm_uidx
+    on public.leads (user_id, email_norm)
+    where email_norm is not null;
+
+-- Applies one batch from dedupe_leads.py in a single transaction:
+--   p_merges = [{"keep": id, "drop": [id, ...], "name": ..., "contact_info": ..., "background": ...,
+--                "product_pitch": ..., "transactions": ..., "status": ..., "next_outreach": ...,
+--                "next_outreach_at": ...}, ...]
+--   p_keys   = [{"id": id, "phone_e164": ..., "email_norm": ...}, ...]
+-- Duplicates are deleted before keys are written so the unique indexes never trip.
+create or replace function public.apply_lead_merges(p_merges jsonb, p_keys jsonb)
+returns integer
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+    v_deleted integer;
+begin
+    delete from leads
+     where id in (
+        select unnest(m.drop)
+          from jsonb_to_recordset(p_merges) as m(drop bigint[])
+     );
+    get diagnostics v_deleted = row_count;
+
+    update leads l
+       set name = m.name,
+           contact_info = m.contact_info,
+           background = m.background,
+           product_pitch = m.product_pitch,
+           transactions = m.transactions,
+           status = m.status,
+           next_outreach = m.next_outreach,
+           next_outreach_at = m.next_outreach_at
+      from jsonb_to_recordset(p_merges) as m(
+            keep bigint, name text, contact_info text, background text, product_pitch text,
+            transactions text, status text, next_outreach text, next_outreach_at timestamptz)
+     where l.id = m.keep;
+
+    update leads l
+       set phone_e164 = k.phone_e164,
+           email_norm = k.email_norm
+      from jsonb_to_recordset(p_keys) as k(id bigint, phone_e164 text, email_norm text)
+     where l.id = k.id;
+
+    return v_deleted;
+end;
+$$;
+
+revoke execute on function public.apply_lead_merges(jsonb, jsonb) from public, anon, authenticated;
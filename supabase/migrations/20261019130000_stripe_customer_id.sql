@@ -0,0 +1,36 @@
+-- Stripe customer id on profiles.
+-- The webhook used to find the payer with an email match on every invoice,
+-- which breaks when the Stripe email differs from the login email. It now
+-- resolves payers from checkout metadata, an in-process cache, and this
+-- column (unique, so the lookup is an index probe). The webhook writes it
+-- (checkout.session.completed, or the first email match); users cannot.
+
+alter table public.profiles
+    add column if not exists stripe_customer_id text;
+
+create unique index if not exists profiles_stripe_customer_id_key
+    on public.profiles (stripe_customer_id)
+    where stripe_customer_id is not null;
+
+-- Only the service role may set it: a user pointing their profile at someone
+-- else's customer would capture that customer's invoices.
+create or replace function public.guard_stripe_customer_id()
+returns trigger
+language plpgsql
+set search_path = public
+as $$
+begin
+    if (tg_op = 'INSERT' and new.stripe_customer_id is not null
+        or tg_op = 'UPDATE' and new.stripe_customer_id is distinct from old.stripe_customer_id)
+       and coalesce(auth.role(), '') <> 'service_role'
+       and current_user not in ('postgres', 'supabase_admin') then
+        raise exception 'stripe_customer_id is managed by the billing webhook';
+    end if;
+    return new;
+end;
+$$;
+
+drop trigger if exists profiles_guard_stripe_customer_id on public.profiles;
+create trigger profiles_guard_stripe_customer_id
+    before insert or update of stripe_customer_id on public.profiles
+    for each row execute function public.guard_stripe_customer_id();
@@ -0,0 +1,100 @@
+-- Bulk writers for the nightly Stripe reconciliation (reconcile_stripe.py).
+-- The webhook applies one event at a time through set_subscription_active()
+-- and record_commission(). A reconciliation run can find thousands of
+-- corrections, so these take a jsonb batch and apply it set-based, keeping
+-- the same side effects (referrer counters, wallet balances, idempotency).
+
+-- p_rows: [{"id": uuid, "active": bool}, ...]. Returns the number of profiles changed.
+-- Two statements: a referrer can also be in the batch, and one statement may not update a row twice.
+create or replace function public.apply_subscription_states(p_rows jsonb)
+returns integer
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+    v_changed integer;
+    v_moves jsonb;
+begin
+    with wanted as (
+        select distinct on (id) id, active
+          from jsonb_to_recordset(p_rows) as r(id uuid, active boolean)
+    ), changed as (
+        update profiles p
+           set subscription_active = w.active
+          from wanted w
+         where p.id = w.id
+           and p.subscription_active is distinct from w.active
+        returning p.referred_by, w.active
+    )
+    select count(*)::integer,
+           coalesce(jsonb_agg(jsonb_build_object('id', referred_by, 'active', active))
+                    filter (where referred_by is not null), '[]'::jsonb)
+      into v_changed, v_moves
+      from changed;
+
+    update profiles p
+       set active_referral_count = greatest(p.active_referral_count + d.delta, 0)
+      from (
+        select id, sum(case when active then 1 else -1 end) as delta
+          from jsonb_to_recordset(v_moves) as m(id uuid, active boolean)
+         group by id
+      ) d
+     where p.id = d.id;
+
+    return v_changed;
+end;
+$$;
+
+-- p_rows: [{"invoice": text, "payer": uuid, "referrer": uuid, "amount_cents": int}, ...]
+-- Same rules as record_commission(): one credit per (invoice, referrer), referrer must exist.
+-- Returns the number of credits inserted.
+create or replace function public.record_commissions(p_rows jsonb)
+returns integer
+language sql
+security definer
+set search_path = public
+as $$
+    with rows as (
+        select r.invoice, r.payer, r.referrer, r.amount_cents
+          from jsonb_to_recordset(p_rows) as r(invoice text, payer uuid, referrer uuid, amount_cents integer)
+          join profiles p on p.id = r.referrer
+    ), inserted as (
+        insert into commission_credits (referrer_id, payer_id, stripe_invoice_id, amount_cents)
+        select referrer, payer, invoice, amount_cents from rows
+        on conflict (stripe_invoice_id, referrer_id) do nothing
+        returning referrer_id, amount_cents
+    ), totals as (
+        select referrer_id, sum(amount_cents) as cents from inserted group by referrer_id
+    ), credited as (
+        update profiles p
+           set commission_balance = coalesce(p.commission_balance, 0) + t.cents / 100.0
+          from totals t
+         where p.id = t.referrer_id
+        returning p.id
+    )
+    select count(*)::integer from inserted;
+$$;
+
+-- p_rows: [{"id": uuid, "customer": text}, ...]. Only fills profiles that have no customer yet.
+create or replace function public.link_stripe_customers(p_rows jsonb)
+returns integer
+language sql
+security definer
+set search_path = public
+as $$
+    with linked as (
+        update profiles p
+           set stripe_customer_id = r.customer
+          from jsonb_to_recordset(p_rows) as r(id uuid, customer text)
+         where p.id = r.id
+           and p.stripe_customer_id is null
+           and not exists (select 1 from profiles o where o.stripe_customer_id = r.customer)
+        returning p.id
+    )
+    select count(*)::integer from linked;
+$$;
+
+revoke execute on function public.apply_subscription_states(jsonb) from public, anon, authenticated;
+revoke execute on function public.record_commissions(jsonb) from public, anon, authenticated;
+revoke execute on function public.link_stripe_customers(jsonb) from public, anon, authenticated;
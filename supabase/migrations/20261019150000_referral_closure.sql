@@ -0,0 +1,199 @@
+-- Multi-level referral graph.
+-- referral_closure holds one row per (ancestor, descendant) pair with its depth
+-- (1 = direct referrer), so "everyone above me" and "my downline per level" are
+-- single indexed lookups instead of walking referred_by recursively.
+-- link_referrer() maintains it in the same transaction as referred_by.
+-- commission_tiers says what each level earns per paid invoice. Only depth 1
+-- (today's flat $10) is seeded; inserting a row for depth 2, 3, ... turns that
+-- tier on for every invoice from then on.
+
+create table if not exists public.referral_closure (
+    ancestor_id uuid not null references public.profiles (id) on delete cascade,
+    descendant_id uuid not null references public.profiles (id) on delete cascade,
+    depth smallint not null check (depth > 0),
+    primary key (ancestor_id, descendant_id)
+);
+
+-- Upline of a payer (commissions) and downline per level (profile overlay)
+create index if not exists referral_closure_descendant_idx on public.referral_closure (descendant_id, depth);
+create index if not exists referral_closure_ancestor_depth_idx on public.referral_closure (ancestor_id, depth);
+
+create table if not exists public.commission_tiers (
+    depth smallint primary key check (depth > 0),
+    amount_cents integer not null check (amount_cents > 0)
+);
+
+insert into public.commission_tiers (depth, amount_cents) values (1, 1000)
+on conflict (depth) do nothing;
+
+alter table public.commission_credits
+    add column if not exists tier smallint not null default 1;
+
+alter table public.referral_closure enable row level security;
+alter table public.commission_tiers enable row level security;
+
+drop policy if exists "Anyone reads commission tiers" on public.commission_tiers;
+create policy "Anyone reads commission tiers" on public.commission_tiers
+    for select using (true);
+
+-- Same contract as before; now also refuses links that would create a cycle and
+-- adds the closure rows: every ancestor of p_referrer (and p_referrer itself)
+-- becomes an ancestor of p_user and of everyone p_user already referred.
+-- The cycle check and the closure insert read referral_closure rows that a
+-- concurrent link may be writing (C->X while X->R would leave C without R;
+-- A->B with B->A would make a cycle), so links are serialized by a
+-- transaction-level advisory lock. Users who are already linked, which is
+-- every login after the first, return before taking it.
+create or replace function public.link_referrer(p_user uuid, p_referrer uuid)
+returns boolean
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+    v_active boolean;
+begin
+    if p_user is distinct from auth.uid() and coalesce(auth.role(), '') <> 'service_role' then
+        raise exception 'link_referrer: not allowed';
+    end if;
+    if p_referrer is null or p_referrer = p_user then
+        return false;
+    end if;
+    if exists (select 1 from profiles where id = p_user and referred_by is not null) then
+        return false;
+    end if;
+
+    -- Held until commit; every statement below sees links committed before it was granted
+    perform pg_advisory_xact_lock(hashtext('public.link_referrer'));
+
+    if exists (select 1 from referral_closure where ancestor_id = p_user and descendant_id = p_referrer) then
+        return false;
+    end if;
+
+    update profiles
+       set referred_by = p_referrer
+     where id = p_user
+       and referred_by is null
+    returning subscription_active into v_active;
+    if not found then
+        return false;
+    end if;
+
+    update profiles
+       set referral_count = referral_count + 1,
+           active_referral_count = active_referral_count + (case when v_active then 1 else 0 end)
+     where id = p_referrer;
+
+    insert into referral_closure (ancestor_id, descendant_id, depth)
+    select up.id, down.id, up.depth + down.depth + 1
+      from (select p_referrer as id, 0 as depth
+            union all
+            select ancestor_id, depth from referral_closure where descendant_id = p_referrer) up
+     cross join
+           (select p_user as id, 0 as depth
+            union all
+            select descendant_id, depth from referral_closure where ancestor_id = p_user) down
+    on conflict (ancestor_id, descendant_id) do nothing;
+    return true;
+end;
+$$;
+
+-- Credits every tier above p_payer for one invoice in a single statement.
+-- Idempotent per (invoice, referrer) like record_commission(). Returns the
+-- number of credits inserted.
+create or replace function public.record_tiered_commission(p_invoice text, p_payer uuid)
+returns integer
+language sql
+security definer
+set search_path = public
+as $$
+    with inserted as (
+        insert into commission_credits (referrer_id, payer_id, stripe_invoice_id, amount_cents, tier)
+        select c.ancestor_id, p_payer, p_invoice, t.amount_cents, c.depth
+          from referral_closure c
+          join commission_tiers t on t.depth = c.depth
+         where c.descendant_id = p_payer
+        on conflict (stripe_invoice_id, referrer_id) do nothing
+        returning referrer_id, amount_cents
+    ), credited as (
+        update profiles p
+           set commission_balance = coalesce(p.commission_balance, 0) + i.amount_cents / 100.0
+          from inserted i
+         where p.id = i.referrer_id
+        returning p.id
+    )
+    select count(*)::integer from inserted;
+$$;
+
+-- Bulk version for reconcile_stripe.py. p_rows: [{"invoice": text, "payer": uuid}, ...]
+drop function if exists public.record_commissions(jsonb);
+create function public.record_commissions(p_rows jsonb)
+returns integer
+language sql
+security definer
+set search_path = public
+as $$
+    with inserted as (
+        insert into commission_credits (referrer_id, payer_id, stripe_invoice_id, amount_cents, tier)
+        select c.ancestor_id, r.payer, r.invoice, t.amount_cents, c.depth
+          from jsonb_to_recordset(p_rows) as r(invoice text, payer uuid)
+          join referral_closure c on c.descendant_id = r.payer
+          join commission_tiers t on t.depth = c.depth
+        on conflict (stripe_invoice_id, referrer_id) do nothing
+        returning referrer_id, amount_cents
+    ), totals as (
+        select referrer_id, sum(amount_cents) as cents from inserted group by referrer_id
+    ), credited as (
+        update profiles p
+           set commission_balance = coalesce(p.commission_balance, 0) + t.cents / 100.0
+          from totals t
+         where p.id = t.referrer_id
+        returning p.id
+    )
+    select count(*)::integer from inserted;
+$$;
+
+-- Downline size per level for the profile overlay: [(depth, total, active)].
+create or replace function public.downline_counts(p_user uuid)
+returns table (depth smallint, total integer, active integer)
+language plpgsql
+stable
+security definer
+set search_path = public
+as $$
+begin
+    if p_user is distinct from auth.uid() and coalesce(auth.role(), '') <> 'service_role' then
+        raise exception 'downline_counts: not allowed';
+    end if;
+    return query
+        select c.depth, count(*)::integer, (count(*) filter (where p.subscription_active))::integer
+          from referral_closure c
+          join profiles p on p.id = c.descendant_id
+         where c.ancestor_id = p_user
+         group by c.depth
+         order by c.depth;
+end;
+$$;
+
+revoke execute on function public.record_tiered_commission(text, uuid) from public, anon, authenticated;
+revoke execute on function public.record_commissions(jsonb) from public, anon, authenticated;
+
+-- Backfill from the existing referred_by links (path guards against cycles in old data)
+insert into public.referral_closure (ancestor_id, descendant_id, depth)
+with recursive chain (ancestor_id, descendant_id, depth, path) as (
+    select referred_by, id, 1, array[id, referred_by]
+      from public.profiles
+     where referred_by is not null
+       and referred_by <> id
+    union all
+    select p.referred_by, c.descendant_id, c.depth + 1, c.path || p.referred_by
+      from chain c
+      join public.profiles p on p.id = c.ancestor_id
+     where p.referred_by is not null
+       and not p.referred_by = any (c.path)
+)
+select ancestor_id, descendant_id, min(depth)
+  from chain
+ where exists (select 1 from public.profiles a where a.id = chain.ancestor_id)
+ group by ancestor_id, descendant_id
+on conflict (ancestor_id, descendant_id) do nothing;
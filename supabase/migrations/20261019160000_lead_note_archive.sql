@@ -0,0 +1,77 @@
+-- Background-notes compaction (compact_notes.py).
+-- Long leads.background values are replaced by a bounded digest; the full text
+-- moves to lead_note_archive, which nothing on the hot path reads (voice
+-- prompts, Rolodex, search). Every compaction adds one archive row, so a lead's
+-- history is the archive rows in order plus its current background.
+
+create table if not exists public.lead_note_archive (
+    id bigint generated by default as identity primary key,
+    lead_id bigint not null references public.leads (id) on delete cascade,
+    user_id uuid not null,
+    background text not null,
+    compacted_at timestamptz not null default now()
+);
+
+create index if not exists lead_note_archive_lead_idx on public.lead_note_archive (lead_id, compacted_at);
+
+alter table public.leads
+    add column if not exists background_compacted_at timestamptz;
+
+alter table public.lead_note_archive enable row level security;
+
+drop policy if exists "Users read their archived notes" on public.lead_note_archive;
+create policy "Users read their archived notes" on public.lead_note_archive
+    for select using (auth.uid() = user_id);
+
+-- Candidates in id order (keyset pages): leads whose background is at least p_min_bytes.
+create or replace function public.leads_needing_compaction(p_min_bytes integer, p_after_id bigint, p_limit integer)
+returns table (id bigint, user_id uuid, name text, product_pitch text, background text)
+language sql
+stable
+security definer
+set search_path = public
+as $$
+    select l.id, l.user_id, l.name, l.product_pitch, l.background
+      from leads l
+     where l.id > p_after_id
+       and octet_length(l.background) >= p_min_bytes
+     order by l.id
+     limit p_limit;
+$$;
+
+-- Applies one batch: p_rows = [{"id": bigint, "original_md5": text, "digest": text}, ...]
+-- A lead is only compacted if its background is still the text that was
+-- summarized (md5 match), so a note written by the app in the meantime is never
+-- lost; those leads are simply picked up by the next run. Returns the ids compacted.
+create or replace function public.apply_note_compactions(p_rows jsonb)
+returns table (id bigint)
+language sql
+security definer
+set search_path = public
+as $$
+    with rows as (
+        select r.id, r.original_md5, r.digest
+          from jsonb_to_recordset(p_rows) as r(id bigint, original_md5 text, digest text)
+    ), current as (
+        select l.id, l.user_id, l.background
+          from leads l
+          join rows r on r.id = l.id and md5(l.background) = r.original_md5
+           for update of l
+    ), archived as (
+        insert into lead_note_archive (lead_id, user_id, background)
+        select c.id, c.user_id, c.background from current c
+        returning lead_id
+    ), compacted as (
+        update leads l
+           set background = r.digest,
+               background_compacted_at = now()
+          from rows r
+         where l.id = r.id
+           and l.id in (select lead_id from archived)
+        returning l.id
+    )
+    select compacted.id from compacted;
+$$;
+
+revoke execute on function public.leads_needing_compaction(integer, bigint, integer) from public, anon, authenticated;
+revoke execute on function public.apply_note_compactions(jsonb) from public, anon, authenticated;
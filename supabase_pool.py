@@ -0,0 +1,172 @@
+import secrets
+import threading
+from collections import OrderedDict
+
+import httpx
+from postgrest import SyncPostgrestClient
+
+from tracing import TracingTransport
+
+try:
+    from supabase_auth import SyncGoTrueClient, SyncMemoryStorage
+except ImportError:  # Older supabase releases ship the auth client as 'gotrue'
+    from gotrue import SyncGoTrueClient, SyncMemoryStorage
+
+# ==========================================
+# PER-USER SUPABASE CLIENT POOL
+# ==========================================
+# The Streamlit app used to share one supabase client between every session, so
+# sign-ins on one tab swapped the JWT used by everyone else's queries. Here every
+# signed-in user gets their own PostgREST client bound to their JWT, while all of
+# them share a single keep-alive HTTP connection pool (the httpx transport).
+# Auth calls go through throwaway GoTrue clients that never hold a session.
+
+PKCE_STORAGE_KEY = "nexus-oauth"
+
+
+class AdmissionTransport(httpx.BaseTransport):
+    """Runs every request of one user's client inside admission.slot(user_id) (see rate_limit.Admission)."""
+
+    def __init__(self, transport, admission, key):
+        self.transport = transport
+        self.admission = admission
+        self.key = key
+
+    def handle_request(self, request):
+        with self.admission.slot(self.key):
+            return self.transport.handle_request(request)
+
+    def close(self):
+        pass  # the wrapped transport is the shared pool; see the NOTE in SupabaseClientPool
+
+
+class SupabaseClientPool:
+    """LRU pool of per-user PostgREST clients sharing one keep-alive connection pool."""
+
+    def __init__(self, supabase_url, supabase_key, max_clients=500, max_connections=100,
+                 max_keepalive=20, timeout=10.0, max_pending_logins=2000, transport=None, admission=None):
+        base_url = supabase_url.rstrip("/")
+        self.rest_url = f"{base_url}/rest/v1"
+        self.auth_url = f"{base_url}/auth/v1"
+        self.key = supabase_key
+        self.max_clients = max_clients
+        self.max_pending_logins = max_pending_logins
+
+        # NOTE: Per-user httpx clients wrap this shared transport. Never close them,
+        # closing any one of them would close the connection pool for everybody.
+        # Every request through it is recorded as a tracing span.
+        self.transport = TracingTransport(transport or httpx.HTTPTransport(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive,
+                keepalive_expiry=30.0,
+            ),
+            retries=1,
+        ), service="supabase")
+        self.timeout = timeout
+        self.admission = admission  # per-user rate/concurrency limit on data requests (auth and anon are not limited)
+        self._auth_http = httpx.Client(transport=self.transport, timeout=timeout, follow_redirects=True)
+
+        self._lock = threading.Lock()
+        self._clients = OrderedDict()    # user_id -> (access_token, SyncPostgrestClient)
+        self._verifiers = OrderedDict()  # oauth state -> PKCE code verifier (when start_oauth gets no store)
+        self._anon = self._build_client(self.key)
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _build_client(self, bearer_token, user_id=None):
+        headers = {"apikey": self.key, "Authorization": f"Bearer {bearer_token}"}
+        transport = self.transport
+        if self.admission and user_id is not None:
+            transport = AdmissionTransport(transport, self.admission, user_id)
+        http_client = httpx.Client(transport=transport, timeout=self.timeout, follow_redirects=True)
+        return SyncPostgrestClient(self.rest_url, headers=headers, http_client=http_client)
+
+    # --- DATA CLIENTS ---
+    def for_user(self, user_id, access_token):
+        """Returns the PostgREST client bound to this user's current JWT."""
+        with self._lock:
+            entry = self._clients.get(user_id)
+            if entry and entry[0] == access_token:
+                self._clients.move_to_end(user_id)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        # New user or rotated JWT: build outside the lock, then swap in
+        client = self._build_client(access_token, user_id)
+        with self._lock:
+            self._clients[user_id] = (access_token, client)
+            self._clients.move_to_end(user_id)
+            while len(self._clients) > self.max_clients:
+                self._clients.popitem(last=False)
+                self.evictions += 1
+        return client
+
+    def anon(self):
+        """Client for logged-out requests (anon key only)."""
+        return self._anon
+
+    def release(self, user_id):
+        """Drops a user's client, e.g. on sign out."""
+        with self._lock:
+            self._clients.pop(user_id, None)
+
+    def stats(self):
+        with self._lock:
+            size = len(self._clients)
+        return {"size": size, "max_size": self.max_clients, "hits": self.hits,
+                "misses": self.misses, "evictions": self.evictions}
+
+    # --- AUTH ---
+    def auth(self, storage=None):
+        """Returns a fresh GoTrue client for a single auth call. It keeps no session between calls."""
+        return SyncGoTrueClient(
+            url=self.auth_url,
+            headers={"apikey": self.key, "Authorization": f"Bearer {self.key}"},
+            storage_key=PKCE_STORAGE_KEY,
+            storage=storage,
+            auto_refresh_token=False,
+            persist_session=False,
+            flow_type="pkce",
+            http_client=self._auth_http,
+        )
+
+    def start_oauth(self, provider, redirect_to, store=None):
+        """
+        Starts a PKCE OAuth sign-in. Returns (auth_url, state).
+        The caller must pass 'state' through redirect_to so the callback can find the verifier.
+        With a store (session_store.SessionStore) the verifier is kept there instead of in
+        this process, so the callback can land on any replica.
+        """
+        state = secrets.token_urlsafe(16)
+        separator = "&" if "?" in redirect_to else "?"
+        storage = SyncMemoryStorage()
+        data = self.auth(storage=storage).sign_in_with_oauth({
+            "provider": provider,
+            "options": {"redirect_to": f"{redirect_to}{separator}auth_state={state}"}
+        })
+        verifier = storage.get_item(f"{PKCE_STORAGE_KEY}-code-verifier")
+        if store is not None:
+            store.save(f"{PKCE_STORAGE_KEY}:{state}", {"verifier": verifier})
+            return data.url, state
+        with self._lock:
+            self._verifiers[state] = verifier
+            while len(self._verifiers) > self.max_pending_logins:
+                self._verifiers.popitem(last=False)
+        return data.url, state
+
+    def finish_oauth(self, code, state, store=None):
+        """Exchanges an OAuth callback code for a session using the verifier saved by start_oauth."""
+        if store is not None:
+            saved = store.load(f"{PKCE_STORAGE_KEY}:{state}") if state else None
+            if saved: store.delete(f"{PKCE_STORAGE_KEY}:{state}")  # single use
+            verifier = (saved or {}).get("verifier")
+        else:
+            with self._lock:
+                verifier = self._verifiers.pop(state, None)
+        if not verifier:
+            raise ValueError("Login link expired. Please try again.")
+        return self.auth().exchange_code_for_session({"auth_code": code, "code_verifier": verifier})
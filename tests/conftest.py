@@ -0,0 +1,21 @@
+import os
+import sys
+
+import pytest
+
+# Tests import the app modules from the repo root and the local service
+# stand-ins from bench/ (fakes.py, run_bench.py), as the benchmarks do.
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (ROOT, os.path.join(ROOT, "bench")):
+    if path not in sys.path: sys.path.insert(0, path)
+
+
+@pytest.fixture
+def bench(monkeypatch):
+    """Seeded fake Supabase/Stripe/Gemini with the app's env pointed at them (see bench/run_bench.py)."""
+    from run_bench import Bench
+    for key in list(os.environ):
+        monkeypatch.setenv(key, os.environ[key])  # Bench edits os.environ; restore it afterwards
+    b = Bench(0)
+    yield b
+    b.stop()
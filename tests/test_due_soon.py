@@ -0,0 +1,27 @@
+from datetime import datetime, timedelta, timezone
+
+from run_bench import Bench
+
+# Due Soon shows leads overdue for up to OVERDUE_LOOKBACK_DAYS (as the reminder
+# digest does) plus the next DUE_SOON_DAYS; stale overdue rows must not crowd them out.
+
+
+def add_lead(bench, lead_id, due):
+    bench.services["supabase"].insert_rows("leads", [{
+        "id": lead_id, "user_id": bench.user_id, "name": f"Lead {lead_id}", "status": "Lead",
+        "next_outreach": due.isoformat(), "next_outreach_at": due.isoformat(),
+        "created_at": due.isoformat(),
+    }])
+
+
+def test_due_soon_skips_long_overdue_leads(bench):
+    now = datetime.now(timezone.utc)
+    for i in range(150):  # more than the 100-row limit, all long overdue
+        add_lead(bench, 1000 + i, now - timedelta(days=400 - i))
+    add_lead(bench, 2000, now - timedelta(days=3))
+
+    at = Bench.check(bench.new_app(active_tab="due").run())
+    keys = {b.key for b in at.button if b.key.startswith("due_")}
+    assert "due_2000" in keys
+    assert "due_1" in keys  # seeded: due tomorrow
+    assert not any(f"due_{1000 + i}" in keys for i in range(150))
@@ -0,0 +1,100 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import lead_query
+from lead_query import LeadQueryError
+
+
+def iso(dt, fraction=True):
+    """Timestamps as PostgREST returns them: the fraction is left out when it is zero."""
+    return dt.isoformat(timespec="microseconds" if fraction else "seconds")
+
+
+def lead(lead_id, **fields):
+    return {"id": lead_id, "name": f"Lead {lead_id}", "status": "Lead", **fields}
+
+
+def run(data, leads):
+    return lead_query.execute(lead_query.validate(data), leads)
+
+
+# --- validate ---
+def test_validate_defaults_and_clamps():
+    q = lead_query.validate({"title": " Overdue ", "limit": 1000})
+    assert (q.title, q.aggregate, q.filters, q.limit) == ("Overdue", "list", [], lead_query.MAX_LIMIT)
+    assert lead_query.validate({"title": "x", "limit": 0}).limit == lead_query.DEFAULT_LIMIT
+
+
+@pytest.mark.parametrize("data", [
+    "count",
+    {"title": "x", "aggregate": "sum"},
+    {"title": "x", "filters": [{"field": "email", "op": "eq", "value": "a"}]},
+    {"title": "x", "filters": [{"field": "status", "op": "like", "value": "a"}]},
+    {"title": "x", "filters": [{"field": "status", "op": "eq"}]},
+    {"title": "x", "filters": [{"field": "status", "op": "gt", "value": "Client"}]},
+    {"title": "x", "filters": [{"field": "created_at", "op": "gt", "value": "last tuesday"}]},
+    {"title": "x", "limit": "ten"},
+])
+def test_validate_rejects(data):
+    with pytest.raises(LeadQueryError):
+        lead_query.validate(data)
+
+
+# --- execute ---
+def test_mixed_timestamp_formats_are_all_parsed():
+    now = datetime.now(timezone.utc).replace(microsecond=123456)
+    past = now - timedelta(days=2)
+    leads = [
+        lead(1, next_outreach_at=iso(past)),
+        lead(2, next_outreach_at=iso(past.replace(microsecond=0), fraction=False)),
+        lead(3, next_outreach_at=iso(past).replace("+00:00", "Z")),
+        lead(4, next_outreach_at=iso(now + timedelta(days=3), fraction=False)),
+        lead(5, next_outreach_at=None),
+    ]
+    overdue = run({"title": "Overdue", "aggregate": "list", "sort_by": "next_outreach_at",
+                   "filters": [{"field": "next_outreach_at", "op": "lt", "value": "now"}]}, leads)
+    assert overdue["count"] == 3
+    assert {row["id"] for row in overdue["rows"]} == {1, 2, 3}
+    unscheduled = run({"title": "x", "aggregate": "count",
+                       "filters": [{"field": "next_outreach_at", "op": "is_null"}]}, leads)
+    assert unscheduled["count"] == 1
+
+
+def test_created_at_mixed_fraction_and_naive():
+    # save_new_lead writes naive local timestamps; PostgREST returns both shapes
+    today = datetime.now(timezone.utc)
+    leads = [
+        lead(1, created_at=iso(today - timedelta(days=1))),
+        lead(2, created_at=iso((today - timedelta(days=1)).replace(microsecond=0), fraction=False)),
+        lead(3, created_at=(today - timedelta(days=40)).replace(tzinfo=None).isoformat()),
+    ]
+    since = (today - timedelta(days=30)).date().isoformat()
+    recent = run({"title": "New", "aggregate": "count",
+                  "filters": [{"field": "created_at", "op": "gte", "value": since}]}, leads)
+    assert recent["count"] == 2
+
+
+def test_last_sale_from_transactions_and_grouping():
+    leads = [
+        lead(1, status="Client", transactions="• 2026-01-05: Starter kit\n• 2026-03-01: Refill pack"),
+        lead(2, status="client", transactions="2026-02-10: Starter kit"),
+        lead(3, status="Lead", transactions=None),
+    ]
+    result = run({"title": "Sales since February", "aggregate": "count", "group_by": "status",
+                  "filters": [{"field": "last_sale_at", "op": "gte", "value": "2026-02-01"}]}, leads)
+    assert result["count"] == 2
+    assert result["groups"] == [{"key": "Client", "count": 2}]
+
+
+def test_list_is_sorted_limited_and_json_safe():
+    leads = [lead(i, name=name, created_at=iso(datetime(2026, 1, i, tzinfo=timezone.utc), fraction=i % 2 == 0))
+             for i, name in enumerate(["carol", "Alice", "bob"], start=1)]
+    result = run({"title": "x", "aggregate": "list", "sort_by": "name", "limit": 2}, leads)
+    assert [row["name"] for row in result["rows"]] == ["Alice", "bob"]
+    assert result["truncated"] and result["count"] == 3
+    assert all(isinstance(row["created_at"], str) for row in result["rows"])
+
+
+def test_empty_rolodex():
+    assert run({"title": "x", "aggregate": "count"}, [])["count"] == 0
@@ -0,0 +1,51 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from outreach_time import USER_TZ, describe_outreach, parse_outreach, parse_timestamp
+
+MONDAY = datetime(2026, 10, 19, 12, 0, 30, 250000, tzinfo=USER_TZ)
+
+
+@pytest.mark.parametrize("stored, expected", [
+    # PostgREST drops trailing zeros, so fractions of any length come back
+    ("2026-10-19T21:10:08.12345+00:00", datetime(2026, 10, 19, 21, 10, 8, 123450, tzinfo=timezone.utc)),
+    ("2026-10-19T21:10:08.1+00:00", datetime(2026, 10, 19, 21, 10, 8, 100000, tzinfo=timezone.utc)),
+    ("2026-10-19T21:10:08.1234567Z", datetime(2026, 10, 19, 21, 10, 8, 123456, tzinfo=timezone.utc)),
+    ("2026-10-19T21:10:08+00", datetime(2026, 10, 19, 21, 10, 8, tzinfo=timezone.utc)),
+    ("2026-10-19 21:10:08", datetime(2026, 10, 19, 21, 10, 8, tzinfo=USER_TZ)),
+    ("2026-10-19", datetime(2026, 10, 19, 9, 0, tzinfo=USER_TZ)),
+])
+def test_parse_timestamp_reads_stored_values(stored, expected):
+    assert parse_timestamp(stored) == expected
+    assert parse_outreach(stored, MONDAY) == expected  # never read as a phrase ("10:08")
+
+
+@pytest.mark.parametrize("value", [None, "", "tomorrow 3pm", "at 10:08", "2026-13-45T00:00:00"])
+def test_parse_timestamp_never_guesses(value):
+    assert parse_timestamp(value) is None
+
+
+@pytest.mark.parametrize("phrase, expected", [
+    ("tue 3pm", datetime(2026, 10, 20, 15, 0, tzinfo=USER_TZ)),
+    ("tues 3pm", datetime(2026, 10, 20, 15, 0, tzinfo=USER_TZ)),
+    ("tuesday 3pm", datetime(2026, 10, 20, 15, 0, tzinfo=USER_TZ)),
+    ("weds", datetime(2026, 10, 21, 9, 0, tzinfo=USER_TZ)),
+    ("thu at 10am", datetime(2026, 10, 22, 10, 0, tzinfo=USER_TZ)),
+    ("thurs 9am", datetime(2026, 10, 22, 9, 0, tzinfo=USER_TZ)),
+    ("thursday", datetime(2026, 10, 22, 9, 0, tzinfo=USER_TZ)),
+    ("mon 3pm", datetime(2026, 10, 26, 15, 0, tzinfo=USER_TZ)),  # today is Monday: next week's
+    ("next fri", datetime(2026, 10, 23, 9, 0, tzinfo=USER_TZ)),
+])
+def test_weekday_abbreviations(phrase, expected):
+    assert parse_outreach(phrase, MONDAY) == expected
+
+
+def test_relative_results_are_whole_minutes():
+    assert parse_outreach("in 2 hours", MONDAY) == datetime(2026, 10, 19, 14, 0, tzinfo=USER_TZ)
+    assert parse_outreach("in 45 minutes", MONDAY) == datetime(2026, 10, 19, 12, 45, tzinfo=USER_TZ)
+
+
+def test_describe_stored_timestamp():
+    due_at = parse_timestamp("2026-10-20T14:00:00.5+00:00")
+    assert describe_outreach(due_at, MONDAY) == "Tomorrow 09:00 AM"
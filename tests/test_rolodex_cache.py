@@ -0,0 +1,32 @@
+from run_bench import Bench
+
+# Saving a lead from the result card must drop the session's cached copy, whether
+# the card came from the Rolodex (int id) or a voice UPDATE (string match_id).
+
+
+def click(at, key):
+    return Bench.check(next(b for b in at.button if b.key == key).click().run())
+
+
+def switch_tab(at, label):
+    return Bench.check(at.radio(key="nav_radio").set_value(label).run())
+
+
+def test_voice_update_save_invalidates_opened_lead(bench):
+    at = bench.new_app(active_tab="pipeline")
+    Bench.check(at.run())
+    lead = click(at, "card_1").session_state["selected_lead"]  # now cached under this session
+    click(at, "back_to_list")
+
+    # The voice result card for the same lead, as run_voice_command() leaves it
+    at.session_state["omni_result"] = {"action": "UPDATE", "match_id": str(lead["id"]),
+                                       "lead_data": {"name": lead["name"], "status": lead["status"]}}
+    switch_tab(at, "🎙️ Assistant")
+    click(at, f"edit_btn_{lead['id']}")
+    next(t for t in at.text_input if t.label == "Name").input("Renamed From Voice Card")
+    click(at, "save_edit")
+
+    switch_tab(at, "📇 Rolodex")
+    reopened = click(at, "card_1").session_state["selected_lead"]
+    assert reopened["id"] == lead["id"]
+    assert reopened["name"] == "Renamed From Voice Card"
@@ -0,0 +1,131 @@
+import threading
+
+import pytest
+
+from fakes import FakeSupabase
+from supabase_pool import SupabaseClientPool
+
+# SupabaseClientPool from many threads at once against the local PostgREST /
+# GoTrue stand-in: every request must carry the JWT of the user it was made for.
+
+USERS = 16
+MAX_CLIENTS = 8
+ROUNDS = 12
+
+
+class RecordingSupabase(FakeSupabase):
+    """FakeSupabase that remembers (path, Authorization, query) of every request."""
+
+    def __init__(self):
+        super().__init__()
+        self.requests = []
+
+    def handle(self, method, path, query, headers, body):
+        with self._data_lock:
+            self.requests.append((path, headers.get("Authorization"), dict(query)))
+        return super().handle(method, path, query, headers, body)
+
+
+def start(max_clients=MAX_CLIENTS):
+    fake = RecordingSupabase().start()
+    emails = [f"user{i}@example.com" for i in range(USERS)]
+    ids = {email: fake.add_user(email) for email in emails}
+    return fake, emails, ids, SupabaseClientPool(fake.url, "service-key", max_clients=max_clients)
+
+
+def rest_requests(fake):
+    return [(auth, query) for path, auth, query in fake.requests if path.startswith("/rest/v1/")]
+
+
+def test_concurrent_users_keep_their_own_jwt():
+    fake, emails, ids, pool = start()
+    errors = []
+    barrier = threading.Barrier(USERS)
+
+    def session(email):
+        user_id = ids[email]
+        try:
+            barrier.wait()
+            for round_no in range(ROUNDS):
+                # Sign in through a throwaway GoTrue client, then query with the per-user client
+                auth = pool.auth()
+                token = auth.sign_in_with_password({"email": email, "password": "x"}).session.access_token
+                assert pool.auth().get_session() is None  # a fresh client: no one's session carries over
+                rows = pool.for_user(user_id, token).table("profiles").select("id").eq("id", user_id).execute().data
+                assert [r["id"] for r in rows] == [user_id]
+                if round_no % 4 == 3:
+                    pool.release(user_id)  # sign out
+        except Exception as e:  # surfaced in the main thread
+            errors.append(e)
+
+    threads = [threading.Thread(target=session, args=(email,)) for email in emails]
+    try:
+        for t in threads: t.start()
+        for t in threads: t.join(timeout=60)
+    finally:
+        fake.stop()
+
+    assert not errors, errors
+    requests = rest_requests(fake)
+    assert len(requests) == USERS * ROUNDS
+    for auth, query in requests:
+        assert auth == f"Bearer bench-{query['id'].removeprefix('eq.')}"
+    # Sign-in requests carry only the anon/service key, never another user's JWT
+    for path, auth, _ in fake.requests:
+        if path.startswith("/auth/v1/"): assert auth == "Bearer service-key"
+    stats = pool.stats()
+    assert stats["size"] <= MAX_CLIENTS
+    assert stats["evictions"] > 0
+
+
+def test_lru_eviction_at_max_clients():
+    fake, emails, ids, pool = start(max_clients=4)
+    try:
+        clients = {email: pool.for_user(ids[email], f"bench-{ids[email]}") for email in emails[:4]}
+        assert pool.stats()["size"] == 4
+        pool.for_user(ids[emails[0]], f"bench-{ids[emails[0]]}")  # most recently used again
+        pool.for_user(ids[emails[4]], f"bench-{ids[emails[4]]}")  # evicts the least recently used: emails[1]
+        stats = pool.stats()
+        assert (stats["size"], stats["evictions"]) == (4, 1)
+        assert pool.for_user(ids[emails[0]], f"bench-{ids[emails[0]]}") is clients[emails[0]]
+        assert pool.for_user(ids[emails[1]], f"bench-{ids[emails[1]]}") is not clients[emails[1]]
+
+        # Evicted clients share the connection pool: using one afterwards must still work
+        rows = clients[emails[1]].table("profiles").select("id").eq("id", ids[emails[1]]).execute().data
+        assert rows and rows[0]["id"] == ids[emails[1]]
+    finally:
+        fake.stop()
+
+
+def test_rotated_jwt_and_sign_out_replace_the_client():
+    fake, emails, ids, pool = start()
+    user_id = ids[emails[0]]
+    try:
+        first = pool.for_user(user_id, "token-1")
+        second = pool.for_user(user_id, "token-2")
+        assert second is not first
+        second.table("profiles").select("id").eq("id", user_id).execute()
+        pool.release(user_id)
+        assert pool.stats()["size"] == 0
+        pool.for_user(user_id, "token-3").table("profiles").select("id").eq("id", user_id).execute()
+        pool.anon().table("profiles").select("id").eq("id", user_id).execute()
+    finally:
+        fake.stop()
+    assert [auth for auth, _ in rest_requests(fake)] == ["Bearer token-2", "Bearer token-3", "Bearer service-key"]
+
+
+def test_oauth_callback_on_another_replica_finds_the_verifier():
+    from session_store import MemoryBackend, SessionStore
+    fake = RecordingSupabase().start()
+    fake.add_user("user0@example.com")
+    store = SessionStore(MemoryBackend(ttl=600))  # stands in for the Redis/SQLite store replicas share
+    started_on, callback_on = (SupabaseClientPool(fake.url, "service-key") for _ in range(2))
+    try:
+        url, state = started_on.start_oauth("google", "https://app.example", store=store)
+        assert f"auth_state%3D{state}" in url  # inside the encoded redirect_to
+        res = callback_on.finish_oauth("code-1", state, store=store)
+        assert res.session.access_token.startswith("bench-")
+        with pytest.raises(ValueError):  # verifiers are single use
+            callback_on.finish_oauth("code-1", state, store=store)
+    finally:
+        fake.stop()
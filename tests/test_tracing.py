@@ -0,0 +1,24 @@
+import pytest
+
+import tracing
+
+
+def test_failed_span_is_recorded_and_reraised():
+    trace = tracing.begin_trace("test")
+    with pytest.raises(ValueError):
+        with tracing.span("test.fails", user="u1"):
+            raise ValueError("boom")
+    (recorded,) = trace.spans
+    assert recorded["error"] is True
+    assert recorded["attrs"] == {"user": "u1", "exception": "ValueError"}
+    assert tracing.metrics.summary()["test.fails"]["errors"] >= 1
+
+
+def test_rerun_is_not_an_error():
+    class RerunException(BaseException): pass  # what st.rerun() raises
+    trace = tracing.begin_trace("test")
+    with pytest.raises(RerunException):
+        with tracing.span("test.rerun"):
+            raise RerunException()
+    assert trace.spans[0]["error"] is False
+    assert "exception" not in trace.spans[0]["attrs"]
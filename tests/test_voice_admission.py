@@ -0,0 +1,37 @@
+from run_bench import submit_voice
+
+# A voice command whose Supabase requests are throttled must stop with the
+# "please wait" message: never act on an empty Rolodex or a failed duplicate check.
+
+
+def lead_count(bench):
+    return len(bench.services["supabase"].tables["leads"])
+
+
+def run_throttled_voice(bench, monkeypatch, burst):
+    monkeypatch.setenv("SUPABASE_USER_RATE", "0.001")
+    monkeypatch.setenv("SUPABASE_USER_BURST", str(burst))
+    monkeypatch.setenv("SUPABASE_MAX_WAIT", "0.05")
+    at = bench.new_app(active_tab="omni")
+    at.run()
+    return submit_voice(at)
+
+
+def test_throttled_rolodex_read_stops_the_command(bench, monkeypatch):
+    before = lead_count(bench)
+    at = run_throttled_voice(bench, monkeypatch, burst=0)
+    assert not at.exception
+    assert any("Please wait" in e.value for e in at.error)
+    assert at.session_state["omni_result"] is None
+    assert bench.services["gemini"].snapshot()[0] == 0  # never asked the model with an empty Rolodex
+    assert lead_count(bench) == before
+
+
+def test_throttled_duplicate_check_does_not_create(bench, monkeypatch):
+    # One token: the Rolodex read passes, the duplicate lookup for the CREATE is rejected
+    before = lead_count(bench)
+    at = run_throttled_voice(bench, monkeypatch, burst=1)
+    assert not at.exception
+    assert any("Please wait" in e.value for e in at.error)
+    assert at.session_state["omni_result"] is None
+    assert lead_count(bench) == before
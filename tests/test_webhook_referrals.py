@@ -0,0 +1,32 @@
+import importlib
+
+# A user can be linked to a referrer after checkout (link_referrer() runs at
+# every login), so invoices that carry checkout metadata without referred_by,
+# or hit the payer cache, must still pay the referrer.
+
+
+def credits_for(bench, invoice_id):
+    return [c for c in bench.services["supabase"].tables.get("commission_credits", []) if c["stripe_invoice_id"] == invoice_id]
+
+
+def test_referrer_linked_after_checkout_is_paid(bench):
+    import webhook_server
+    webhook_server = importlib.reload(webhook_server)  # pick up the bench env
+    client = webhook_server.app.test_client()
+    sb = bench.services["supabase"]
+    late_payer = sb.add_user("late@example.com")
+    customer = bench.services["stripe"].add_customer("late@example.com")
+    invoice = {"id": "in_late_1", "object": "invoice", "customer": customer, "customer_email": "late@example.com",
+               "amount_paid": 2000, "subscription_details": {"metadata": {"user_id": late_payer}}}
+
+    bench.post_event(client, "invoice.payment_succeeded", invoice)
+    assert credits_for(bench, "in_late_1") == []  # no referrer yet
+
+    sb._rpc_link_referrer(late_payer, bench.referrer_id)  # e.g. a later Google sign-in with ?ref=
+    bench.post_event(client, "invoice.payment_succeeded", {**invoice, "id": "in_late_2"})
+    assert [c["referrer_id"] for c in credits_for(bench, "in_late_2")] == [bench.referrer_id]
+
+    # Same customer without metadata: the cached payer still gets the upline looked up
+    del invoice["subscription_details"]
+    bench.post_event(client, "invoice.payment_succeeded", {**invoice, "id": "in_late_3"})
+    assert [c["referrer_id"] for c in credits_for(bench, "in_late_3")] == [bench.referrer_id]
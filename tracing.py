@@ -0,0 +1,249 @@
+import time
+import threading
+import functools
+from collections import defaultdict, deque
+from contextvars import ContextVar
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+
+# ==========================================
+# LIGHTWEIGHT TRACING + METRICS
+# ==========================================
+# span("name", **attrs) times a block. Every finished span goes to two places:
+#   - the current trace (one per Streamlit rerun / webhook request), if one is
+#     open in this context, for the admin diagnostics panel;
+#   - the process-wide registry, which keeps a window of recent durations per
+#     span name and serves p50/p95 plus counters in Prometheus text format.
+# No external dependencies; Supabase calls are traced at the httpx transport.
+
+SAMPLE_WINDOW = 1024  # recent durations kept per span name for percentiles
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)  # seconds
+
+_current_trace = ContextVar("nexus_trace", default=None)
+_open_spans = ContextVar("nexus_open_spans", default=())
+
+
+class Trace:
+    """Spans recorded during one rerun (or one request)."""
+
+    def __init__(self, label):
+        self.label = label
+        self.started_at = time.time()
+        self._t0 = time.perf_counter()
+        self.spans = []  # dicts: name, start_ms, ms, attrs, error
+
+    @property
+    def elapsed_ms(self):
+        """Time from the start of the trace to the end of its last span."""
+        return max((s["start_ms"] + s["ms"] for s in self.spans), default=0.0)
+
+
+class MetricsRegistry:
+    def __init__(self, window=SAMPLE_WINDOW):
+        self.window = window
+        self._lock = threading.Lock()
+        self._samples = defaultdict(lambda: deque(maxlen=self.window))
+        self._totals = defaultdict(lambda: [0, 0.0, 0])  # name -> [count, seconds, errors]
+        self._counters = defaultdict(float)                # (name, labels) -> value
+        self._histograms = {}                              # (name, labels) -> [buckets, counts, sum, count]
+
+    def observe(self, name, seconds, error=False):
+        with self._lock:
+            self._samples[name].append(seconds)
+            totals = self._totals[name]
+            totals[0] += 1
+            totals[1] += seconds
+            totals[2] += int(error)
+
+    def incr(self, name, value=1, **labels):
+        with self._lock:
+            self._counters[(name, tuple(sorted(labels.items())))] += value
+
+    def observe_histogram(self, name, seconds, buckets=DEFAULT_BUCKETS, **labels):
+        """Cumulative-bucket histogram (Prometheus 'histogram' type)."""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = [tuple(buckets), [0] * len(buckets), 0.0, 0]
+            for i, bound in enumerate(hist[0]):
+                if seconds <= bound: hist[1][i] += 1
+            hist[2] += seconds
+            hist[3] += 1
+
+    def summary(self):
+        """{span name: {count, errors, p50_ms, p95_ms, max_ms}} over the recent window."""
+        with self._lock:
+            snapshot = {name: (sorted(samples), list(self._totals[name])) for name, samples in self._samples.items()}
+        out = {}
+        for name, (samples, (count, _, errors)) in sorted(snapshot.items()):
+            out[name] = {
+                "count": count, "errors": errors,
+                "p50_ms": _percentile(samples, 0.50) * 1000,
+                "p95_ms": _percentile(samples, 0.95) * 1000,
+                "max_ms": samples[-1] * 1000 if samples else 0.0,
+            }
+        return out
+
+    def counters(self):
+        with self._lock:
+            return dict(self._counters)
+
+    def render_prometheus(self, prefix="nexus"):
+        lines = [f"# HELP {prefix}_span_seconds Span latency (quantiles over the last {self.window} samples).",
+                 f"# TYPE {prefix}_span_seconds summary"]
+        with self._lock:
+            snapshot = {name: (sorted(samples), list(self._totals[name])) for name, samples in self._samples.items()}
+            counters = dict(self._counters)
+            histograms = {key: (h[0], list(h[1]), h[2], h[3]) for key, h in self._histograms.items()}
+        for name, (samples, (count, seconds, errors)) in sorted(snapshot.items()):
+            label = _escape(name)
+            for q in (0.5, 0.95):
+                lines.append(f'{prefix}_span_seconds{{span="{label}",quantile="{q}"}} {_percentile(samples, q):.6f}')
+            lines.append(f'{prefix}_span_seconds_sum{{span="{label}"}} {seconds:.6f}')
+            lines.append(f'{prefix}_span_seconds_count{{span="{label}"}} {count}')
+        lines.append(f"# TYPE {prefix}_span_errors_total counter")
+        for name, (_, (_, _, errors)) in sorted(snapshot.items()):
+            lines.append(f'{prefix}_span_errors_total{{span="{_escape(name)}"}} {errors}')
+        for counter in sorted({name for name, _ in counters}):
+            lines.append(f"# TYPE {prefix}_{counter} counter")
+            for (name, labels), value in sorted(counters.items()):
+                if name != counter: continue
+                rendered = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+                lines.append(f"{prefix}_{name}{{{rendered}}} {value:g}" if rendered else f"{prefix}_{name} {value:g}")
+        for histogram in sorted({name for name, _ in histograms}):
+            lines.append(f"# TYPE {prefix}_{histogram} histogram")
+            for (name, labels), (buckets, counts, total, count) in sorted(histograms.items()):
+                if name != histogram: continue
+                base = "".join(f'{k}="{_escape(v)}",' for k, v in labels)
+                for bound, n in zip(buckets, counts):
+                    lines.append(f'{prefix}_{name}_bucket{{{base}le="{bound:g}"}} {n}')
+                lines.append(f'{prefix}_{name}_bucket{{{base}le="+Inf"}} {count}')
+                lines.append(f"{prefix}_{name}_sum{{{base.rstrip(',')}}} {total:.6f}")
+                lines.append(f"{prefix}_{name}_count{{{base.rstrip(',')}}} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def _percentile(sorted_samples, q):
+    if not sorted_samples: return 0.0
+    return sorted_samples[min(int(q * len(sorted_samples)), len(sorted_samples) - 1)]
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+
+metrics = MetricsRegistry()
+
+# --- TRACE / SPAN API ---
+def begin_trace(label):
+    """Opens a new trace for everything that runs in this context from now on."""
+    trace = Trace(label)
+    _current_trace.set(trace)
+    _open_spans.set(())
+    return trace
+
+def current_trace():
+    return _current_trace.get()
+
+def record(name, seconds, started=None, error=False, **attrs):
+    """Records an already-timed span (started is a perf_counter value)."""
+    metrics.observe(name, seconds, error)
+    trace = _current_trace.get()
+    if trace is not None:
+        start = (started if started is not None else time.perf_counter() - seconds) - trace._t0
+        trace.spans.append({"name": name, "start_ms": start * 1000, "ms": seconds * 1000,
+                            "attrs": attrs, "error": error})
+
+class span:
+    """Times a block: `with span("stripe.customer_list", email=email): ...`"""
+
+    def __init__(self, name, **attrs):
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self):
+        self._token = _open_spans.set(_open_spans.get() + (self,))
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self._started
+        _open_spans.reset(self._token)
+        # Streamlit's st.rerun()/st.stop() are BaseExceptions, not failures
+        error = exc_type is not None and issubclass(exc_type, Exception)
+        if error: self.attrs.setdefault("exception", exc_type.__name__)  # "error" is record()'s flag
+        record(self.name, elapsed, started=self._started, error=error, **self.attrs)
+        return False
+
+def annotate(**attrs):
+    """Adds attributes (e.g. token counts) to the innermost open span."""
+    open_spans = _open_spans.get()
+    if open_spans:
+        open_spans[-1].attrs.update(attrs)
+
+def traced(name):
+    """Decorator form of span()."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def incr(name, value=1, **labels):
+    metrics.incr(name, value, **labels)
+
+def observe(name, seconds, **labels):
+    metrics.observe_histogram(name, seconds, **labels)
+
+
+# --- HTTP TRANSPORT WRAPPER ---
+class TracingTransport(httpx.BaseTransport):
+    """Wraps an httpx transport and records one span per request, e.g. 'supabase GET leads'."""
+
+    def __init__(self, transport, service):
+        self.transport = transport
+        self.service = service
+
+    def handle_request(self, request):
+        path = request.url.path
+        if "/rest/v1/rpc/" in path: target = f"rpc {path.rsplit('/', 1)[-1]}"
+        elif "/rest/v1/" in path: target = path.split("/rest/v1/", 1)[1].split("/")[0]
+        elif "/auth/v1/" in path: target = f"auth {path.split('/auth/v1/', 1)[1]}"
+        else: target = path
+        with span(f"{self.service} {request.method} {target}") as s:
+            response = self.transport.handle_request(request)
+            s.attrs["status"] = response.status_code
+            if response.status_code >= 500:
+                incr("http_errors_total", service=self.service)
+            return response
+
+    def close(self):
+        self.transport.close()
+
+
+# --- PROMETHEUS ENDPOINT ---
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = metrics.render_prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def start_metrics_server(port, host="0.0.0.0"):
+    """Serves /metrics from a daemon thread. Returns the server."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True, name="metrics-server").start()
+    return server
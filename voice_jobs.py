@@ -0,0 +1,105 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import tracing
+from ttl_cache import TTLCache
+
+# ==========================================
+# BACKGROUND VOICE JOBS
+# ==========================================
+# Voice commands (Gemini call + retries + lead write) run on a small worker pool
+# instead of the Streamlit script thread. The session only keeps the job id and
+# polls; finished jobs stay in the registry for a while, and the latest job per
+# user is remembered so a refresh or reconnect still picks up the result.
+# The registry is per process: with several app replicas, route each session to
+# the same one (sticky sessions) or a reconnect elsewhere loses track of its job.
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+
+class QueueFull(Exception):
+    """Raised by submit() when max_pending jobs are already waiting or running."""
+
+
+class VoiceJob:
+    def __init__(self, user_id):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.status = QUEUED
+        self.result = None
+        self.error = None
+        self.claimed = False  # result already shown in some session
+        self.submitted_at = time.time()
+        self.finished_at = None
+
+    @property
+    def finished(self):
+        return self.status in (DONE, FAILED)
+
+
+class VoiceJobRunner:
+    """
+    Bounded pool: at most `workers` jobs run at once and at most `max_pending`
+    are accepted (queued + running) before submit() raises QueueFull.
+    """
+
+    def __init__(self, workers=4, max_pending=32, result_ttl=900):
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="voice-job")
+        self._jobs = TTLCache(max_size=max_pending * 50, ttl=result_ttl)    # job id -> VoiceJob
+        self._latest = TTLCache(max_size=max_pending * 50, ttl=result_ttl)  # user id -> job id
+        self._pending = 0
+        self._lock = threading.Lock()
+        self.workers = workers
+        self.max_pending = max_pending
+
+    def submit(self, user_id, fn, *args):
+        """Queues fn(*args) for user_id and returns the VoiceJob. A user's job still in flight is returned as is."""
+        running = self.latest(user_id)
+        if running and not running.finished:
+            return running
+        with self._lock:
+            if self._pending >= self.max_pending:
+                tracing.incr("voice_jobs_total", status="rejected")
+                raise QueueFull()
+            self._pending += 1
+        job = VoiceJob(user_id)
+        self._jobs.set(job.id, job)
+        self._latest.set(user_id, job.id)
+        self._pool.submit(self._run, job, fn, args)
+        return job
+
+    def _run(self, job, fn, args):
+        job.status = RUNNING
+        tracing.begin_trace("voice job")
+        tracing.observe("voice_job_queue_seconds", time.time() - job.submitted_at)
+        try:
+            with tracing.span("voice job"):
+                job.result = fn(*args)
+            job.status = DONE
+        except Exception as e:
+            print(f"Voice Job Error: {e}")
+            job.error = str(e)
+            job.status = FAILED
+        finally:
+            job.finished_at = time.time()
+            with self._lock:
+                self._pending -= 1
+            tracing.incr("voice_jobs_total", status=job.status)
+
+    def get(self, job_id):
+        return self._jobs.get(job_id) if job_id else None
+
+    def latest(self, user_id):
+        """The user's most recent job (any session), or None once it has expired."""
+        return self.get(self._latest.get(user_id))
+
+    def claim(self, job):
+        """Marks a finished job as shown so other sessions of the user do not show it again."""
+        job.claimed = True
+
+    @property
+    def pending(self):
+        with self._lock:
+            return self._pending
@@ -1,13 +1,18 @@
 import os
+import json
+import time
 import stripe
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g, Response
 from supabase import create_client, Client
 from dotenv import load_dotenv
+import tracing
+from ttl_cache import TTLCache
 
 # Load environment variables
 load_dotenv()
 
 app = Flask(__name__)
+STARTED_AT = time.time()
 
 # --- Configuration ---
 # UPDATED: Changed to match your Railway Variable Name ("STRIPE_SECRET_KEY")
@@ -18,17 +23,141 @@ SUPABASE_KEY = os.getenv("SUPABASE_KEY")  # MUST be the SERVICE_ROLE key to bypa
 
 # Initialize Clients
 stripe.api_key = STRIPE_API_KEY
+if os.getenv("STRIPE_API_BASE"):
+    stripe.api_base = os.getenv("STRIPE_API_BASE")  # local stand-in for bench/
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
 
+SUBSCRIPTION_EVENTS = (
+    'customer.subscription.created',
+    'customer.subscription.updated',
+    'customer.subscription.deleted',
+)
+
+# ==========================================
+# PAYER RESOLUTION
+# ==========================================
+# Stripe customer -> payer profile id, cheapest source first:
+#   1. metadata the app attached at checkout (subscription/invoice): no query
+#   2. this in-process LRU: no query
+#   3. profiles.stripe_customer_id (unique index): one query
+#   4. legacy email match, which also stamps stripe_customer_id for next time
+# Only the payer id is taken from these: a user can be linked to a referrer
+# after checkout (link_referrer() runs at every login), so the referrer is read
+# at payment time by record_tiered_commission() from referral_closure.
+PAYER_CACHE = TTLCache(max_size=int(os.getenv("PAYER_CACHE_SIZE", "50000")), ttl=6 * 3600)
+
+def event_metadata(obj):
+    """user_id metadata from a subscription or invoice (old and new API shapes)."""
+    for meta in (
+        obj.get('metadata'),
+        (obj.get('subscription_details') or {}).get('metadata'),
+        ((obj.get('parent') or {}).get('subscription_details') or {}).get('metadata'),
+    ):
+        if meta and meta.get('user_id'):
+            return meta
+    return None
+
+def remember_payer(customer_id, payer_id):
+    if customer_id:
+        PAYER_CACHE.set(customer_id, payer_id)
+
+def resolve_payer(customer_id, metadata=None, email=None):
+    """Returns the payer's profile id, or None if no profile matches."""
+    if metadata:
+        tracing.incr('payer_lookups_total', source='metadata')
+        remember_payer(customer_id, metadata['user_id'])
+        return metadata['user_id']
+
+    cached = PAYER_CACHE.get(customer_id) if customer_id else None
+    if cached:
+        tracing.incr('payer_lookups_total', source='cache')
+        return cached
+
+    if customer_id:
+        rows = supabase.table('profiles')\
+            .select('id')\
+            .eq('stripe_customer_id', customer_id)\
+            .limit(1)\
+            .execute().data
+        if rows:
+            tracing.incr('payer_lookups_total', source='customer_id')
+            remember_payer(customer_id, rows[0]['id'])
+            return rows[0]['id']
+
+    if callable(email):  # resolved lazily: costs a Stripe call for subscription events
+        email = email()
+    if email:
+        rows = supabase.table('profiles')\
+            .select('id')\
+            .eq('email', email)\
+            .limit(1)\
+            .execute().data
+        if rows:
+            tracing.incr('payer_lookups_total', source='email')
+            if customer_id:
+                link_customer(rows[0]['id'], customer_id)
+            remember_payer(customer_id, rows[0]['id'])
+            return rows[0]['id']
+
+    tracing.incr('payer_lookups_total', source='miss')
+    return None
+
+def link_customer(profile_id, customer_id):
+    """Stamps profiles.stripe_customer_id (only if unset) so later events take the indexed path."""
+    supabase.table('profiles')\
+        .update({'stripe_customer_id': customer_id})\
+        .eq('id', profile_id)\
+        .is_('stripe_customer_id', 'null')\
+        .execute()
+
+# ==========================================
+# HEALTH & METRICS
+# ==========================================
+# Serve with gunicorn in production: gunicorn -c gunicorn.conf.py webhook_server:app
+# NOTE: Metrics live in each worker's memory. gunicorn.conf.py defaults to one
+# worker with several threads so /metrics sees every event.
+
+@app.before_request
+def start_timer():
+    g.started = time.perf_counter()
+    g.event_type = None
+
+@app.after_request
+def record_event_metrics(response):
+    if request.path == '/webhook':
+        event_type = g.get('event_type') or 'unparsed'
+        tracing.incr('webhook_events_total', type=event_type, status=response.status_code)
+        tracing.observe('webhook_processing_seconds', time.perf_counter() - g.started, type=event_type)
+    return response
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    # Liveness only: no Supabase/Stripe calls, so a slow dependency never fails the check
+    configured = bool(STRIPE_WEBHOOK_SECRET and SUPABASE_URL and SUPABASE_KEY)
+    return jsonify(status='ok' if configured else 'misconfigured',
+                   uptime_seconds=int(time.time() - STARTED_AT)), (200 if configured else 503)
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(tracing.metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+def count_error(event, e):
+    """Counts a handler failure against Stripe or (anything else) Supabase."""
+    service = 'stripe' if isinstance(e, stripe.error.StripeError) else 'supabase'
+    tracing.incr(f'{service}_errors_total', type=event['type'])
+
 @app.route('/webhook', methods=['POST'])
 def webhook():
     payload = request.get_data(as_text=True)
     sig_header = request.headers.get('Stripe-Signature')
 
     try:
-        event = stripe.Webhook.construct_event(
+        stripe.Webhook.construct_event(
             payload, sig_header, STRIPE_WEBHOOK_SECRET
         )
+        # Verified; read it as plain JSON (newer stripe-python objects have no dict .get())
+        event = json.loads(payload)
+        g.event_type = event['type']
     except ValueError as e:
         return 'Invalid payload', 400
     except stripe.error.SignatureVerificationError as e:
@@ -38,64 +167,82 @@ def webhook():
     # This fires when a subscription payment (first or recurring) succeeds
     if event['type'] == 'invoice.payment_succeeded':
         invoice = event['data']['object']
-        
-        # 1. Get the email of the person who just paid
         customer_email = invoice.get('customer_email')
-        amount_paid = invoice.get('amount_paid')  # In cents (e.g., 2000 for $20.00)
 
-        print(f"💰 Payment received from: {customer_email}")
+        print(f"💰 Payment received from: {customer_email or invoice.get('customer')}")
 
-        if customer_email:
-            try:
-                # 2. Find this user in your 'profiles' table to see who referred them
-                # We use the service_role key, so we can see everyone.
-                payer_response = supabase.table('profiles')\
-                    .select('referred_by, id')\
-                    .eq('email', customer_email)\
-                    .execute()
-
-                # Check if we found the user
-                if payer_response.data and len(payer_response.data) > 0:
-                    payer_profile = payer_response.data[0]
-                    referrer_id = payer_profile.get('referred_by')
-
-                    # 3. If they were referred by someone, give that person money
-                    if referrer_id:
-                        print(f"👉 User was referred by: {referrer_id}")
-                        
-                        # A. Fetch the referrer's current balance
-                        referrer_data = supabase.table('profiles')\
-                            .select('commission_balance')\
-                            .eq('id', referrer_id)\
-                            .execute()
-                        
-                        if referrer_data.data:
-                            current_balance = float(referrer_data.data[0]['commission_balance'] or 0.0)
-                            
-                            # B. Calculate new balance (Add $10 flat fee)
-                            # You can change 10.00 to whatever commission amount you want
-                            new_balance = current_balance + 10.00 
-                            
-                            # C. Update the referrer's profile directly
-                            update_response = supabase.table('profiles')\
-                                .update({'commission_balance': new_balance})\
-                                .eq('id', referrer_id)\
-                                .execute()
-                            
-                            print(f"✅ Commission updated! New Balance: ${new_balance}")
-                        else:
-                            print("⚠️ Referrer ID found on user, but Referrer profile does not exist.")
-                    else:
-                        print("ℹ️ This user has no referrer. No commission paid.")
+        try:
+            payer_id = resolve_payer(invoice.get('customer'), event_metadata(invoice), customer_email)
+
+            if payer_id:
+                # Pay every tier above them: one credit per ancestor with a commission_tiers row,
+                # plus wallet bumps, in one statement keyed by invoice so Stripe retries never
+                # double-credit (see record_tiered_commission()). The upline is read there, so a
+                # referrer linked after checkout is paid too; no upline inserts nothing.
+                credited = supabase.rpc('record_tiered_commission', {
+                    'p_invoice': invoice.get('id'),
+                    'p_payer': payer_id
+                }).execute()
+
+                if credited.data:
+                    print(f"✅ {credited.data} commission credit(s) recorded for payer {payer_id}")
                 else:
-                    print(f"⚠️ User with email {customer_email} not found in public.profiles.")
+                    print(f"ℹ️ No commission for invoice {invoice.get('id')}: no referrer, or already credited.")
+            else:
+                print(f"⚠️ No profile for customer {invoice.get('customer')} ({customer_email}).")
 
+        except Exception as e:
+            print(f"❌ Error updating commission: {str(e)}")
+            count_error(event, e)
+            return jsonify(success=False), 500
+
+    # --- Handle subscription lifecycle ---
+    # Keeps profiles.subscription_active (and, through it, the referrer's
+    # active_referral_count) in step with Stripe.
+    elif event['type'] in SUBSCRIPTION_EVENTS:
+        subscription = event['data']['object']
+        is_active = event['type'] != 'customer.subscription.deleted' and subscription.get('status') == 'active'
+
+        try:
+            customer_id = subscription.get('customer')
+            payer_id = resolve_payer(
+                customer_id, event_metadata(subscription),
+                email=lambda: stripe.Customer.retrieve(customer_id).email
+            )
+
+            if payer_id:
+                changed = supabase.rpc('set_subscription_active', {
+                    'p_profile': payer_id,
+                    'p_active': is_active
+                }).execute()
+                print(f"🔁 Subscription for {payer_id} active={is_active} (changed: {changed.data})")
+            else:
+                print(f"⚠️ No profile for customer {customer_id}.")
+
+        except Exception as e:
+            print(f"❌ Error updating subscription state: {str(e)}")
+            count_error(event, e)
+            return jsonify(success=False), 500
+
+    # --- Checkout finished: remember which profile owns this Stripe customer ---
+    elif event['type'] == 'checkout.session.completed':
+        session = event['data']['object']
+        profile_id = session.get('client_reference_id')
+        customer_id = session.get('customer')
+        if profile_id and customer_id:
+            try:
+                link_customer(profile_id, customer_id)
+                metadata = session.get('metadata') or {}
+                remember_payer(customer_id, profile_id, metadata.get('referred_by') or None)
+                print(f"🔗 Linked Stripe customer {customer_id} to {profile_id}")
             except Exception as e:
-                print(f"❌ Error updating commission: {str(e)}")
+                print(f"❌ Error linking Stripe customer: {str(e)}")
+                count_error(event, e)
                 return jsonify(success=False), 500
 
     return jsonify(success=True)
 
 if __name__ == '__main__':
+    # Local development only (Flask dev server); see gunicorn.conf.py for production
     port = int(os.environ.get("PORT", 5000))
     app.run(host='0.0.0.0', port=port)